@@ -0,0 +1,89 @@
+from typing import NamedTuple
+
+from prozorro_crawler.settings import (
+    logger,
+    BACKFILL_SHARD,
+    BACKFILL_SHARDS,
+    BACKFILL_START_OFFSET,
+    STOP_BACKWARD_OFFSET,
+)
+from prozorro_crawler.utils import get_offset_timestamp, get_timestamp_offset
+
+
+class BackfillShard(NamedTuple):
+    # storage state id of the shard position
+    state_id: str
+    # the newest shard offset, backward crawler starts from it
+    offset: str
+    # the oldest shard offset, backward crawler stops on it
+    stop_offset: str
+
+
+def get_backfill_shards(
+    state_id: str,
+    end_offset: str,
+    shards: int = BACKFILL_SHARDS,
+    start_offset: str = BACKFILL_START_OFFSET or STOP_BACKWARD_OFFSET,
+) -> list[BackfillShard]:
+    """
+    Split backward crawling between start_offset and end_offset
+    into `shards` equal time ranges, the newest first.
+    Every shard has its own state id that depends on end_offset,
+    so the same shards are resumed after restart
+    Returns empty list if backward crawling should not be sharded
+    """
+    if shards < 2:
+        return []
+    if not end_offset:
+        # backward crawling isn't started or is finished
+        logger.debug(
+            "No backward offset to split backfill into shards",
+            extra={"MESSAGE_ID": "BACKFILL_SHARDS_DISABLED"},
+        )
+        return []
+    start_ts = get_offset_timestamp(start_offset)
+    end_ts = get_offset_timestamp(end_offset)
+    if start_ts is None or end_ts is None or start_ts >= end_ts:
+        logger.warning(
+            f"Can't split backfill into shards between "
+            f"start_offset={start_offset} and end_offset={end_offset}, "
+            f"set BACKFILL_START_OFFSET to the feed start",
+            extra={"MESSAGE_ID": "BACKFILL_SHARDS_DISABLED"},
+        )
+        return []
+
+    step = (end_ts - start_ts) / shards
+    bounds = [end_offset]
+    bounds.extend(get_timestamp_offset(end_ts - step * n) for n in range(1, shards))
+    bounds.append(start_offset)
+    return [
+        BackfillShard(
+            state_id=f"{state_id}.backfill.{int(end_ts)}.{n + 1}of{shards}",
+            offset=bounds[n],
+            stop_offset=bounds[n + 1],
+        )
+        for n in range(shards)
+    ]
+
+
+def is_backfill_shard_process(selection: str = BACKFILL_SHARD) -> bool:
+    return bool(selection) and selection != "forward"
+
+
+def select_backfill_shards(
+    shards: list[BackfillShard],
+    selection: str = BACKFILL_SHARD,
+) -> list[BackfillShard]:
+    """
+    Shards crawled by this process: all of them by default,
+    none if it's the "forward" crawler process, the n-th one (from 1) for "<n>"
+    Raises ValueError if there's no such shard
+    """
+    if not selection:
+        return shards
+    if selection == "forward":
+        return []
+    number = int(selection)
+    if not 1 <= number <= len(shards):
+        raise ValueError(f"BACKFILL_SHARD={selection}: there are {len(shards)} shards")
+    return [shards[number - 1]]
@@ -0,0 +1,174 @@
+"""
+Crawler throughput benchmark against the local feed simulator
+
+    python -m prozorro_crawler.benchmark --objects 20000 --duration 30
+
+The crawler settings are read from env as usual,
+so their effect can be compared, e.g.
+    FEED_PREFETCH_DEPTH=2 ADAPTIVE_POLLING=1 python -m prozorro_crawler.benchmark
+Feed positions are kept in memory unless STORAGE_BACKEND is set
+"""
+
+from argparse import ArgumentParser
+from contextlib import contextmanager, suppress
+from datetime import datetime
+from time import monotonic, time
+from typing import Any, Iterator, NamedTuple, Optional
+
+import aiohttp
+import asyncio
+
+from prozorro_crawler import crawler
+from prozorro_crawler.crawler import init_crawler
+from prozorro_crawler.decoding import get_default_json_loads
+from prozorro_crawler.settings import STORAGE_BACKEND
+from prozorro_crawler.simulator import FeedSimulator
+from prozorro_crawler.storage import memory
+from prozorro_crawler.transport import create_session
+
+STORAGE_FUNCTIONS = ("save_feed_position", "get_feed_position", "drop_feed_position")
+
+
+class BenchmarkReport(NamedTuple):
+    duration: float
+    pages: int
+    items: int
+    requests: int
+    latency_p50: Optional[float]
+    latency_p99: Optional[float]
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.duration
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.duration
+
+    def format(self) -> str:
+        def format_latency(value: Optional[float]) -> str:
+            return "n/a" if value is None else f"{value:.3f}s"
+
+        return "\n".join(
+            (
+                f"duration:    {self.duration:.1f}s",
+                f"pages:       {self.pages} ({self.pages_per_second:.1f}/s)",
+                f"items:       {self.items} ({self.items_per_second:.1f}/s)",
+                f"requests:    {self.requests}",
+                f"latency p50: {format_latency(self.latency_p50)}",
+                f"latency p99: {format_latency(self.latency_p99)}",
+            )
+        )
+
+
+@contextmanager
+def use_memory_storage() -> Iterator[None]:
+    """
+    Crawler feed positions are kept in memory while in the context
+    """
+    functions = {name: getattr(crawler, name) for name in STORAGE_FUNCTIONS}
+    for name in STORAGE_FUNCTIONS:
+        setattr(crawler, name, getattr(memory, name))
+    try:
+        yield
+    finally:
+        for name, function in functions.items():
+            setattr(crawler, name, function)
+
+
+def percentile(values: list[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+async def run_benchmark(simulator: FeedSimulator, duration: float) -> BenchmarkReport:
+    """
+    Run init_crawler against the simulator for `duration` seconds
+    Change-to-handler latency is measured for the objects
+    changed after the start (their dateModified is the change time)
+    """
+    pages = items = 0
+    latencies: list[float] = []
+    started_at = time()
+
+    async def data_handler(
+        session: aiohttp.ClientSession,
+        data: list[dict[str, Any]],
+    ) -> None:
+        nonlocal pages, items
+        pages += 1
+        items += len(data)
+        now = time()
+        for item in data:
+            changed_at = datetime.fromisoformat(item["dateModified"]).timestamp()
+            if changed_at >= started_at:
+                latencies.append(now - changed_at)
+
+    runner = await simulator.start()
+    try:
+        async with create_session() as session:
+            start = monotonic()
+            crawling = asyncio.create_task(
+                init_crawler(
+                    lambda: True,
+                    session,
+                    simulator.get_url(runner),
+                    data_handler,
+                    get_default_json_loads(),
+                )
+            )
+            try:
+                await asyncio.wait_for(asyncio.shield(crawling), duration)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                crawling.cancel()
+                with suppress(asyncio.CancelledError):
+                    await crawling
+            elapsed = monotonic() - start
+    finally:
+        await runner.cleanup()
+
+    return BenchmarkReport(
+        duration=elapsed,
+        pages=pages,
+        items=items,
+        requests=simulator.requests,
+        latency_p50=percentile(latencies, 0.5),
+        latency_p99=percentile(latencies, 0.99),
+    )
+
+
+def main() -> None:
+    parser = ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--objects", type=int, default=10000)
+    parser.add_argument("--changes-rate", type=float, default=10, help="per second")
+    parser.add_argument("--latency", type=float, default=0.01, help="seconds")
+    parser.add_argument("--too-many-requests-rate", type=float, default=0)
+    parser.add_argument("--precondition-failed-rate", type=float, default=0)
+    parser.add_argument("--not-found-rate", type=float, default=0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    simulator = FeedSimulator(
+        objects=args.objects,
+        changes_rate=args.changes_rate,
+        latency=args.latency,
+        too_many_requests_rate=args.too_many_requests_rate,
+        precondition_failed_rate=args.precondition_failed_rate,
+        not_found_rate=args.not_found_rate,
+        seed=args.seed,
+    )
+    if STORAGE_BACKEND:
+        report = asyncio.run(run_benchmark(simulator, args.duration))
+    else:
+        with use_memory_storage():
+            report = asyncio.run(run_benchmark(simulator, args.duration))
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,22 @@
-from typing import Any, Callable, Awaitable, Union
+from functools import partial
+from time import monotonic
+from typing import Any, Callable, Awaitable, Optional, Union
 
 import aiohttp
 import asyncio
 from aiohttp.typedefs import JSONDecoder
-from json.decoder import JSONDecodeError
 
 from prozorro_crawler.settings import (
     logger,
     API_OPT_FIELDS,
     CONNECTION_ERROR_INTERVAL,
     FEED_STEP_INTERVAL,
+    FEED_PREFETCH_DEPTH,
+    FEED_STREAMING_PARSE,
+    FEED_TYPED_ITEMS,
     API_LIMIT,
     NO_ITEMS_INTERVAL,
+    ADAPTIVE_POLLING,
     TOO_MANY_REQUESTS_INTERVAL,
     API_MODE,
     BACKWARD_OFFSET,
@@ -23,14 +28,54 @@ from prozorro_crawler.settings import (
     FORWARD_CHANGES_COOLDOWN_SECONDS,
     SLEEP_FORWARD_CHANGES_SECONDS,
     DATE_MODIFIED_FIELD,
+    DEDUP_CACHE_SIZE,
+    BACKFILL_SHARD,
+    BACKFILL_SHARD_WAIT_INTERVAL,
+    ITEM_PARTITION,
 )
 from prozorro_crawler.storage import (
+    DEFAULT_STATE_ID,
     save_feed_position,
     get_feed_position,
     drop_feed_position,
     BACKWARD_OFFSET_KEY,
     FORWARD_OFFSET_KEY,
 )
+from prozorro_crawler.backfill import (
+    get_backfill_shards,
+    is_backfill_shard_process,
+    select_backfill_shards,
+)
+from prozorro_crawler.dedup import DedupCache, get_dedup_cache
+from prozorro_crawler.decoding import READ_JSON_ERRORS, read_json
+from prozorro_crawler.handlers import (
+    DispatchHandler,
+    OrderedCheckpoints,
+    StreamedPages,
+)
+from prozorro_crawler.hedging import get_hedger
+from prozorro_crawler.items import InvalidFeedItem, get_item_class
+from prozorro_crawler.journal import get_journal
+from prozorro_crawler.partition import parse_partition
+from prozorro_crawler.metrics import (
+    FEED_REQUEST_SECONDS,
+    FEED_ITEMS,
+    HANDLER_SECONDS,
+    CHECKPOINT_WRITE_SECONDS,
+    HTTP_RESPONSES,
+    SLEEP_SECONDS,
+    FORWARD_LAG_SECONDS,
+    get_direction,
+)
+from prozorro_crawler.polling import AdaptivePolling
+from prozorro_crawler.scheduler import get_scheduler
+from prozorro_crawler.transport import REQUEST_ERRORS
+from prozorro_crawler.ratelimit import (
+    PRIORITY_FORWARD,
+    get_priority,
+    get_rate_limiter,
+)
+from prozorro_crawler.streaming import read_feed_page
 from prozorro_crawler.utils import (
     get_offset_age,
     get_offset_timestamp,
@@ -50,6 +95,10 @@ CRAWLERS_STOPED_LOG_INTERVAL = 60
 NO_CRAWLERS_TO_RUN_LOG_INTERVAL = 60
 
 
+class InvalidOffset(Exception):
+    pass
+
+
 async def init_crawler(
     should_run: Callable[[], bool],
     session: aiohttp.ClientSession,
@@ -59,6 +108,8 @@ async def init_crawler(
         Awaitable[None],
     ],
     json_loads: JSONDecoder,
+    state_id: Optional[str] = None,
+    backfill_shard: Optional[str] = None,
     **kwargs: Any,
 ) -> None:
     """
@@ -66,7 +117,13 @@ async def init_crawler(
     Initialize two crawlers and run them in parallel
     Forward crawler: waiting for new data
     Backward crawler: processing all ancient data
+    (split into BACKFILL_SHARDS crawlers running in parallel if configured)
+    A BACKFILL_SHARD process runs only the forward crawler ("forward")
+    or one of the backfill shards, then returns
+    (`backfill_shard` overrides BACKFILL_SHARD, e.g. for a leased work)
     """
+    if backfill_shard is None:
+        backfill_shard = BACKFILL_SHARD
     logger.info(
         "Start crawling",
         extra={
@@ -81,11 +138,29 @@ async def init_crawler(
     # in this case the whole process should be reinitialized
     while should_run():
         # Get current feed position from storage
-        feed_position = await get_feed_position()
+        feed_position = await get_feed_position(state_id)
         initialized_from_feed = False
 
+        if is_backfill_shard_process(backfill_shard):
+            # The shards are split up to the backward offset
+            # saved by the forward crawler process
+            forward_offset = ""
+            backward_offset = START_BACKWARD_OFFSET or str(
+                (feed_position or {}).get(BACKWARD_OFFSET_KEY) or BACKWARD_OFFSET,
+            )
+            if not backward_offset:
+                logger.info(
+                    "Waiting for the forward crawler to save the backward offset",
+                    extra={
+                        "MESSAGE_ID": "BACKFILL_SHARD_WAITING",
+                        "FEED_URL": url,
+                    },
+                )
+                await asyncio.sleep(BACKFILL_SHARD_WAIT_INTERVAL)
+                continue
+
         # Explicit start offsets have priority and bypass persisted state.
-        if START_BACKWARD_OFFSET or START_FORWARD_OFFSET:
+        elif START_BACKWARD_OFFSET or START_FORWARD_OFFSET:
             backward_offset = START_BACKWARD_OFFSET
             forward_offset = START_FORWARD_OFFSET
             logger.info(
@@ -133,6 +208,7 @@ async def init_crawler(
                 url,
                 data_handler,
                 json_loads=json_loads,
+                state_id=state_id,
                 **kwargs,
             )
 
@@ -149,13 +225,61 @@ async def init_crawler(
                     data_handler,
                     json_loads=json_loads,
                     offset=forward_offset,
+                    state_id=state_id,
                     **kwargs,
                 ),
             )
 
         # Backward crawler
         # It should run until all ancient data is processed
-        if initialized_from_feed or backward_offset:
+        backfill_shards = get_backfill_shards(
+            state_id or DEFAULT_STATE_ID,
+            backward_offset,
+        )
+        if backfill_shards:
+            # Backward offset is the end of the backfill and never changes,
+            # save it to get the same shards on restart
+            await save_feed_position(
+                {BACKWARD_OFFSET_KEY: backward_offset},
+                state_id=state_id,
+            )
+            for shard in select_backfill_shards(backfill_shards, backfill_shard):
+                shard_position = await get_feed_position(shard.state_id)
+                shard_offset = (
+                    shard_position and shard_position.get(BACKWARD_OFFSET_KEY)
+                ) or shard.offset
+                logger.info(
+                    f"Start backfill shard {shard.state_id} "
+                    f"from {shard_offset} to {shard.stop_offset}",
+                    extra={
+                        "MESSAGE_ID": "START_BACKFILL_SHARD",
+                        "FEED_URL": url,
+                    },
+                )
+                crawlers.append(
+                    crawler(
+                        should_run,
+                        session,
+                        url,
+                        data_handler,
+                        json_loads=json_loads,
+                        offset=shard_offset,
+                        descending="1",
+                        state_id=shard.state_id,
+                        stop_offset=shard.stop_offset,
+                        **kwargs,
+                    ),
+                )
+        elif is_backfill_shard_process(backfill_shard):
+            logger.critical(
+                f"BACKFILL_SHARD={backfill_shard} is set, but backfill isn't sharded",
+                extra={
+                    "MESSAGE_ID": "BACKFILL_SHARDS_DISABLED",
+                    "FEED_URL": url,
+                },
+            )
+            return None
+        elif backfill_shard != "forward" and (initialized_from_feed or backward_offset):
             crawlers.append(
                 crawler(
                     should_run,
@@ -165,6 +289,7 @@ async def init_crawler(
                     json_loads=json_loads,
                     offset=backward_offset,
                     descending="1",
+                    state_id=state_id,
                     **kwargs,
                 ),
             )
@@ -174,6 +299,10 @@ async def init_crawler(
         if crawlers:
             await asyncio.gather(*crawlers)
 
+            if is_backfill_shard_process(backfill_shard):
+                # The shard is done
+                return None
+
             # Stop crawlers if stop offsets are reached
             if STOP_BACKWARD_OFFSET or STOP_FORWARD_OFFSET:
                 while should_run():
@@ -207,6 +336,7 @@ async def init_feed(
         Awaitable[None],
     ],
     json_loads: JSONDecoder,
+    state_id: Optional[str] = None,
     **kwargs: Any,
 ) -> tuple[str, str]:
     feed_params: dict[str, Union[str, int]] = DEFAULT_FEED_PARAMS.copy()
@@ -224,11 +354,14 @@ async def init_feed(
         },
     )
 
+    limiter = get_rate_limiter(session)
     while should_run():
         try:
             # Make request to feed head
+            if limiter is not None:
+                await limiter.acquire(PRIORITY_FORWARD)
             resp = await session.get(url, params=feed_params)
-        except aiohttp.ClientError as e:
+        except REQUEST_ERRORS as e:
             logger.warning(
                 f"Init feed exception: {type(e)} {e}",
                 extra={
@@ -239,6 +372,9 @@ async def init_feed(
             await asyncio.sleep(CONNECTION_ERROR_INTERVAL)
             continue
 
+        if limiter is not None:
+            limiter.on_response(resp)
+
         if resp.status != 200:
             logger.error(
                 f"Error on feed initialize request: {resp.status} {await resp.text()}",
@@ -252,18 +388,33 @@ async def init_feed(
 
         # No errors, try to parse response
         try:
-            response = await resp.json(loads=json_loads)
-        except (aiohttp.ClientPayloadError, JSONDecodeError) as e:
+            response = await read_feed_response(resp, json_loads, feed_params)
+        except READ_JSON_ERRORS as e:
             logger.warning(e, extra={"MESSAGE_ID": "HTTP_EXCEPTION"})
             await asyncio.sleep(CONNECTION_ERROR_INTERVAL)
             continue
+        except InvalidFeedItem as e:
+            logger.error(e, extra={"MESSAGE_ID": "INVALID_FEED_ITEM"})
+            await asyncio.sleep(FEED_STEP_INTERVAL)
+            continue
 
-        # Process data
-        await data_handler(session, response["data"])
+        next_offset = str(response.get("next_page", {}).get("offset") or "")
+        journal = get_journal(url, state_id, "backward")
+        if journal is not None and response["data"]:
+            # the first page of the backward crawler journal,
+            # the crawler continues from its next_page
+            await journal.append(next_offset, response["data"])
+
+        # Process data, filtered as by the crawlers
+        dedup = get_dedup_cache(url) if DEDUP_CACHE_SIZE else None
+        data = filter_feed_items(
+            dedup, get_metric_labels(url, feed_params), response["data"]
+        )
+        await data_handler(session, data)
 
         # Return offsets for crawlers
         return (
-            str(response.get("next_page", {}).get("offset") or ""),
+            next_offset,
             str(response.get("prev_page", {}).get("offset") or ""),
         )
     return "", ""
@@ -278,13 +429,30 @@ async def crawler(
         Awaitable[None],
     ],
     json_loads: JSONDecoder,
+    state_id: Optional[str] = None,
+    stop_offset: Optional[str] = None,
     **kwargs: str,
 ) -> None:
     """
     Single crawler loop
+    Feed pages are requested by get_feed_page
+    either right before processing (FEED_PREFETCH_DEPTH=0)
+    or in background by prefetch_feed_pages (FEED_PREFETCH_DEPTH>0)
+    Feed position is saved to the state_id storage state
+    only after data_handler processed the page
+    DispatchHandler data handler (ItemHandler, ProcessPoolHandler)
+    is not awaited for every page:
+    next pages are dispatched while the previous ones are still processed
+    and OrderedCheckpoints saves positions of the processed pages in feed order
     """
     feed_params: dict[str, Union[str, int]] = DEFAULT_FEED_PARAMS.copy()
     feed_params.update(kwargs)
+    if stop_offset is None:
+        stop_offset = (
+            STOP_BACKWARD_OFFSET
+            if bool(feed_params.get("descending"))
+            else STOP_FORWARD_OFFSET
+        )
 
     logger.info(
         "Crawler started",
@@ -295,13 +463,384 @@ async def crawler(
         },
     )
 
+    labels = get_metric_labels(url, feed_params)
+    polling = get_polling(feed_params)
+    dispatch_handler = (
+        data_handler if isinstance(data_handler, DispatchHandler) else None
+    )
+    dedup = get_dedup_cache(url) if DEDUP_CACHE_SIZE else None
+    filter_items = partial(filter_feed_items, dedup, labels)
+    journal = get_journal(url, state_id, labels["direction"])
+    scheduler = get_scheduler(url)
+    checkpoints = OrderedCheckpoints()
+
+    async def save_checkpoint(position: Optional[dict[str, Any]]) -> None:
+        # the handled items are cached once their position is saved,
+        # so the items of a page that isn't saved aren't skipped after a restart
+        if position:
+            await save_position(position, state_id, labels)
+            if dedup is not None:
+                dedup.add(checkpoints.pop_done_items())
+
+    streamed: Optional[StreamedPages] = None
+    if FEED_STREAMING_PARSE and dispatch_handler is not None:
+        streamed = StreamedPages(
+            dispatch_handler,
+            session,
+            filter_items,
+            budget=scheduler.get_budget(labels["direction"]),
+        )
+
+    prefetch_task: Optional[asyncio.Task[None]] = None
+    if FEED_PREFETCH_DEPTH > 0:
+        pages: asyncio.Queue[Optional[dict[str, Any]]] = asyncio.Queue(
+            maxsize=FEED_PREFETCH_DEPTH,
+        )
+        prefetch_task = asyncio.create_task(
+            prefetch_feed_pages(
+                should_run,
+                session,
+                url,
+                feed_params.copy(),
+                json_loads,
+                pages,
+                stop_offset,
+                polling,
+                streamed,
+            ),
+        )
+
+    try:
+        while should_run():
+            if feed_params["descending"]:
+                # Let the lagging forward crawler catch up
+                await scheduler.wait_backward(should_run, labels)
+            try:
+                if prefetch_task is None:
+                    response = await get_feed_page(
+                        should_run,
+                        session,
+                        url,
+                        feed_params,
+                        json_loads,
+                        stop_offset,
+                        on_items=streamed.start_page() if streamed else None,
+                    )
+                else:
+                    response = await get_prefetched_page(pages, prefetch_task)
+            except InvalidOffset:
+                # Dropped only here, after all the previous pages are saved,
+                # so the prefetched pages positions can't bring it back
+                await checkpoints.wait_all()
+                await drop_feed_position(state_id)
+                logger.info(
+                    "Drop feed position.",
+                    extra={
+                        "MESSAGE_ID": "CRAWLER_DROP_FEED_POSITION",
+                        "FEED_URL": url,
+                    },
+                )
+                # The feed is messed up for some reason
+                # Stop crawling
+                break
+            if response is None:
+                # Stop offset reached or crawler is stopped
+                break
+            # Items of a streamed page are dispatched while it's received
+            streamed_page = streamed.pop() if streamed is not None else None
+
+            # Save position of the pages that are processed by now
+            # (there are no pending pages unless DispatchHandler is used)
+            await save_checkpoint(checkpoints.pop_done())
+
+            if not response["data"] and feed_params["descending"]:
+                # Got empty response for backward crawler
+                # That's mean we got all ancient stuff
+                # Time to stop backward crawler
+                logger.info(
+                    "Stop backward crawling",
+                    extra={
+                        "MESSAGE_ID": "BACK_CRAWLER_STOP",
+                        "FEED_URL": url,
+                    },
+                )
+                await save_checkpoint(await checkpoints.wait_all())
+                if BACKWARD_OFFSET or START_BACKWARD_OFFSET:
+                    # In case of initial backward offset was set to feed start
+                    # we need to save it because we will got empty response
+                    # and will not hit usual position save
+                    offset_key = get_offset_key(bool(feed_params["descending"]))
+                    await save_position(
+                        {offset_key: response["next_page"]["offset"]},
+                        state_id,
+                        labels,
+                    )
+                # Stop crawling
+                break
+
+            # Check if we got new data
+            if response["data"]:
+                # Weeeee, got new data
+                date_modified_key = get_date_modified_key(
+                    bool(feed_params["descending"]),
+                )
+                offset_key = get_offset_key(bool(feed_params["descending"]))
+                position = {
+                    date_modified_key: response["data"][-1][DATE_MODIFIED_FIELD],
+                    offset_key: response["next_page"]["offset"],
+                }
+                if journal is not None:
+                    # journaled before the position is saved,
+                    # so a replay covers all the handled pages
+                    await journal.append(
+                        response["next_page"]["offset"], response["data"]
+                    )
+                if streamed_page is not None:
+                    # Its items are being processed already,
+                    # the position is saved once all of them are processed
+                    processing, data, started = streamed_page
+                    if started is not None:
+                        HANDLER_SECONDS.time_until_done(processing, started, **labels)
+                    checkpoints.add(processing, position, data)
+                elif dispatch_handler is None:
+                    # Process it
+                    data = filter_items(response["data"])
+                    if data:
+                        async with scheduler.handler_slot(labels):
+                            with HANDLER_SECONDS.time(**labels):
+                                await data_handler(session, data)
+                    # Save new position
+                    await save_position(position, state_id, labels)
+                    if dedup is not None:
+                        dedup.add(data)
+                else:
+                    # Start processing it,
+                    # the position is saved once all the items are processed
+                    data = filter_items(response["data"])
+                    start = monotonic()
+                    processing = await dispatch_handler.dispatch(
+                        session,
+                        data,
+                        budget=scheduler.get_budget(labels["direction"]),
+                    )
+                    if data:
+                        HANDLER_SECONDS.time_until_done(processing, start, **labels)
+                    checkpoints.add(processing, position, data)
+
+            # Update feed params with new offset for next request
+            feed_params.update(offset=response["next_page"]["offset"])
+
+            if not feed_params["descending"]:
+                # The forward crawler is up to date after incomplete page
+                lag = get_offset_age(str(feed_params["offset"]))
+                if len(response["data"]) < API_LIMIT or lag is None:
+                    lag = 0
+                FORWARD_LAG_SECONDS.set(lag, feed=url)
+                scheduler.set_forward_lag(lag)
+
+            if prefetch_task is None:
+                await wait_next_page(response, labels, polling)
+
+        # Crawler is stopped, finish processing of the dispatched pages
+        await save_checkpoint(await checkpoints.wait_all())
+    finally:
+        if prefetch_task is not None:
+            prefetch_task.cancel()
+        checkpoints.cancel()
+        if streamed is not None:
+            streamed.cancel()
+        if not feed_params["descending"]:
+            # Backward crawlers shouldn't wait for a stopped forward crawler
+            scheduler.set_forward_lag(0)
+
+    # Left crawler loop
+    # Crawler is done
+    logger.info(
+        "Crawler stopped",
+        extra={
+            "MESSAGE_ID": "CRAWLER_STOPPED",
+            "FEED_URL": url,
+            "FEED_PARAMS": feed_params,
+        },
+    )
+
+
+async def read_feed_response(
+    resp: aiohttp.ClientResponse,
+    json_loads: JSONDecoder,
+    feed_params: dict[str, Union[str, int]],
+    on_items: Optional[Callable[[list[Any]], Awaitable[None]]] = None,
+) -> dict[str, Any]:
+    response: dict[str, Any]
+    item_class = None
+    if FEED_TYPED_ITEMS:
+        item_class = get_item_class(str(feed_params.get("opt_fields", "")))
+    if FEED_STREAMING_PARSE:
+        item_loads = None
+        if item_class is not None:
+            from_dict = item_class.from_dict
+
+            def item_loads(text: str) -> Any:
+                return from_dict(json_loads(text))
+
+        return await read_feed_page(resp, json_loads, on_items, item_loads)
+    response = await read_json(resp, json_loads)
+    if item_class is not None:
+        response["data"] = [item_class.from_dict(item) for item in response["data"]]
+    return response
+
+
+def filter_feed_items(
+    dedup: Optional[DedupCache],
+    labels: dict[str, str],
+    items: list[Any],
+) -> list[Any]:
+    """
+    Items that aren't handled already (with DEDUP_CACHE_SIZE)
+    and belong to ITEM_PARTITION
+    """
+    if dedup is not None:
+        items = dedup.filter(items, labels)
+    partition = parse_partition(ITEM_PARTITION)
+    if partition is not None:
+        # other items are handled by other processes
+        items = partition.filter(items)
+    return items
+
+
+def get_metric_labels(
+    url: str,
+    feed_params: dict[str, Union[str, int]],
+) -> dict[str, str]:
+    return {"feed": url, "direction": get_direction(feed_params.get("descending"))}
+
+
+async def save_position(
+    position: dict[str, Any],
+    state_id: Optional[str],
+    labels: dict[str, str],
+) -> None:
+    with CHECKPOINT_WRITE_SECONDS.time(**labels):
+        await save_feed_position(position, state_id=state_id)
+
+
+async def sleep(interval: float, reason: str, labels: dict[str, str]) -> None:
+    SLEEP_SECONDS.inc(interval, reason=reason, **labels)
+    await asyncio.sleep(interval)
+
+
+async def wait_next_page(
+    response: dict[str, Any],
+    labels: dict[str, str],
+    polling: Optional[AdaptivePolling] = None,
+) -> None:
+    no_items_interval: float = NO_ITEMS_INTERVAL
+    if polling is not None:
+        no_items_interval = polling.update(
+            len(response["data"]),
+            str(response["next_page"]["offset"]),
+        )
+
+    # Less than API_LIMIT items received
+    # That's mean we got all stuff from feed for now
+    # Wait before next request to avoid flooding the server
+    # and to give some time for new data to appear in feed
+    if len(response["data"]) < API_LIMIT:
+        await sleep(no_items_interval, "no_items", labels)
+
+    # Wait before next request
+    await sleep(FEED_STEP_INTERVAL, "feed_step", labels)
+
+
+def get_polling(feed_params: dict[str, Union[str, int]]) -> Optional[AdaptivePolling]:
+    if ADAPTIVE_POLLING and not feed_params.get("descending"):
+        return AdaptivePolling()
+    return None
+
+
+async def prefetch_feed_pages(
+    should_run: Callable[[], bool],
+    session: aiohttp.ClientSession,
+    url: str,
+    feed_params: dict[str, Union[str, int]],
+    json_loads: JSONDecoder,
+    pages: asyncio.Queue[Optional[dict[str, Any]]],
+    stop_offset: str = "",
+    polling: Optional[AdaptivePolling] = None,
+    streamed: Optional[StreamedPages] = None,
+) -> None:
+    """
+    Background feed pages producer
+    Follows next_page offsets and puts parsed pages to the queue,
+    the queue size bounds how far it may run ahead of data_handler.
+    None in the queue means there will be no more pages.
+    With `streamed`, the page items are dispatched while they are received
+    """
+    labels = get_metric_labels(url, feed_params)
+    while should_run():
+        response = await get_feed_page(
+            should_run,
+            session,
+            url,
+            feed_params,
+            json_loads,
+            stop_offset,
+            on_items=streamed.start_page() if streamed else None,
+        )
+        await pages.put(response)
+        if response is None or (not response["data"] and feed_params["descending"]):
+            return
+        feed_params.update(offset=response["next_page"]["offset"])
+        await wait_next_page(response, labels, polling)
+    await pages.put(None)
+
+
+async def get_prefetched_page(
+    pages: asyncio.Queue[Optional[dict[str, Any]]],
+    prefetch_task: asyncio.Task[None],
+) -> Optional[dict[str, Any]]:
+    """
+    Get next page from prefetch queue
+    Re-raises prefetch task exception if it failed
+    """
+    if pages.empty() and prefetch_task.done():
+        prefetch_task.result()
+        return None
+    get_page = asyncio.ensure_future(pages.get())
+    await asyncio.wait(
+        {get_page, prefetch_task},
+        return_when=asyncio.FIRST_COMPLETED,
+    )
+    if get_page.done():
+        return get_page.result()
+    get_page.cancel()
+    return await get_prefetched_page(pages, prefetch_task)
+
+
+async def get_feed_page(
+    should_run: Callable[[], bool],
+    session: aiohttp.ClientSession,
+    url: str,
+    feed_params: dict[str, Union[str, int]],
+    json_loads: JSONDecoder,
+    stop_offset: str = "",
+    on_items: Optional[Callable[[list[Any]], Awaitable[None]]] = None,
+) -> Optional[dict[str, Any]]:
+    """
+    Request feed page at feed_params offset
+    Retries on errors until a valid page is received
+    on_items gets the items of a streamed page (FEED_STREAMING_PARSE)
+    as soon as they are received, again if the page is retried
+    Returns None if crawler should stop:
+     - configured stop offset is reached
+     - should_run returns False
+    Raises InvalidOffset if feed responds with 404
+    """
+    labels = get_metric_labels(url, feed_params)
+    limiter = get_rate_limiter(session)
+    hedger = get_hedger(url)
     while should_run():
         # Check if we reached configured stop offset
-        stop_offset = (
-            STOP_BACKWARD_OFFSET
-            if bool(feed_params.get("descending"))
-            else STOP_FORWARD_OFFSET
-        )
         if stop_offset:
             current_offset_ts = get_offset_timestamp(str(feed_params.get("offset", "")))
             stop_offset_ts = get_offset_timestamp(stop_offset)
@@ -328,7 +867,7 @@ async def crawler(
                             "FEED_PARAMS": feed_params,
                         },
                     )
-                    break
+                    return None
 
         # Ensure new forward page is cooked enough
         if FORWARD_CHANGES_COOLDOWN_SECONDS and SLEEP_FORWARD_CHANGES_SECONDS:
@@ -353,7 +892,7 @@ async def crawler(
                         "FEED_URL": url,
                     },
                 )
-                await asyncio.sleep(SLEEP_FORWARD_CHANGES_SECONDS)
+                await sleep(SLEEP_FORWARD_CHANGES_SECONDS, "cooldown", labels)
                 continue
 
         logger.debug(
@@ -369,8 +908,18 @@ async def crawler(
 
         try:
             # Make request to feed
-            resp = await session.get(url, params=feed_params)
-        except aiohttp.ClientError as e:
+            if limiter is not None:
+                waited = await limiter.acquire(get_priority(feed_params["descending"]))
+                SLEEP_SECONDS.inc(waited, reason="rate_limit", **labels)
+            with FEED_REQUEST_SECONDS.time(**labels):
+                if hedger is not None and not feed_params["descending"]:
+                    resp = await hedger.request(
+                        partial(session.get, url, params=feed_params),
+                        limiter,
+                    )
+                else:
+                    resp = await session.get(url, params=feed_params)
+        except REQUEST_ERRORS as e:
             logger.warning(
                 f"Crawler exception: {type(e)} {e}",
                 extra={
@@ -378,9 +927,13 @@ async def crawler(
                     "FEED_URL": url,
                 },
             )
-            await asyncio.sleep(CONNECTION_ERROR_INTERVAL)
+            await sleep(CONNECTION_ERROR_INTERVAL, "connection_error", labels)
             continue
 
+        HTTP_RESPONSES.inc(source="feed", status=str(resp.status))
+        if limiter is not None:
+            limiter.on_response(resp)
+
         if resp.status == 429:
             logger.warning(
                 "Too many requests while getting feed",
@@ -389,8 +942,10 @@ async def crawler(
                     "FEED_URL": url,
                 },
             )
-            await asyncio.sleep(TOO_MANY_REQUESTS_INTERVAL)
-            await asyncio.sleep(FEED_STEP_INTERVAL)
+            if limiter is None:
+                await sleep(TOO_MANY_REQUESTS_INTERVAL, "too_many_requests", labels)
+                await sleep(FEED_STEP_INTERVAL, "feed_step", labels)
+            # otherwise the limiter pauses all the requests
             continue
 
         elif resp.status == 412:
@@ -401,7 +956,7 @@ async def crawler(
                     "FEED_URL": url,
                 },
             )
-            await asyncio.sleep(FEED_STEP_INTERVAL)
+            await sleep(FEED_STEP_INTERVAL, "feed_error", labels)
             continue
 
         elif resp.status == 404:
@@ -412,17 +967,7 @@ async def crawler(
                     "FEED_URL": url,
                 },
             )
-            await drop_feed_position()
-            logger.info(
-                "Drop feed position.",
-                extra={
-                    "MESSAGE_ID": "CRAWLER_DROP_FEED_POSITION",
-                    "FEED_URL": url,
-                },
-            )
-            # The feed is messed up for some reason
-            # Stop crawling
-            break
+            raise InvalidOffset(feed_params["offset"])
 
         elif resp.status != 200:
             logger.error(
@@ -432,13 +977,13 @@ async def crawler(
                     "FEED_URL": url,
                 },
             )
-            await asyncio.sleep(FEED_STEP_INTERVAL)
+            await sleep(FEED_STEP_INTERVAL, "feed_error", labels)
             continue
 
         # No errors, try to parse response
         try:
-            response = await resp.json(loads=json_loads)
-        except (aiohttp.ClientPayloadError, JSONDecodeError) as e:
+            response = await read_feed_response(resp, json_loads, feed_params, on_items)
+        except READ_JSON_ERRORS as e:
             logger.warning(
                 e,
                 extra={
@@ -446,64 +991,19 @@ async def crawler(
                     "FEED_URL": url,
                 },
             )
-            await asyncio.sleep(CONNECTION_ERROR_INTERVAL)
+            await sleep(CONNECTION_ERROR_INTERVAL, "connection_error", labels)
             continue
-
-        if not response["data"] and feed_params["descending"]:
-            # Got empty response for backward crawler
-            # That's mean we got all ancient stuff
-            # Time to stop backward crawler
-            logger.info(
-                "Stop backward crawling",
+        except InvalidFeedItem as e:
+            logger.error(
+                e,
                 extra={
-                    "MESSAGE_ID": "BACK_CRAWLER_STOP",
+                    "MESSAGE_ID": "INVALID_FEED_ITEM",
                     "FEED_URL": url,
                 },
             )
-            if BACKWARD_OFFSET or START_BACKWARD_OFFSET:
-                # In case of initial backward offset was set to feed start
-                # we need to save it because we will got empty response
-                # and will not hit usual position save
-                offset_key = get_offset_key(bool(feed_params["descending"]))
-                await save_feed_position({offset_key: response["next_page"]["offset"]})
-            # Stop crawling
-            break
-
-        # Check if we got new data
-        if response["data"]:
-            # Weeeee, got new data
-            # Process it
-            await data_handler(session, response["data"])
-            # Save new position
-            date_modified_key = get_date_modified_key(bool(feed_params["descending"]))
-            offset_key = get_offset_key(bool(feed_params["descending"]))
-            await save_feed_position(
-                {
-                    date_modified_key: response["data"][-1][DATE_MODIFIED_FIELD],
-                    offset_key: response["next_page"]["offset"],
-                },
-            )
-
-        # Update feed params with new offset for next request
-        feed_params.update(offset=response["next_page"]["offset"])
-
-        # Less than API_LIMIT items received
-        # That's mean we got all stuff from feed for now
-        # Wait before next request to avoid flooding the server
-        # and to give some time for new data to appear in feed
-        if len(response["data"]) < API_LIMIT:
-            await asyncio.sleep(NO_ITEMS_INTERVAL)
-
-        # Wait before next request
-        await asyncio.sleep(FEED_STEP_INTERVAL)
+            await sleep(FEED_STEP_INTERVAL, "feed_error", labels)
+            continue
 
-    # Left crawler loop
-    # Crawler is done
-    logger.info(
-        "Crawler stopped",
-        extra={
-            "MESSAGE_ID": "CRAWLER_STOPPED",
-            "FEED_URL": url,
-            "FEED_PARAMS": feed_params,
-        },
-    )
+        FEED_ITEMS.inc(len(response["data"]), **labels)
+        return response
+    return None
@@ -0,0 +1,98 @@
+from json.decoder import JSONDecodeError
+from typing import Any, Callable, Optional
+import json
+
+import aiohttp
+import asyncio
+from aiohttp.typedefs import JSONDecoder
+
+from prozorro_crawler.settings import logger, JSON_DECODER
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# decoders that parse the raw body, without decoding it to str first
+BYTES_JSON_DECODERS: set[Callable[..., Any]] = set()
+
+# orjson.JSONDecodeError is a JSONDecodeError subclass
+JSON_DECODE_ERRORS: tuple[type[Exception], ...] = (JSONDecodeError,)
+
+if orjson is not None:
+    BYTES_JSON_DECODERS.add(orjson.loads)
+
+if msgspec is not None:
+    BYTES_JSON_DECODERS.add(msgspec.json.decode)
+    JSON_DECODE_ERRORS += (msgspec.DecodeError,)
+
+# errors of read_json on a broken or timed out body
+READ_JSON_ERRORS: tuple[type[Exception], ...] = (
+    aiohttp.ClientPayloadError,
+    asyncio.TimeoutError,
+    *JSON_DECODE_ERRORS,
+)
+
+_default_json_loads: Optional[JSONDecoder] = None
+
+
+def get_json_loads(name: str = JSON_DECODER) -> JSONDecoder:
+    """
+    Returns json decoder by name: "orjson", "msgspec" or "json"
+    "auto" picks the first installed of them
+    """
+    if name in ("auto", "orjson") and orjson is not None:
+        return orjson.loads
+    if name in ("auto", "msgspec") and msgspec is not None:
+        return msgspec.json.decode  # type: ignore[no-any-return]
+    if name not in ("auto", "json"):
+        logger.warning(
+            f"JSON decoder {name} is not installed, json is used",
+            extra={"MESSAGE_ID": "JSON_DECODER_NOT_FOUND"},
+        )
+    return json.loads
+
+
+def get_default_json_loads() -> JSONDecoder:
+    global _default_json_loads
+    if _default_json_loads is None:
+        _default_json_loads = get_json_loads()
+    return _default_json_loads
+
+
+def set_default_json_loads(json_loads: JSONDecoder) -> None:
+    """
+    Sets the decoder used when none is passed (e.g. by process_resource)
+    """
+    global _default_json_loads
+    _default_json_loads = json_loads
+
+
+def accepts_bytes(json_loads: JSONDecoder) -> bool:
+    return json_loads in BYTES_JSON_DECODERS or getattr(
+        json_loads, "accepts_bytes", False
+    )
+
+
+def loads_body(body: bytes, json_loads: JSONDecoder) -> Any:
+    """
+    Decodes a json body that is read already
+    """
+    if accepts_bytes(json_loads):
+        return json_loads(body)  # type: ignore[arg-type]
+    return json_loads(body.decode())
+
+
+async def read_json(resp: aiohttp.ClientResponse, json_loads: JSONDecoder) -> Any:
+    """
+    Bytes decoders get the body exactly as it's read, without a str copy,
+    others get the text as with resp.json
+    """
+    if accepts_bytes(json_loads):
+        return json_loads(await resp.read())  # type: ignore[arg-type]
+    return await resp.json(loads=json_loads)
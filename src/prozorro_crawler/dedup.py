@@ -0,0 +1,106 @@
+from collections import OrderedDict
+from datetime import datetime
+from time import monotonic
+from typing import Any, Iterable, Optional
+
+from prozorro_crawler.metrics import DEDUP_ITEMS
+from prozorro_crawler.settings import (
+    DATE_MODIFIED_FIELD,
+    DEDUP_CACHE_SIZE,
+    DEDUP_TTL,
+)
+
+
+class DedupCache:
+    """
+    Latest versions of the objects passed to the data handler
+    (id -> dateModified, bounded LRU, entries expire after `ttl` seconds)
+
+    A feed item is skipped if the same or a newer version is cached:
+    repeated (id, dateModified) items and older versions that the backward
+    crawler finds after the forward crawler has handled the object.
+    Items are cached with `add` once the position of their page is saved,
+    so the versions of a page that wasn't saved are handled again
+    """
+
+    def __init__(
+        self,
+        size: int = DEDUP_CACHE_SIZE,
+        ttl: float = DEDUP_TTL,
+    ) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.entries: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    def get(self, object_id: str) -> Optional[str]:
+        """
+        Cached version of the object, None if it's not cached or expired
+        """
+        cached = self.entries.get(object_id)
+        if cached is None or (self.ttl and monotonic() - cached[1] > self.ttl):
+            return None
+        self.entries.move_to_end(object_id)
+        return cached[0]
+
+    def is_duplicate(self, item: Any) -> bool:
+        cached_date_modified = self.get(item["id"])
+        return cached_date_modified is not None and not is_newer(
+            item[DATE_MODIFIED_FIELD], cached_date_modified
+        )
+
+    def add(self, items: Iterable[Any]) -> None:
+        """
+        Caches the handled items
+        """
+        now = monotonic()
+        for item in items:
+            object_id, date_modified = item["id"], item[DATE_MODIFIED_FIELD]
+            cached_date_modified = self.get(object_id)
+            if cached_date_modified is None or is_newer(
+                date_modified, cached_date_modified
+            ):
+                self.entries[object_id] = (date_modified, now)
+                self.entries.move_to_end(object_id)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def filter(self, items: list[Any], labels: dict[str, str]) -> list[Any]:
+        """
+        Items that aren't cached and aren't repeated in the list
+        """
+        result = []
+        # versions in the list, they are cached after the page is saved
+        versions: dict[str, str] = {}
+        for item in items:
+            object_id, date_modified = item["id"], item[DATE_MODIFIED_FIELD]
+            version = versions.get(object_id)
+            if version is not None and not is_newer(date_modified, version):
+                continue
+            if self.is_duplicate(item):
+                continue
+            versions[object_id] = date_modified
+            result.append(item)
+        DEDUP_ITEMS.inc(len(items) - len(result), result="hit", **labels)
+        DEDUP_ITEMS.inc(len(result), result="miss", **labels)
+        return result
+
+
+def is_newer(date_modified: str, cached_date_modified: str) -> bool:
+    if date_modified == cached_date_modified:
+        return False
+    try:
+        return datetime.fromisoformat(date_modified) > datetime.fromisoformat(
+            cached_date_modified
+        )
+    except (TypeError, ValueError):
+        return True
+
+
+# shared by the crawlers of the same feed
+dedup_caches: dict[str, DedupCache] = {}
+
+
+def get_dedup_cache(url: str) -> DedupCache:
+    if url not in dedup_caches:
+        dedup_caches[url] = DedupCache()
+    return dedup_caches[url]
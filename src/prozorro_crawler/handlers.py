@@ -0,0 +1,322 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from time import monotonic
+from typing import Any, Awaitable, Callable, Optional, Sequence
+import multiprocessing
+import os
+
+import aiohttp
+import asyncio
+
+from prozorro_crawler.settings import (
+    logger,
+    ITEM_HANDLER_CONCURRENCY,
+    PROCESS_POOL_WORKERS,
+    PROCESS_POOL_BATCH_SIZE,
+    PROCESS_POOL_MAX_PENDING,
+    PROCESS_POOL_START_METHOD,
+)
+
+
+class DispatchHandler:
+    """
+    Data handler that processes pages in background
+
+    Can be used as a regular data_handler:
+    every call waits until all the page items are processed.
+    The crawler instead uses `dispatch` to start processing of the next pages
+    while the previous ones are still in progress
+    (see OrderedCheckpoints for how the feed position is saved then)
+    """
+
+    async def __call__(
+        self,
+        session: aiohttp.ClientSession,
+        items: list[dict[str, Any]],
+    ) -> None:
+        processing = await self.dispatch(session, items)
+        await processing
+
+    async def dispatch(
+        self,
+        session: aiohttp.ClientSession,
+        items: list[dict[str, Any]],
+        budget: Optional[asyncio.Semaphore] = None,
+    ) -> asyncio.Future[Any]:
+        """
+        Start processing of the items
+        Returns a future that is done when all the items are processed
+        budget additionally limits the workers these items can take
+        (see CrawlerScheduler)
+        """
+        raise NotImplementedError
+
+
+class ItemHandler(DispatchHandler):
+    """
+    Data handler that processes feed items one by one with item_handler
+    Items are processed concurrently, at most `concurrency` at the same time
+    """
+
+    def __init__(
+        self,
+        item_handler: Callable[
+            [aiohttp.ClientSession, dict[str, Any]],
+            Awaitable[None],
+        ],
+        concurrency: int = ITEM_HANDLER_CONCURRENCY,
+    ) -> None:
+        self.item_handler = item_handler
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    async def dispatch(
+        self,
+        session: aiohttp.ClientSession,
+        items: list[dict[str, Any]],
+        budget: Optional[asyncio.Semaphore] = None,
+    ) -> asyncio.Future[list[None]]:
+        """
+        Start processing of the items
+        Returns as soon as the last item is started (waits for free workers),
+        the returned future is done when all the items are processed
+        budget additionally limits the workers these items can take
+        (see CrawlerScheduler)
+        """
+        tasks = []
+        for item in items:
+            if budget is not None:
+                await budget.acquire()
+            await self.semaphore.acquire()
+            tasks.append(asyncio.create_task(self.process_item(session, item, budget)))
+        return asyncio.gather(*tasks)
+
+    async def process_item(
+        self,
+        session: aiohttp.ClientSession,
+        item: dict[str, Any],
+        budget: Optional[asyncio.Semaphore] = None,
+    ) -> None:
+        try:
+            await self.item_handler(session, item)
+        finally:
+            self.semaphore.release()
+            if budget is not None:
+                budget.release()
+
+
+class ProcessPoolHandler(DispatchHandler):
+    """
+    Data handler that runs CPU-bound `handler(items)` in worker processes,
+    so it doesn't block the event loop (feed requests, lock updates, checkpoints)
+    Page items are sent to the workers in batches of `batch_size` (0 - whole pages),
+    the handler, the items and the result must be picklable
+    (feed items are sent as dicts). `on_result(session, result)` is awaited
+    in the crawler process with the result of every batch (e.g. to save it)
+
+    At most `max_pending` batches are processed or wait for a worker,
+    dispatch waits for a free slot, so the crawlers don't fetch pages
+    faster than the workers can process them
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[list[dict[str, Any]]], Any],
+        on_result: Optional[
+            Callable[[aiohttp.ClientSession, Any], Awaitable[None]]
+        ] = None,
+        workers: int = PROCESS_POOL_WORKERS,
+        batch_size: int = PROCESS_POOL_BATCH_SIZE,
+        max_pending: int = PROCESS_POOL_MAX_PENDING,
+        start_method: str = PROCESS_POOL_START_METHOD,
+    ) -> None:
+        self.handler = handler
+        self.on_result = on_result
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(max_pending or self.workers * 2)
+        self.start_method = start_method
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                self.workers,
+                mp_context=multiprocessing.get_context(self.start_method),
+            )
+        return self.executor
+
+    async def dispatch(
+        self,
+        session: aiohttp.ClientSession,
+        items: list[dict[str, Any]],
+        budget: Optional[asyncio.Semaphore] = None,
+    ) -> asyncio.Future[list[None]]:
+        """
+        Start processing of the items
+        Returns as soon as the last batch is sent (waits for free slots)
+        """
+        tasks = []
+        size = self.batch_size or len(items)
+        for start in range(0, len(items), size):
+            if budget is not None:
+                await budget.acquire()
+            await self.semaphore.acquire()
+            batch = [dict(item) for item in items[start : start + size]]
+            tasks.append(
+                asyncio.create_task(self.process_batch(session, batch, budget)),
+            )
+        return asyncio.gather(*tasks)
+
+    async def process_batch(
+        self,
+        session: aiohttp.ClientSession,
+        batch: list[dict[str, Any]],
+        budget: Optional[asyncio.Semaphore] = None,
+    ) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+            executor = self.get_executor()
+            try:
+                result = await loop.run_in_executor(
+                    executor,
+                    self.handler,
+                    batch,
+                )
+            except BrokenProcessPool:
+                logger.error(
+                    "Handler worker process died",
+                    extra={"MESSAGE_ID": "PROCESS_POOL_BROKEN"},
+                )
+                # the next batches get a new pool,
+                # unless a failed batch of this pool has already replaced it
+                if self.executor is executor:
+                    self.executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            if self.on_result is not None:
+                await self.on_result(session, result)
+        finally:
+            self.semaphore.release()
+            if budget is not None:
+                budget.release()
+
+    def close(self, wait: bool = True) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=wait, cancel_futures=not wait)
+            self.executor = None
+
+
+class OrderedCheckpoints:
+    """
+    Feed positions of the pages that are being processed, in feed order
+    A position can be saved only when its page and all the pages
+    before it are processed, so the saved position is the watermark
+    of the continuously processed part of the feed
+
+    The handled items of the popped pages are kept in `done_items`
+    until the caller saves the position (e.g. for the dedup cache)
+    """
+
+    def __init__(self) -> None:
+        self.pages: deque[tuple[asyncio.Future[Any], dict[str, Any], Sequence[Any]]] = (
+            deque()
+        )
+        self.done_items: list[Any] = []
+
+    def add(
+        self,
+        processing: asyncio.Future[Any],
+        position: dict[str, Any],
+        items: Sequence[Any] = (),
+    ) -> None:
+        self.pages.append((processing, position, items))
+
+    def pop_done(self) -> Optional[dict[str, Any]]:
+        """
+        Returns the latest position that can be saved (if any)
+        Raises if processing of any of the done pages failed
+        """
+        position = None
+        while self.pages and self.pages[0][0].done():
+            processing, position, items = self.pages.popleft()
+            processing.result()
+            self.done_items.extend(items)
+        return position
+
+    def pop_done_items(self) -> list[Any]:
+        items, self.done_items = self.done_items, []
+        return items
+
+    async def wait_all(self) -> Optional[dict[str, Any]]:
+        if self.pages:
+            await asyncio.wait([processing for processing, _, _ in self.pages])
+        return self.pop_done()
+
+    def cancel(self) -> None:
+        while self.pages:
+            processing, _, _ = self.pages.popleft()
+            processing.cancel()
+
+
+class StreamedPages:
+    """
+    Items of streamed feed pages (FEED_STREAMING_PARSE) are dispatched
+    as soon as they are received, before the rest of the page
+    Pages are started in feed order with `start_page`,
+    `pop` returns the processing and the dispatched items of the oldest one
+    """
+
+    def __init__(
+        self,
+        handler: DispatchHandler,
+        session: aiohttp.ClientSession,
+        filter_items: Callable[[list[Any]], list[Any]],
+        budget: Optional[asyncio.Semaphore] = None,
+    ) -> None:
+        self.handler = handler
+        self.session = session
+        self.filter_items = filter_items
+        self.budget = budget
+        # dispatched items, their processing
+        # and the first dispatch time of every page
+        self.pages: deque[tuple[list[Any], list[asyncio.Future[Any]], list[float]]] = (
+            deque()
+        )
+
+    def start_page(self) -> Callable[[list[Any]], Awaitable[None]]:
+        """
+        Returns the items callback of the next page
+        """
+        dispatched: list[Any] = []
+        futures: list[asyncio.Future[Any]] = []
+        started: list[float] = []
+        self.pages.append((dispatched, futures, started))
+
+        async def dispatch(items: list[Any]) -> None:
+            items = self.filter_items(items)
+            if not items:
+                return None
+            if not started:
+                started.append(monotonic())
+            dispatched.extend(items)
+            futures.append(
+                await self.handler.dispatch(self.session, items, budget=self.budget),
+            )
+
+        return dispatch
+
+    def pop(self) -> tuple[asyncio.Future[Any], list[Any], Optional[float]]:
+        """
+        Returns a future that is done when all the dispatched items
+        of the oldest page are processed, the items
+        and the time they were first dispatched (None if none were)
+        """
+        dispatched, futures, started = self.pages.popleft()
+        return asyncio.gather(*futures), dispatched, started[0] if started else None
+
+    def cancel(self) -> None:
+        while self.pages:
+            _, futures, _ = self.pages.popleft()
+            for processing in futures:
+                processing.cancel()
@@ -0,0 +1,145 @@
+from collections import deque
+from time import monotonic
+from typing import Awaitable, Callable, Optional
+
+import aiohttp
+import asyncio
+
+from prozorro_crawler.metrics import HEDGED_REQUESTS
+from prozorro_crawler.ratelimit import RateLimiter
+from prozorro_crawler.settings import (
+    HEDGE_REQUESTS,
+    HEDGE_PERCENTILE,
+    HEDGE_WINDOW,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_MIN_DELAY,
+    HEDGE_BUDGET,
+    HEDGE_BUDGET_BURST,
+)
+
+Request = Callable[[], Awaitable[aiohttp.ClientResponse]]
+
+
+class Hedger:
+    """
+    Hedged requests: if a request isn't answered within the rolling
+    `percentile` latency of the last `window` requests, a duplicate is sent
+    (the session pool gives it another connection) and the first successful
+    response wins, the other request is cancelled.
+    Error responses (429, 5xx) don't win, the first request one is returned
+    if none of them succeeded
+
+    Duplicates are limited by a budget: every request adds `budget` tokens
+    (up to `burst`), a duplicate takes one, so at most `budget`
+    of the requests are sent twice. A duplicate takes a rate limiter token
+    too, it isn't sent if the limiter has none available
+    """
+
+    def __init__(
+        self,
+        name: str,
+        percentile: float = HEDGE_PERCENTILE,
+        window: int = HEDGE_WINDOW,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        min_delay: float = HEDGE_MIN_DELAY,
+        budget: float = HEDGE_BUDGET,
+        burst: float = HEDGE_BUDGET_BURST,
+    ) -> None:
+        self.name = name
+        self.percentile = percentile
+        self.latencies: deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.budget = budget
+        self.burst = burst
+        self.tokens = 0.0
+
+    def get_delay(self) -> Optional[float]:
+        """
+        Time to wait before a duplicate request, None if there are few samples yet
+        """
+        if len(self.latencies) < max(self.min_samples, 1):
+            return None
+        latencies = sorted(self.latencies)
+        index = min(int(len(latencies) * self.percentile / 100), len(latencies) - 1)
+        return max(latencies[index], self.min_delay)
+
+    def take_token(self, limiter: Optional[RateLimiter] = None) -> bool:
+        if self.tokens < 1:
+            return False
+        if limiter is not None and not limiter.try_acquire():
+            return False
+        self.tokens -= 1
+        return True
+
+    async def request(
+        self,
+        send: Request,
+        limiter: Optional[RateLimiter] = None,
+    ) -> aiohttp.ClientResponse:
+        """
+        Returns the first successful response of `send` calls
+        Returns the response or raises the error of the first request
+        if none of them succeeded
+        The other responses are passed to the limiter (e.g. 429) and released
+        """
+        self.tokens = min(self.burst, self.tokens + self.budget)
+        delay = self.get_delay()
+        start = monotonic()
+        first = asyncio.ensure_future(send())
+        if delay is None:
+            resp = await first
+            self.latencies.append(monotonic() - start)
+            return resp
+
+        tasks = [first]
+        winner = None
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self.take_token(limiter):
+                HEDGED_REQUESTS.inc(source=self.name, result="sent")
+                tasks.append(asyncio.ensure_future(send()))
+            pending = set(tasks)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(
+                    pending,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                winner = next((t for t in tasks if t in done and is_success(t)), None)
+            if winner is None:
+                winner = first
+                return await first
+            self.latencies.append(monotonic() - start)
+            if winner is not first:
+                HEDGED_REQUESTS.inc(source=self.name, result="won")
+            return winner.result()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif task is not winner and not task.cancelled():
+                    # a response that didn't win isn't read,
+                    # its connection goes back to the pool
+                    if task.exception() is None:
+                        if limiter is not None:
+                            limiter.on_response(task.result())
+                        task.result().release()
+
+
+def is_success(task: asyncio.Future[aiohttp.ClientResponse]) -> bool:
+    return task.exception() is None and task.result().status < 400
+
+
+# request latency distributions by source (a feed url, "objects")
+hedgers: dict[str, Hedger] = {}
+
+
+def get_hedger(name: str) -> Optional[Hedger]:
+    """
+    Hedger of the requests source, None if HEDGE_REQUESTS isn't set
+    """
+    if not HEDGE_REQUESTS:
+        return None
+    if name not in hedgers:
+        hedgers[name] = Hedger(name)
+    return hedgers[name]
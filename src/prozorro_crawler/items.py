@@ -0,0 +1,132 @@
+from functools import lru_cache
+from typing import Any, Iterator, Optional
+
+from prozorro_crawler.settings import DATE_MODIFIED_FIELD
+
+
+class InvalidFeedItem(ValueError):
+    """
+    Feed item without id or DATE_MODIFIED_FIELD or with undeclared fields
+    """
+
+
+# default of getattr for the unset fields
+_missing = object()
+
+
+class FeedItem:
+    """
+    Compact feed item: the fields are slots instead of dict keys
+    Created by get_item_class for the crawler opt_fields.
+
+    The fields are attributes (item.status), fields missing
+    in the feed item are unset (hasattr(item, "status") is False).
+    Also can be read as a dict by existing data handlers:
+    item["status"], item.get("status"), "status" in item, dict(item)
+    """
+
+    __slots__ = ()
+
+    # set by get_item_class
+    opt_fields = ""
+    fields: tuple[str, ...] = ()
+    field_set: frozenset[str] = frozenset()
+
+    # mutable mapping semantics: equal to dicts, so not hashable
+    __hash__ = None  # type: ignore[assignment]
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "FeedItem":
+        item = cls.__new__(cls)
+        field_set = cls.field_set
+        for field, value in data.items():
+            if field not in field_set:
+                raise InvalidFeedItem(
+                    f"Feed item field {field!r} isn't in opt_fields {cls.opt_fields!r}"
+                )
+            setattr(item, field, value)
+        if "id" not in data or DATE_MODIFIED_FIELD not in data:
+            raise InvalidFeedItem(f"Feed item without id or {DATE_MODIFIED_FIELD}")
+        return item
+
+    def __getitem__(self, key: str) -> Any:
+        # the item attributes are the fields only (not the methods)
+        try:
+            if key in self.field_set:
+                return getattr(self, key)
+        except AttributeError:
+            pass
+        raise KeyError(key)
+
+    def get(self, key: str, default: Optional[Any] = None) -> Any:
+        if key in self.field_set:
+            return getattr(self, key, default)
+        return default
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.field_set and hasattr(self, key)
+
+    def keys(self) -> list[str]:
+        return [field for field, _ in self.items()]
+
+    def values(self) -> list[Any]:
+        return [value for _, value in self.items()]
+
+    def items(self) -> list[tuple[str, Any]]:
+        items = []
+        for field in self.fields:
+            value = getattr(self, field, _missing)
+            if value is not _missing:
+                items.append((field, value))
+        return items
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.items())
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, (FeedItem, dict)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __reduce__(self) -> tuple[Any, ...]:
+        # generated classes can't be found by name, so they're found by opt_fields
+        return load_item, (self.opt_fields, dict(self.items()))
+
+    def __repr__(self) -> str:
+        return f"FeedItem({dict(self.items())})"
+
+
+def load_item(opt_fields: str, data: dict[str, Any]) -> FeedItem:
+    """
+    Unpickles a FeedItem (see FeedItem.__reduce__)
+    """
+    return get_item_class(opt_fields).from_dict(data)
+
+
+@lru_cache
+def get_item_class(opt_fields: str) -> type[FeedItem]:
+    """
+    FeedItem class with id, DATE_MODIFIED_FIELD and opt_fields (comma separated)
+    """
+    fields = ["id", DATE_MODIFIED_FIELD]
+    for field in opt_fields.split(","):
+        if field and field not in fields:
+            fields.append(field)
+    for field in fields:
+        if not field.isidentifier() or hasattr(FeedItem, field):
+            raise ValueError(f"Feed item field {field!r} can't be an attribute")
+    name = f"FeedItem[{','.join(fields)}]"
+    return type(
+        name,
+        (FeedItem,),
+        {
+            "__slots__": tuple(fields),
+            "__qualname__": name,
+            "opt_fields": opt_fields,
+            "fields": tuple(fields),
+            "field_set": frozenset(fields),
+        },
+    )
@@ -0,0 +1,404 @@
+from argparse import ArgumentParser
+from contextlib import closing
+from time import time
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Generator,
+    Iterator,
+    NamedTuple,
+    Optional,
+)
+from urllib.parse import urlparse
+import gzip
+import json
+import os
+import zlib
+
+import aiohttp
+import asyncio
+
+from prozorro_crawler.journal_index import JournalIndex, TimeRecord
+from prozorro_crawler.partition import parse_partition
+from prozorro_crawler.settings import (
+    logger,
+    API_RESOURCE,
+    ITEM_PARTITION,
+    JOURNAL_DIR,
+    JOURNAL_SEGMENT_SIZE,
+    JOURNAL_COMPRESS_LEVEL,
+    JOURNAL_INDEX,
+    JOURNAL_REPLAY_SINCE,
+    JOURNAL_REPLAY_UNTIL,
+)
+from prozorro_crawler.utils import get_offset_timestamp, get_resource_url
+
+SEGMENT_SUFFIX = ".jsonl.gz"
+DIRECTIONS = ("backward", "forward")
+
+
+class JournalPage(NamedTuple):
+    offset: str
+    timestamp: float
+    fetched_at: float
+    data: list[dict[str, Any]]
+
+
+class Journal:
+    """
+    Append-only journal of the feed pages received by a crawler
+    Pages are appended to segment files named by the offset timestamp
+    of their first page, a new segment is started after `segment_size` bytes.
+    Every page is a separate gzip member holding one json line,
+    so a segment is a valid .jsonl.gz file, a page can be read
+    from its position without decompressing the pages before it
+    and a page cut by a crash doesn't break the previous ones
+
+    With `index`, pages are indexed by offset timestamp and item ids
+    (see journal_index.JournalIndex)
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        descending: bool = False,
+        segment_size: int = JOURNAL_SEGMENT_SIZE,
+        compress_level: int = JOURNAL_COMPRESS_LEVEL,
+        index: bool = JOURNAL_INDEX,
+    ) -> None:
+        self.directory = directory
+        self.descending = descending
+        self.segment_size = segment_size
+        self.compress_level = compress_level
+        self.segment: Optional[str] = None
+        self.segment_timestamp = 0.0
+        self.lock = asyncio.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.index = JournalIndex(directory, descending) if index else None
+
+    async def append(self, offset: str, data: list[Any]) -> None:
+        """
+        Appends the page, `offset` is its next_page offset
+        """
+        timestamp = get_offset_timestamp(offset)
+        page = JournalPage(offset, timestamp or time(), time(), data)
+        async with self.lock:
+            try:
+                await asyncio.to_thread(self.write, page)
+            except (OSError, TypeError, ValueError) as e:
+                logger.error(
+                    f"Can't journal feed page {offset}: {e}",
+                    extra={"MESSAGE_ID": "JOURNAL_ERROR"},
+                )
+
+    def write(self, page: JournalPage) -> tuple[str, int]:
+        """
+        Returns the segment and the position of the page
+        """
+        member = gzip.compress(encode_page(page), compresslevel=self.compress_level)
+        if self.segment is None or os.path.getsize(self.segment) >= self.segment_size:
+            self.segment_timestamp = page.timestamp
+            self.segment = os.path.join(
+                self.directory,
+                get_segment_name(page.timestamp),
+            )
+        with open(self.segment, "ab") as f:
+            position = f.tell()
+            f.write(member)
+        if self.index is not None:
+            self.index.add(
+                TimeRecord(page.timestamp, self.segment_timestamp, position),
+                [item["id"] for item in page.data],
+            )
+        return self.segment, position
+
+    def get_segments(self) -> list[str]:
+        """
+        Segment files in the crawl order
+        """
+        return get_segments(self.directory, self.descending)
+
+
+def encode_page(page: JournalPage) -> bytes:
+    # FeedItem items are written as dicts
+    return json.dumps(page._asdict(), default=dict).encode() + b"\n"
+
+
+def decode_page(line: bytes) -> JournalPage:
+    return JournalPage(**json.loads(line))
+
+
+def get_segment_name(timestamp: float) -> str:
+    # zero padded, so names are sorted by timestamp
+    return f"{timestamp:017.6f}{SEGMENT_SUFFIX}"
+
+
+def get_segments(directory: str, descending: bool = False) -> list[str]:
+    try:
+        names = sorted(n for n in os.listdir(directory) if n.endswith(SEGMENT_SUFFIX))
+    except FileNotFoundError:
+        return []
+    if descending:
+        names.reverse()
+    return [os.path.join(directory, name) for name in names]
+
+
+def read_segment(path: str, position: int = 0) -> Iterator[JournalPage]:
+    """
+    Pages of a segment starting from the position
+    A page that was being written when the crawler stopped is skipped
+    """
+    try:
+        with open(path, "rb") as raw:
+            raw.seek(position)
+            with gzip.GzipFile(fileobj=raw) as f:
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    yield decode_page(line)
+    except (OSError, EOFError, zlib.error, ValueError) as e:
+        logger.warning(
+            f"Can't read journal segment {path}: {e}",
+            extra={"MESSAGE_ID": "JOURNAL_ERROR"},
+        )
+
+
+def get_feed_name(url: str) -> str:
+    return urlparse(url).path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def get_journal_directory(url: str, state_id: Optional[str], direction: str) -> str:
+    return os.path.join(
+        JOURNAL_DIR, get_feed_name(url), state_id or "default", direction
+    )
+
+
+# crawlers of the same feed direction and state share the journal
+journals: dict[str, Journal] = {}
+
+
+def get_journal(url: str, state_id: Optional[str], direction: str) -> Optional[Journal]:
+    """
+    Journal of the crawler pages, None if JOURNAL_DIR isn't set
+    """
+    if not JOURNAL_DIR:
+        return None
+    directory = get_journal_directory(url, state_id, direction)
+    if directory not in journals:
+        journals[directory] = Journal(directory, descending=direction == "backward")
+    return journals[directory]
+
+
+def get_replay_directories(url: str) -> list[tuple[str, bool]]:
+    """
+    Journal directories of the feed (backward ones first) and their order
+    """
+    feed_directory = os.path.join(JOURNAL_DIR, get_feed_name(url))
+    try:
+        states = sorted(os.listdir(feed_directory))
+    except FileNotFoundError:
+        return []
+    return [
+        (os.path.join(feed_directory, state, direction), direction == "backward")
+        for direction in DIRECTIONS
+        for state in states
+        if os.path.isdir(os.path.join(feed_directory, state, direction))
+    ]
+
+
+async def replay_journal(
+    should_run: Callable[[], bool],
+    session: aiohttp.ClientSession,
+    url: str,
+    data_handler: Callable[
+        [aiohttp.ClientSession, list[dict[str, Any]]],
+        Awaitable[None],
+    ],
+    since: float = JOURNAL_REPLAY_SINCE,
+    until: float = JOURNAL_REPLAY_UNTIL,
+) -> None:
+    """
+    Feeds data_handler with the journaled pages of the feed
+    (offset timestamps between since and until, 0 means no limit)
+    instead of crawling the API. Feed positions aren't changed.
+    Only the items of ITEM_PARTITION are handled, as by the crawler
+    """
+    partition = parse_partition(ITEM_PARTITION)
+    pages = items = 0
+    logger.info(
+        "Journal replay started",
+        extra={"MESSAGE_ID": "JOURNAL_REPLAY_STARTED", "FEED_URL": url},
+    )
+    directories = await asyncio.to_thread(get_replay_directories, url)
+    for directory, descending in directories:
+        async for page in iter_pages(directory, descending, since, until):
+            if not should_run():
+                return None
+            data = page.data
+            if partition is not None:
+                data = partition.filter(data)
+            if data:
+                await data_handler(session, data)
+            pages += 1
+            items += len(data)
+    logger.info(
+        f"Journal replay finished: {pages} pages, {items} items",
+        extra={"MESSAGE_ID": "JOURNAL_REPLAY_FINISHED", "FEED_URL": url},
+    )
+
+
+async def iter_pages(
+    directory: str,
+    descending: bool = False,
+    since: float = 0,
+    until: float = 0,
+) -> AsyncIterator[JournalPage]:
+    """
+    read_pages, segments are read and decompressed in a thread
+    """
+    pages = read_pages(directory, descending, since, until)
+    with closing(pages):
+        while True:
+            page = await asyncio.to_thread(next, pages, None)
+            if page is None:
+                return
+            yield page
+
+
+def read_pages(
+    directory: str,
+    descending: bool = False,
+    since: float = 0,
+    until: float = 0,
+) -> Generator[JournalPage, None, None]:
+    """
+    Journal pages with offset timestamps between since and until (0 means no limit)
+    An indexed journal is read from the first of them, not from the start
+    """
+    # pages are in the feed order, the journal is read from `start`
+    # until the offset timestamps pass `end`
+    start, end = (until, since) if descending else (since, until)
+    segments = get_segments(directory, descending)
+    position = 0
+    if start:
+        segments, position = seek(directory, descending, segments, start)
+    for segment in segments:
+        for page in read_segment(segment, position):
+            if end and (page.timestamp < end if descending else page.timestamp > end):
+                return None
+            if not start or (
+                page.timestamp <= start if descending else page.timestamp >= start
+            ):
+                yield page
+        position = 0
+
+
+def seek(
+    directory: str,
+    descending: bool,
+    segments: list[str],
+    timestamp: float,
+) -> tuple[list[str], int]:
+    """
+    Segments and the position to read the pages at the timestamp
+    or after it (in the journal order) from, all of them if there's no index
+    """
+    index = JournalIndex.open(directory, descending)
+    if index is None or not segments:
+        return segments, 0
+    with closing(index):
+        timestamps = index.timestamps
+        if not len(timestamps) or (
+            get_segment_path(directory, timestamps[0]),
+            timestamps[0].position,
+        ) != (segments[0], 0):
+            # pages journaled before the index was enabled
+            return segments, 0
+        number = timestamps.find(timestamp)
+        if number == len(timestamps):
+            return [], 0
+        record = timestamps[number]
+    segment = get_segment_path(directory, record)
+    if segment not in segments:
+        return segments, 0
+    return segments[segments.index(segment) :], record.position
+
+
+def get_segment_path(directory: str, record: TimeRecord) -> str:
+    return os.path.join(directory, get_segment_name(record.segment_timestamp))
+
+
+def read_page(directory: str, record: TimeRecord) -> Optional[JournalPage]:
+    return next(
+        read_segment(get_segment_path(directory, record), record.position), None
+    )
+
+
+def get_last_seen_offset(url: str, item_id: str) -> Optional[str]:
+    """
+    Offset of the latest journaled page with the item
+    """
+    last_seen: Optional[tuple[TimeRecord, str]] = None
+    for directory, descending in get_replay_directories(url):
+        index = JournalIndex.open(directory, descending)
+        if index is None:
+            continue
+        with closing(index):
+            record = index.get_last_seen(item_id)
+        if record is not None and (last_seen is None or record > last_seen[0]):
+            last_seen = record, directory
+    if last_seen is None:
+        return None
+    page = read_page(last_seen[1], last_seen[0])
+    return page.offset if page is not None else None
+
+
+def get_offset_before(url: str, timestamp: float) -> Optional[str]:
+    """
+    Offset of the last forward journal page before the timestamp,
+    a forward crawler started from it gets the changes since the timestamp
+    """
+    found: Optional[tuple[TimeRecord, str]] = None
+    for directory, descending in get_replay_directories(url):
+        index = JournalIndex.open(directory, descending)
+        if index is None or descending:
+            continue
+        with closing(index):
+            number = index.timestamps.find(timestamp) - 1
+            if number < 0:
+                continue
+            record = index.timestamps[number]
+        if found is None or record > found[0]:
+            found = record, directory
+    if found is None:
+        return None
+    page = read_page(found[1], found[0])
+    return page.offset if page is not None else None
+
+
+def main() -> None:
+    parser = ArgumentParser(description="Feed journal lookups")
+    parser.add_argument("--resource", default=API_RESOURCE)
+    commands = parser.add_subparsers(dest="command", required=True)
+    last_seen = commands.add_parser("last-seen", help="offset of the last item change")
+    last_seen.add_argument("id")
+    offset = commands.add_parser(
+        "offset", help="forward offset before a unix timestamp"
+    )
+    offset.add_argument("timestamp", type=float)
+    args = parser.parse_args()
+
+    url = get_resource_url(args.resource)
+    if args.command == "last-seen":
+        result = get_last_seen_offset(url, args.id)
+    else:
+        result = get_offset_before(url, args.timestamp)
+    if result is None:
+        raise SystemExit("Not found in the journal")
+    print(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+from bisect import bisect_left
+from hashlib import md5
+from mmap import mmap, ACCESS_READ, ACCESS_WRITE
+from typing import NamedTuple, Optional
+import os
+import struct
+
+from prozorro_crawler.settings import JOURNAL_ID_INDEX_CAPACITY
+
+TIMESTAMPS_FILE = "timestamps.idx"
+IDS_FILE = "ids.idx"
+
+
+class TimeRecord(NamedTuple):
+    timestamp: float
+    segment_timestamp: float
+    position: int
+
+
+TIME_RECORD = struct.Struct("<ddQ")
+
+
+class TimeIndex:
+    """
+    Offset timestamp -> journal segment and position of every journaled page
+    Fixed size records in the journal order, so they're sorted by timestamp
+    (descending for backward journals) and `find` is a binary search
+    over the memory-mapped file
+    """
+
+    def __init__(
+        self, path: str, descending: bool = False, readonly: bool = False
+    ) -> None:
+        self.path = path
+        self.descending = descending
+        self.file = open(path, "rb" if readonly else "a+b")
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = size // TIME_RECORD.size
+        if not readonly and size % TIME_RECORD.size:
+            # a record cut by a crash
+            self.file.truncate(self.count * TIME_RECORD.size)
+        self.map: Optional[mmap] = None
+        self.mapped = 0
+
+    def append(self, record: TimeRecord) -> int:
+        """
+        Returns the record number
+        """
+        self.file.write(TIME_RECORD.pack(*record))
+        self.file.flush()
+        self.count += 1
+        return self.count - 1
+
+    def get_map(self) -> mmap:
+        if self.map is None or self.mapped < self.count:
+            if self.map is not None:
+                self.map.close()
+            self.map = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+            self.mapped = len(self.map) // TIME_RECORD.size
+        return self.map
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, number: int) -> TimeRecord:
+        if not 0 <= number < self.count:
+            raise IndexError(number)
+        return TimeRecord(
+            *TIME_RECORD.unpack_from(self.get_map(), number * TIME_RECORD.size)
+        )
+
+    def find(self, timestamp: float) -> int:
+        """
+        Number of the first record at the timestamp or after it
+        (in the journal order), len(self) if there are none
+        """
+        if self.descending:
+            return bisect_left(self, -timestamp, key=lambda r: -r.timestamp)
+        return bisect_left(self, timestamp, key=lambda r: r.timestamp)
+
+    def close(self) -> None:
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+
+ID_HEADER = struct.Struct("<8sQQ")
+ID_SLOT = struct.Struct("<16sQ")
+ID_MAGIC = b"PZJIDX01"
+EMPTY_KEY = bytes(16)
+
+
+class IdIndex:
+    """
+    Item id -> number of the TimeIndex record of the page it was last seen in
+    Memory-mapped open addressing hash table of md5(id) keys,
+    rebuilt twice as large when it's 70% full
+    """
+
+    def __init__(
+        self,
+        path: str,
+        capacity: int = JOURNAL_ID_INDEX_CAPACITY,
+        readonly: bool = False,
+    ) -> None:
+        self.path = path
+        self.readonly = readonly
+        if not readonly and not os.path.exists(path):
+            self.create(path, capacity)
+        self.open()
+
+    @staticmethod
+    def create(path: str, capacity: int) -> None:
+        # a power of two, so a slot is a key hash mask
+        capacity = 1 << max(capacity - 1, 1).bit_length()
+        with open(path, "wb") as f:
+            f.write(ID_HEADER.pack(ID_MAGIC, capacity, 0))
+            f.truncate(ID_HEADER.size + capacity * ID_SLOT.size)
+
+    def open(self) -> None:
+        self.file = open(self.path, "rb" if self.readonly else "r+b")
+        access = ACCESS_READ if self.readonly else ACCESS_WRITE
+        self.map = mmap(self.file.fileno(), 0, access=access)
+        magic, self.capacity, self.count = ID_HEADER.unpack_from(self.map)
+        if magic != ID_MAGIC:
+            raise ValueError(f"{self.path} isn't a journal id index")
+
+    def get_slot(self, key: bytes) -> tuple[int, Optional[int]]:
+        """
+        Slot of the key and its value (None if it's a free slot)
+        """
+        mask = self.capacity - 1
+        slot = int.from_bytes(key[:8], "little") & mask
+        while True:
+            slot_key, value = ID_SLOT.unpack_from(
+                self.map, ID_HEADER.size + slot * ID_SLOT.size
+            )
+            if slot_key == key:
+                return slot, value
+            if slot_key == EMPTY_KEY:
+                return slot, None
+            slot = (slot + 1) & mask
+
+    def get(self, item_id: str) -> Optional[int]:
+        return self.get_slot(get_key(item_id))[1]
+
+    def put(self, item_id: str, record: int, replace: bool = True) -> None:
+        key = get_key(item_id)
+        slot, value = self.get_slot(key)
+        if value is not None and not replace:
+            return None
+        ID_SLOT.pack_into(self.map, ID_HEADER.size + slot * ID_SLOT.size, key, record)
+        if value is None:
+            self.count += 1
+            ID_HEADER.pack_into(self.map, 0, ID_MAGIC, self.capacity, self.count)
+            if self.count * 10 >= self.capacity * 7:
+                self.grow()
+
+    def grow(self) -> None:
+        path = f"{self.path}.tmp"
+        self.create(path, self.capacity * 2)
+        new_index = IdIndex(path)
+        for slot in range(self.capacity):
+            key, value = ID_SLOT.unpack_from(
+                self.map, ID_HEADER.size + slot * ID_SLOT.size
+            )
+            if key != EMPTY_KEY:
+                new_slot, _ = new_index.get_slot(key)
+                ID_SLOT.pack_into(
+                    new_index.map,
+                    ID_HEADER.size + new_slot * ID_SLOT.size,
+                    key,
+                    value,
+                )
+        ID_HEADER.pack_into(new_index.map, 0, ID_MAGIC, new_index.capacity, self.count)
+        new_index.close()
+        self.close()
+        os.replace(path, self.path)
+        self.open()
+
+    def close(self) -> None:
+        self.map.close()
+        self.file.close()
+
+
+def get_key(item_id: str) -> bytes:
+    return md5(item_id.encode()).digest()
+
+
+class JournalIndex:
+    """
+    Indexes of a journal directory, updated as pages are journaled
+    In backward journals the first time an item is seen is the last change
+    """
+
+    def __init__(
+        self, directory: str, descending: bool = False, readonly: bool = False
+    ) -> None:
+        self.descending = descending
+        self.timestamps = TimeIndex(
+            os.path.join(directory, TIMESTAMPS_FILE),
+            descending=descending,
+            readonly=readonly,
+        )
+        self.ids = IdIndex(os.path.join(directory, IDS_FILE), readonly=readonly)
+
+    @classmethod
+    def open(cls, directory: str, descending: bool = False) -> Optional["JournalIndex"]:
+        """
+        Read-only index of the directory, None if it's not indexed
+        """
+        if not os.path.exists(os.path.join(directory, IDS_FILE)):
+            return None
+        return cls(directory, descending=descending, readonly=True)
+
+    def add(self, record: TimeRecord, ids: list[str]) -> None:
+        number = self.timestamps.append(record)
+        for item_id in ids:
+            self.ids.put(item_id, number, replace=not self.descending)
+
+    def get_last_seen(self, item_id: str) -> Optional[TimeRecord]:
+        number = self.ids.get(item_id)
+        if number is None or number >= len(self.timestamps):
+            return None
+        return self.timestamps[number]
+
+    def close(self) -> None:
+        self.timestamps.close()
+        self.ids.close()
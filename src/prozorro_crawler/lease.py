@@ -0,0 +1,303 @@
+from datetime import datetime, timedelta
+from functools import partial
+from math import ceil
+from time import monotonic
+from typing import Any, Callable, Coroutine, NamedTuple
+from uuid import uuid4
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+import asyncio
+
+from prozorro_crawler.lock import get_lock_collection, init_lock_index
+from prozorro_crawler.metrics import LEASES_OWNED, LEASE_CHANGES
+from prozorro_crawler.settings import (
+    logger,
+    LEASE_TIME,
+    LEASE_RENEW_INTERVAL,
+    LOCK_PROCESS_NAME,
+)
+
+
+class LeaseWork(NamedTuple):
+    # unique in the group, e.g. "tenders.backfill.2"
+    name: str
+    # runs the work while should_run() is true
+    run: Callable[[Callable[[], bool]], Coroutine[Any, Any, None]]
+
+
+class LeaseManager:
+    """
+    Splits the works of a group between the replicas running it
+    Every replica (node) keeps a heartbeat document in the lock collection
+    and claims leases of the works up to its share: ceil(works / live nodes).
+    Leases are renewed every `renew_interval` seconds,
+    the ones of a node that stopped renewing them for `lease_time` seconds
+    are taken over by the others. A node with more than its share
+    (e.g. after another one joined) stops the extra works and releases them,
+    the leases of the works that are being stopped are renewed until then.
+    A node that can't renew a lease stops its work `renew_interval`
+    before the lease can be taken over and cancels it once the lease
+    is lost or expired, as the work may not check should_run for a while
+    (e.g. while it sleeps or handles a page)
+
+    A work that finished is kept leased, so it isn't run again,
+    a work that failed is released
+    """
+
+    def __init__(
+        self,
+        works: list[LeaseWork],
+        group: str = LOCK_PROCESS_NAME,
+        lease_time: float = LEASE_TIME,
+        renew_interval: float = LEASE_RENEW_INTERVAL,
+    ) -> None:
+        self.works = works
+        self.group = group
+        self.lease_time = lease_time
+        self.renew_interval = renew_interval
+        self.node_id = uuid4().hex
+        self.tasks: dict[str, asyncio.Task[None]] = {}
+        # monotonic time of the last successful renewal of the held leases
+        self.renewed: dict[str, float] = {}
+        # leases whose works are being stopped, released once they have
+        self.stopping: set[str] = set()
+        logger.info(
+            f"Lease node {self.group} #{self.node_id} initialized",
+            extra={"MESSAGE_ID": "LEASE_NODE_STARTED"},
+        )
+
+    def get_key(self, name: str) -> str:
+        return f"{self.group}.lease.{name}"
+
+    def get_expire_at(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self.lease_time)
+
+    def get_owned(self) -> list[str]:
+        """
+        Leases with running (or finished) works, in the works order
+        """
+        return [
+            w.name
+            for w in self.works
+            if w.name in self.tasks and w.name not in self.stopping
+        ]
+
+    def should_run_work(self, should_run: Callable[[], bool], name: str) -> bool:
+        return should_run() and name not in self.stopping
+
+    async def run(self, should_run: Callable[[], bool]) -> None:
+        await init_lock_index()
+        try:
+            while should_run():
+                try:
+                    await self.balance(should_run)
+                except PyMongoError as e:
+                    logger.warning(
+                        f"Can't update leases: {e}",
+                        extra={"MESSAGE_ID": "LEASE_ERROR"},
+                    )
+                self.stop_expired()
+                await asyncio.sleep(self.renew_interval)
+        finally:
+            await self.close()
+
+    async def balance(self, should_run: Callable[[], bool]) -> None:
+        """
+        One heartbeat: renews the owned leases, releases the stopped ones,
+        then claims or stops works to get the node share
+        """
+        await self.heartbeat()
+        await self.release_stopped()
+        self.check_tasks()
+        # including the stopping ones, their works may still be running
+        for name in list(self.renewed):
+            await self.renew(name)
+
+        nodes = await get_lock_collection().count_documents(
+            {
+                "group": self.group,
+                "node": {"$exists": True},
+                "expireAt": {"$gt": datetime.utcnow()},
+            },
+        )
+        share = ceil(len(self.works) / max(nodes, 1))
+        owned = self.get_owned()
+        for name in owned[share:]:
+            logger.info(
+                f"Lease {name} is given up: {nodes} nodes share {len(self.works)} works",
+                extra={"MESSAGE_ID": "LEASE_REBALANCED"},
+            )
+            self.stop(name)
+        for work in self.works:
+            if len(owned) >= share:
+                break
+            if work.name in self.tasks:
+                continue
+            if await self.claim(work.name):
+                self.start(work, should_run)
+                owned.append(work.name)
+        LEASES_OWNED.set(len(self.get_owned()), group=self.group)
+
+    async def heartbeat(self) -> None:
+        await get_lock_collection().update_one(
+            {"_id": f"{self.group}.node.{self.node_id}"},
+            {
+                "$set": {
+                    "group": self.group,
+                    "node": self.node_id,
+                    "expireAt": self.get_expire_at(),
+                },
+            },
+            upsert=True,
+        )
+
+    async def claim(self, name: str) -> bool:
+        """
+        Acquires the lease if it's free or expired
+        """
+        try:
+            await get_lock_collection().update_one(
+                {
+                    "_id": self.get_key(name),
+                    "$or": [
+                        {"owner": self.node_id},
+                        {"expireAt": {"$lt": datetime.utcnow()}},
+                    ],
+                },
+                {
+                    "$set": {
+                        "group": self.group,
+                        "owner": self.node_id,
+                        "expireAt": self.get_expire_at(),
+                    },
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # owned by another node
+            return False
+        self.renewed[name] = monotonic()
+        LEASE_CHANGES.inc(group=self.group, result="acquired")
+        logger.info(
+            f"Lease {name} acquired by #{self.node_id}",
+            extra={"MESSAGE_ID": "LEASE_ACQUIRED"},
+        )
+        return True
+
+    async def renew(self, name: str) -> None:
+        result = await get_lock_collection().update_one(
+            {"_id": self.get_key(name), "owner": self.node_id},
+            {"$set": {"expireAt": self.get_expire_at()}},
+        )
+        if result.matched_count:
+            self.renewed[name] = monotonic()
+            return None
+        del self.renewed[name]
+        LEASE_CHANGES.inc(group=self.group, result="lost")
+        logger.error(
+            f"Lease {name} is lost, it expired before it was renewed",
+            extra={"MESSAGE_ID": "LEASE_LOST"},
+        )
+        self.cancel(name)
+
+    def stop_expired(self) -> None:
+        """
+        Stops the works whose leases are about to expire
+        (they weren't renewed because of storage errors),
+        renew_interval before they can be taken over,
+        so the work is stopped before another node starts it
+        """
+        deadline = self.lease_time - self.renew_interval
+        for name in self.get_owned():
+            if monotonic() - self.renewed.get(name, 0) > deadline:
+                LEASE_CHANGES.inc(group=self.group, result="lost")
+                logger.error(
+                    f"Lease {name} wasn't renewed for {deadline} seconds",
+                    extra={"MESSAGE_ID": "LEASE_LOST"},
+                )
+                self.stop(name)
+        # the stopping ones too, the lease can be taken over by now
+        for name, task in self.tasks.items():
+            if task.done():
+                continue
+            if monotonic() - self.renewed.get(name, 0) > self.lease_time:
+                logger.error(
+                    f"Lease {name} expired, its work is cancelled",
+                    extra={"MESSAGE_ID": "LEASE_WORK_CANCELLED"},
+                )
+                self.cancel(name)
+
+    def start(self, work: LeaseWork, should_run: Callable[[], bool]) -> None:
+        self.tasks[work.name] = asyncio.create_task(
+            work.run(partial(self.should_run_work, should_run, work.name)),
+        )
+
+    def stop(self, name: str) -> None:
+        self.stopping.add(name)
+
+    def cancel(self, name: str) -> None:
+        """
+        Stops the work right away, its lease is released once it's done
+        """
+        self.stop(name)
+        self.tasks[name].cancel()
+
+    def check_tasks(self) -> None:
+        for name in self.get_owned():
+            task = self.tasks[name]
+            if task.done() and not task.cancelled() and task.exception() is not None:
+                logger.error(
+                    f"Lease {name} work failed: {task.exception()!r}",
+                    extra={"MESSAGE_ID": "LEASE_WORK_FAILED"},
+                )
+                self.stop(name)
+
+    async def release_stopped(self) -> None:
+        for name in list(self.stopping):
+            if self.tasks[name].done():
+                await self.release(name)
+
+    async def release(self, name: str) -> None:
+        await get_lock_collection().delete_one(
+            {"_id": self.get_key(name), "owner": self.node_id},
+        )
+        del self.tasks[name]
+        self.stopping.discard(name)
+        self.renewed.pop(name, None)
+        LEASE_CHANGES.inc(group=self.group, result="released")
+        logger.info(
+            f"Lease {name} released by #{self.node_id}",
+            extra={"MESSAGE_ID": "LEASE_RELEASED"},
+        )
+
+    async def close(self) -> None:
+        """
+        Waits for the works to stop and releases all the leases
+        """
+        for name in list(self.tasks):
+            self.stop(name)
+        if self.tasks:
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        try:
+            for name in list(self.tasks):
+                await self.release(name)
+            await get_lock_collection().delete_one(
+                {"_id": f"{self.group}.node.{self.node_id}"},
+            )
+        except PyMongoError as e:
+            # the leases expire in lease_time
+            logger.warning(
+                f"Can't release leases: {e}",
+                extra={"MESSAGE_ID": "LEASE_ERROR"},
+            )
+        LEASES_OWNED.set(0, group=self.group)
+
+
+async def run_leased(
+    should_run: Callable[[], bool],
+    works: list[LeaseWork],
+) -> None:
+    """
+    Runs this replica share of the works until should_run() is false
+    """
+    await LeaseManager(works).run(should_run)
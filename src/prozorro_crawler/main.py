@@ -1,27 +1,50 @@
+from functools import partial
 from types import FrameType
-from typing import Callable, Any, Awaitable, Optional
+from typing import Callable, Any, Awaitable, NamedTuple, Optional
 
 import aiohttp
 import asyncio
 import signal
-import json
 from aiohttp.typedefs import JSONDecoder
 from prozorro_crawler.crawler import init_crawler
+from prozorro_crawler.decoding import get_default_json_loads, set_default_json_loads
+from prozorro_crawler.handlers import ProcessPoolHandler
+from prozorro_crawler.journal import replay_journal
+from prozorro_crawler.lease import LeaseWork, run_leased
 from prozorro_crawler.lock import Lock
-from prozorro_crawler.storage import close_connection
+from prozorro_crawler.metrics import start_metrics_server
+from prozorro_crawler.storage import close_connection, DEFAULT_STATE_ID
 from prozorro_crawler.settings import (
     logger,
     API_OPT_FIELDS,
     API_RESOURCE,
+    BACKFILL_SHARDS,
+    JOURNAL_REPLAY,
+    LEASE_ENABLED,
+    METRICS_ENABLED,
 )
-from prozorro_crawler.utils import (
-    get_default_headers,
-    get_resource_url,
-)
+from prozorro_crawler.transport import create_session
+from prozorro_crawler.utils import get_resource_url
 
 RUN = True
 
 
+class CrawlerResource(NamedTuple):
+    """
+    One of the resources crawled by the same process
+    Every resource has its own feed position in storage
+    (state_id, "<default state id>_<resource>" by default)
+    """
+
+    resource: str
+    data_handler: Callable[
+        [aiohttp.ClientSession, list[dict[str, Any]]],
+        Awaitable[None],
+    ]
+    opt_fields: list[str] = API_OPT_FIELDS
+    state_id: Optional[str] = None
+
+
 def should_run() -> bool:
     return RUN
 
@@ -31,32 +54,128 @@ def stop_run() -> None:
     RUN = False
 
 
+def get_resources(
+    data_handler: Optional[
+        Callable[
+            [aiohttp.ClientSession, list[dict[str, Any]]],
+            Awaitable[None],
+        ]
+    ],
+    resource: str,
+    opt_fields: list[str],
+    resources: Optional[list[CrawlerResource]],
+) -> list[CrawlerResource]:
+    if resources:
+        return [
+            r._replace(state_id=r.state_id or f"{DEFAULT_STATE_ID}_{r.resource}")
+            for r in resources
+        ]
+    if data_handler is None:
+        raise ValueError("Either data_handler or resources should be provided")
+    return [CrawlerResource(resource, data_handler, opt_fields)]
+
+
+def get_lease_works(
+    session: aiohttp.ClientSession,
+    crawler_resources: list[CrawlerResource],
+    json_loads: JSONDecoder,
+    backfill_shards: int = BACKFILL_SHARDS,
+) -> list[LeaseWork]:
+    """
+    A leased work per resource or, if backfill is sharded,
+    per resource forward crawler and backfill shard
+    """
+    parts = [""]
+    if backfill_shards > 1:
+        parts = ["forward", *(str(n) for n in range(1, backfill_shards + 1))]
+    return [
+        LeaseWork(
+            f"{r.resource}.backfill.{part}" if part else r.resource,
+            partial(
+                init_crawler,
+                session=session,
+                url=get_resource_url(r.resource),
+                data_handler=r.data_handler,
+                opt_fields=",".join(r.opt_fields),
+                json_loads=json_loads,
+                state_id=r.state_id,
+                backfill_shard=part,
+            ),
+        )
+        for r in crawler_resources
+        for part in parts
+    ]
+
+
 async def run_app(
-    data_handler: Callable[
-        [aiohttp.ClientSession, list[dict[str, Any]]],
-        Awaitable[None],
+    data_handler: Optional[
+        Callable[
+            [aiohttp.ClientSession, list[dict[str, Any]]],
+            Awaitable[None],
+        ]
     ],
     json_loads: JSONDecoder,
     init_task: Optional[Callable[[], Awaitable[None]]] = None,
     additional_headers: Optional[dict[str, str]] = None,
     resource: str = API_RESOURCE,
     opt_fields: list[str] = API_OPT_FIELDS,
+    resources: Optional[list[CrawlerResource]] = None,
 ) -> None:
+    """
+    Crawl the resource feed with data_handler
+    or every one of the resources concurrently,
+    sharing the session (connection pool), the storage client and the lock
+    With LEASE_ENABLED, only the works leased by this replica are crawled
+    """
+    crawler_resources = get_resources(data_handler, resource, opt_fields, resources)
+    # object fetches (process_resource) use the same decoder
+    set_default_json_loads(json_loads)
+
     if init_task is not None:
         await init_task()
 
-    conn = aiohttp.TCPConnector(ttl_dns_cache=300)
-    headers = get_default_headers(additional_headers)
-    async with aiohttp.ClientSession(connector=conn, headers=headers) as session:
-        url = get_resource_url(resource)
-        await init_crawler(
-            should_run,
-            session,
-            url,
-            data_handler,
-            opt_fields=",".join(opt_fields),
-            json_loads=json_loads,
-        )
+    metrics_runner = await start_metrics_server() if METRICS_ENABLED else None
+    try:
+        async with create_session(additional_headers) as session:
+            if JOURNAL_REPLAY:
+                await asyncio.gather(
+                    *(
+                        replay_journal(
+                            should_run,
+                            session,
+                            get_resource_url(r.resource),
+                            r.data_handler,
+                        )
+                        for r in crawler_resources
+                    ),
+                )
+                return None
+            if LEASE_ENABLED:
+                await run_leased(
+                    should_run,
+                    get_lease_works(session, crawler_resources, json_loads),
+                )
+                return None
+            await asyncio.gather(
+                *(
+                    init_crawler(
+                        should_run,
+                        session,
+                        get_resource_url(r.resource),
+                        r.data_handler,
+                        opt_fields=",".join(r.opt_fields),
+                        json_loads=json_loads,
+                        state_id=r.state_id,
+                    )
+                    for r in crawler_resources
+                ),
+            )
+    finally:
+        for r in crawler_resources:
+            if isinstance(r.data_handler, ProcessPoolHandler):
+                r.data_handler.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
 
 
 def get_stop_signal_handler(sig: str) -> Callable[[int, Optional[FrameType]], None]:
@@ -71,15 +190,18 @@ def get_stop_signal_handler(sig: str) -> Callable[[int, Optional[FrameType]], No
 
 
 def main(
-    data_handler: Callable[
-        [aiohttp.ClientSession, list[dict[str, Any]]],
-        Awaitable[None],
-    ],
+    data_handler: Optional[
+        Callable[
+            [aiohttp.ClientSession, list[dict[str, Any]]],
+            Awaitable[None],
+        ]
+    ] = None,
     init_task: Optional[Callable[[], Awaitable[None]]] = None,
     additional_headers: Optional[dict[str, str]] = None,
     resource: str = API_RESOURCE,
     opt_fields: list[str] = API_OPT_FIELDS,
     json_loads: Optional[JSONDecoder] = None,
+    resources: Optional[list[CrawlerResource]] = None,
 ) -> None:
     signal.signal(signal.SIGINT, get_stop_signal_handler("SIGINT"))
     signal.signal(signal.SIGTERM, get_stop_signal_handler("SIGTERM"))
@@ -93,11 +215,16 @@ def main(
             opt_fields=opt_fields,
             init_task=init_task,
             additional_headers=additional_headers,
-            json_loads=json_loads or json.loads,
+            json_loads=json_loads or get_default_json_loads(),
+            resources=resources,
         )
         return app
 
-    loop.run_until_complete(Lock.run_locked(get_app, should_run))
+    if LEASE_ENABLED:
+        # replicas share the work instead of waiting for the lock
+        loop.run_until_complete(get_app())
+    else:
+        loop.run_until_complete(Lock.run_locked(get_app, should_run))
     # Wait 250 ms for the underlying SSL connections to close
     loop.run_until_complete(close_connection())
     loop.run_until_complete(asyncio.sleep(0.250))
@@ -0,0 +1,253 @@
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+from aiohttp import web
+from time import monotonic
+import asyncio
+
+from prozorro_crawler.settings import (
+    logger,
+    METRICS_HOST,
+    METRICS_PORT,
+)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = tuple[str, ...]
+
+
+def format_labels(names: tuple[str, ...], values: LabelValues, **extra: str) -> str:
+    pairs = list(zip(names, values, strict=True)) + list(extra.items())
+    if not pairs:
+        return ""
+    labels = ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + labels + "}"
+
+
+class Metric:
+    """
+    Base of the metrics exposed in prometheus text format on /metrics
+    Every metric is registered on creation
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = labels
+        REGISTRY.append(self)
+
+    def label_values(self, labels: dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> list[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+            *self.render_samples(),
+        ]
+
+    def render_samples(self) -> list[str]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self.values: dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self.label_values(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self.values.get(self.label_values(labels), 0)
+
+    def render_samples(self) -> list[str]:
+        return [
+            f"{self.name}{format_labels(self.label_names, key)} {value}"
+            for key, value in self.values.items()
+        ]
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        self.values[self.label_values(labels)] = value
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = buckets
+        self.counts: dict[LabelValues, list[int]] = {}
+        self.sums: dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self.label_values(labels)
+        counts = self.counts.setdefault(key, [0] * (len(self.buckets) + 1))
+        for n, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[n] += 1
+                break
+        else:
+            counts[-1] += 1
+        self.sums[key] = self.sums.get(key, 0) + value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(monotonic() - start, **labels)
+
+    def time_until_done(
+        self, future: "asyncio.Future[Any]", start: float, **labels: str
+    ) -> None:
+        """
+        Observes the time from `start` (monotonic) until the future is done
+        """
+        future.add_done_callback(lambda _: self.observe(monotonic() - start, **labels))
+
+    def render_samples(self) -> list[str]:
+        samples = []
+        for key, counts in self.counts.items():
+            total = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts, strict=True):
+                total += count
+                labels = format_labels(self.label_names, key, le=str(bound))
+                samples.append(f"{self.name}_bucket{labels} {total}")
+            labels = format_labels(self.label_names, key)
+            samples.append(f"{self.name}_sum{labels} {self.sums[key]}")
+            samples.append(f"{self.name}_count{labels} {total}")
+        return samples
+
+
+REGISTRY: list[Metric] = []
+
+FEED_REQUEST_SECONDS = Histogram(
+    "crawler_feed_request_seconds",
+    "Feed page request latency",
+    ("feed", "direction"),
+)
+FEED_ITEMS = Counter(
+    "crawler_feed_items_total",
+    "Feed items received",
+    ("feed", "direction"),
+)
+HANDLER_SECONDS = Histogram(
+    "crawler_handler_seconds",
+    "Feed page data_handler duration",
+    ("feed", "direction"),
+)
+CHECKPOINT_WRITE_SECONDS = Histogram(
+    "crawler_checkpoint_write_seconds",
+    "Feed position save latency",
+    ("feed", "direction"),
+)
+HTTP_RESPONSES = Counter(
+    "crawler_http_responses_total",
+    "API responses by status",
+    ("source", "status"),
+)
+DEDUP_ITEMS = Counter(
+    "crawler_dedup_items_total",
+    "Feed items checked by the dedup cache (hit = skipped)",
+    ("feed", "direction", "result"),
+)
+OBJECT_CACHE_REQUESTS = Counter(
+    "crawler_object_cache_requests_total",
+    "Object fetches by cache result (hit, not_modified, miss)",
+    ("result",),
+)
+RATE_LIMIT_RATE = Gauge(
+    "crawler_rate_limit_requests_per_second",
+    "Current rate of the API requests rate limiter",
+)
+HEDGED_REQUESTS = Counter(
+    "crawler_hedged_requests_total",
+    "Duplicated slow requests (sent) and duplicates answered first (won)",
+    ("source", "result"),
+)
+SLEEP_SECONDS = Counter(
+    "crawler_sleep_seconds_total",
+    "Time crawlers spent sleeping",
+    ("feed", "direction", "reason"),
+)
+FORWARD_LAG_SECONDS = Gauge(
+    "crawler_forward_lag_seconds",
+    "Age of the latest forward crawler offset",
+    ("feed",),
+)
+BACKWARD_PAUSED = Gauge(
+    "crawler_backward_paused",
+    "Backward crawlers are paused because of the forward crawler lag",
+    ("feed",),
+)
+WORKER_UP = Gauge(
+    "crawler_worker_up",
+    "Supervisor worker process is running",
+    ("worker",),
+)
+WORKER_RESTARTS = Counter(
+    "crawler_worker_restarts_total",
+    "Supervisor worker process restarts",
+    ("worker",),
+)
+LEASES_OWNED = Gauge(
+    "crawler_leases_owned",
+    "Work leases owned by this replica",
+    ("group",),
+)
+LEASE_CHANGES = Counter(
+    "crawler_lease_changes_total",
+    "Work leases acquired, released and lost by this replica",
+    ("group", "result"),
+)
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics())
+
+
+async def start_metrics_server(
+    host: str = METRICS_HOST,
+    port: int = METRICS_PORT,
+) -> web.AppRunner:
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(
+        f"Metrics are served on http://{host}:{port}/metrics",
+        extra={"MESSAGE_ID": "METRICS_SERVER_STARTED"},
+    )
+    return runner
+
+
+def get_direction(descending: Optional[object]) -> str:
+    return "backward" if descending else "forward"
@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from hashlib import sha1
+from typing import Any, NamedTuple, Optional
+import json
+import os
+
+import asyncio
+from aiohttp.typedefs import JSONDecoder
+
+from prozorro_crawler.decoding import loads_body
+from prozorro_crawler.settings import (
+    logger,
+    OBJECT_CACHE_SIZE,
+    OBJECT_CACHE_DIR,
+    OBJECT_CACHE_DIR_SIZE,
+)
+
+
+class CachedObject(NamedTuple):
+    # raw response body, decoded on every hit,
+    # so callers never share (and modify) the cached data
+    body: bytes
+    date_modified: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+    def get_data(self, json_loads: JSONDecoder) -> Any:
+        return loads_body(self.body, json_loads)["data"]
+
+    def get_conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class ObjectCache:
+    """
+    Last fetched versions of the objects by url
+    The last `size` of them are kept in memory,
+    the evicted ones are spilled to `directory` (if set) as json files.
+    A file is deleted when its object is back in memory,
+    the oldest files are deleted when there are more than `directory_size`
+    """
+
+    def __init__(
+        self,
+        size: int = OBJECT_CACHE_SIZE,
+        directory: str = OBJECT_CACHE_DIR,
+        directory_size: int = OBJECT_CACHE_DIR_SIZE,
+    ) -> None:
+        self.size = size
+        self.directory = directory
+        self.directory_size = directory_size
+        self.objects: OrderedDict[str, CachedObject] = OrderedDict()
+        # spilled file paths, the oldest first
+        self.files: OrderedDict[str, None] = OrderedDict()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            # files spilled before a restart
+            with os.scandir(directory) as entries:
+                files = sorted(
+                    (entry.stat().st_mtime, entry.path)
+                    for entry in entries
+                    if entry.name.endswith(".json")
+                )
+            self.files.update((path, None) for _, path in files)
+
+    async def get(self, url: str) -> Optional[CachedObject]:
+        cached = self.objects.get(url)
+        if cached is not None:
+            self.objects.move_to_end(url)
+            return cached
+        if not self.directory or self.get_path(url) not in self.files:
+            return None
+        cached = await asyncio.to_thread(self.read_file, url)
+        if cached is not None:
+            await self.put(url, cached)
+        return cached
+
+    async def put(self, url: str, cached: CachedObject) -> None:
+        if self.directory:
+            # the object in memory replaces the spilled one
+            path = self.get_path(url)
+            if path in self.files:
+                del self.files[path]
+                await asyncio.to_thread(self.remove_file, path)
+        self.objects[url] = cached
+        self.objects.move_to_end(url)
+        while len(self.objects) > self.size:
+            evicted_url, evicted = self.objects.popitem(last=False)
+            if self.directory:
+                await self.spill(evicted_url, evicted)
+
+    async def spill(self, url: str, cached: CachedObject) -> None:
+        if not await asyncio.to_thread(self.write_file, url, cached):
+            return
+        self.files[self.get_path(url)] = None
+        while self.directory_size and len(self.files) > self.directory_size:
+            path, _ = self.files.popitem(last=False)
+            await asyncio.to_thread(self.remove_file, path)
+
+    def get_path(self, url: str) -> str:
+        return os.path.join(self.directory, f"{sha1(url.encode()).hexdigest()}.json")
+
+    def read_file(self, url: str) -> Optional[CachedObject]:
+        try:
+            with open(self.get_path(url), "rb") as f:
+                # headers line, then the body
+                headers = json.loads(f.readline())
+                return CachedObject(f.read(), *headers)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning(
+                f"Can't read cached object {url}: {e}",
+                extra={"MESSAGE_ID": "OBJECT_CACHE_ERROR"},
+            )
+            return None
+
+    def write_file(self, url: str, cached: CachedObject) -> bool:
+        try:
+            with open(self.get_path(url), "wb") as f:
+                f.write(json.dumps(list(cached[1:])).encode() + b"\n")
+                f.write(cached.body)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(
+                f"Can't save cached object {url}: {e}",
+                extra={"MESSAGE_ID": "OBJECT_CACHE_ERROR"},
+            )
+            return False
+        return True
+
+    def remove_file(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(
+                f"Can't remove cached object file {path}: {e}",
+                extra={"MESSAGE_ID": "OBJECT_CACHE_ERROR"},
+            )
+
+
+# used by process_resource and process_resources
+object_cache: Optional[ObjectCache] = None
+
+
+def get_object_cache() -> Optional[ObjectCache]:
+    """
+    The shared cache (None if OBJECT_CACHE_SIZE is 0), created on first use
+    """
+    global object_cache
+    if object_cache is None and OBJECT_CACHE_SIZE:
+        object_cache = ObjectCache()
+    return object_cache
@@ -0,0 +1,33 @@
+from typing import Any, NamedTuple, Optional
+import zlib
+
+
+class ItemPartition(NamedTuple):
+    number: int
+    partitions: int
+
+    def __str__(self) -> str:
+        return f"{self.number}/{self.partitions}"
+
+    def contains(self, item_id: str) -> bool:
+        # crc32 is the same in every process, unlike hash()
+        return zlib.crc32(item_id.encode()) % self.partitions == self.number
+
+    def filter(self, items: list[Any]) -> list[Any]:
+        return [item for item in items if self.contains(item["id"])]
+
+
+def parse_partition(value: str) -> Optional[ItemPartition]:
+    """
+    "<i>/<N>" partition, None for an empty value
+    Raises ValueError if it's not a valid partition
+    """
+    if not value:
+        return None
+    try:
+        number, partitions = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid item partition {value}, expected <i>/<N>") from None
+    if not 0 <= number < partitions:
+        raise ValueError(f"Invalid item partition {value}, expected 0 <= i < N")
+    return ItemPartition(number, partitions)
@@ -0,0 +1,64 @@
+from typing import Optional
+
+from prozorro_crawler.settings import (
+    ADAPTIVE_POLLING_MIN_INTERVAL,
+    ADAPTIVE_POLLING_MAX_INTERVAL,
+    ADAPTIVE_POLLING_BACKOFF,
+)
+from prozorro_crawler.utils import get_offset_timestamp
+
+# weight of the latest page in the smoothed feed arrival rate
+ARRIVAL_RATE_SMOOTHING = 0.3
+
+
+class AdaptivePolling:
+    """
+    Forward crawler polling interval
+    Feed arrival rate (items per second) is estimated from the offset timestamps:
+    after a page with items the crawler waits for the expected time
+    of the next change, after an empty page the interval grows exponentially.
+    Interval is always kept between min_interval and max_interval
+    """
+
+    def __init__(
+        self,
+        min_interval: float = ADAPTIVE_POLLING_MIN_INTERVAL,
+        max_interval: float = ADAPTIVE_POLLING_MAX_INTERVAL,
+        backoff: float = ADAPTIVE_POLLING_BACKOFF,
+    ) -> None:
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.interval = min_interval
+        self.arrival_rate: Optional[float] = None
+        self.last_timestamp: Optional[float] = None
+
+    def update(self, items_count: int, next_offset: str) -> float:
+        """
+        Update the estimates with the received page
+        and return interval to wait before the next request
+        """
+        timestamp = get_offset_timestamp(next_offset)
+        if items_count:
+            if (
+                timestamp is not None
+                and self.last_timestamp is not None
+                and timestamp > self.last_timestamp
+            ):
+                rate = items_count / (timestamp - self.last_timestamp)
+                self.arrival_rate = (
+                    rate
+                    if self.arrival_rate is None
+                    else ARRIVAL_RATE_SMOOTHING * rate
+                    + (1 - ARRIVAL_RATE_SMOOTHING) * self.arrival_rate
+                )
+            if self.arrival_rate:
+                self.interval = 1 / self.arrival_rate
+            else:
+                self.interval = self.min_interval
+        else:
+            self.interval *= self.backoff
+        self.interval = min(max(self.interval, self.min_interval), self.max_interval)
+        if timestamp is not None:
+            self.last_timestamp = timestamp
+        return self.interval
@@ -0,0 +1,171 @@
+from email.utils import parsedate_to_datetime
+from heapq import heappop, heappush
+from time import monotonic, time
+from typing import Optional
+from weakref import WeakKeyDictionary
+
+import aiohttp
+import asyncio
+
+from prozorro_crawler.metrics import RATE_LIMIT_RATE
+from prozorro_crawler.settings import (
+    logger,
+    RATE_LIMIT,
+    RATE_LIMIT_MIN,
+    RATE_LIMIT_MAX,
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_INCREASE,
+    RATE_LIMIT_DECREASE,
+    TOO_MANY_REQUESTS_INTERVAL,
+)
+
+# lower is served first
+PRIORITY_FORWARD = 0
+PRIORITY_BACKWARD = 1
+PRIORITY_OBJECTS = 2
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all the requests of a session
+    Requests waiting for a token are served by priority:
+    forward crawler, then backward crawler, then object fetches.
+
+    The rate adapts to the API (AIMD): every successful response adds
+    `increase` requests/sec up to `max_rate`, every 429 multiplies it
+    by `decrease` down to `min_rate` and pauses all the requests
+    for Retry-After seconds (TOO_MANY_REQUESTS_INTERVAL if not provided)
+    """
+
+    def __init__(
+        self,
+        rate: float = RATE_LIMIT,
+        min_rate: float = RATE_LIMIT_MIN,
+        max_rate: float = RATE_LIMIT_MAX,
+        burst: float = RATE_LIMIT_BURST,
+        increase: float = RATE_LIMIT_INCREASE,
+        decrease: float = RATE_LIMIT_DECREASE,
+    ) -> None:
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.max_rate = max(max_rate, rate)
+        self.burst = max(burst, 1)
+        self.increase = increase
+        self.decrease = decrease
+        self.tokens = self.burst
+        self.updated_at = monotonic()
+        self.paused_until = 0.0
+        self.waiters: list[tuple[int, int, asyncio.Future[None]]] = []
+        self.waiters_count = 0
+        self.task: Optional[asyncio.Task[None]] = None
+        RATE_LIMIT_RATE.set(self.rate)
+
+    def refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, priority: int = PRIORITY_OBJECTS) -> float:
+        """
+        Waits for a token, returns the time waited
+        """
+        if self.try_acquire():
+            return 0
+        start = monotonic()
+        waiter: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self.waiters_count += 1
+        heappush(self.waiters, (priority, self.waiters_count, waiter))
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.release_waiters())
+        await waiter
+        return monotonic() - start
+
+    def try_acquire(self) -> bool:
+        """
+        Takes a token if it's available without waiting
+        """
+        self.refill()
+        if self.waiters or self.tokens < 1 or monotonic() < self.paused_until:
+            return False
+        self.tokens -= 1
+        return True
+
+    async def release_waiters(self) -> None:
+        while self.waiters:
+            pause = self.paused_until - monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            self.refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, waiter = heappop(self.waiters)
+            if not waiter.done():
+                self.tokens -= 1
+                waiter.set_result(None)
+
+    def on_response(self, resp: aiohttp.ClientResponse) -> None:
+        if resp.status == 429:
+            self.on_too_many_requests(get_retry_after(resp))
+        elif resp.status < 500:
+            self.on_success()
+
+    def on_success(self) -> None:
+        if self.rate < self.max_rate:
+            self.refill()
+            self.rate = min(self.max_rate, self.rate + self.increase)
+            RATE_LIMIT_RATE.set(self.rate)
+
+    def on_too_many_requests(self, retry_after: Optional[float] = None) -> None:
+        if monotonic() < self.paused_until:
+            # a response to a request sent before the pause
+            return None
+        self.refill()
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.tokens = min(self.tokens, 0)
+        pause = TOO_MANY_REQUESTS_INTERVAL if retry_after is None else retry_after
+        self.paused_until = max(self.paused_until, monotonic() + pause)
+        RATE_LIMIT_RATE.set(self.rate)
+        logger.info(
+            f"Request rate is decreased to {self.rate:.2f}/s, "
+            f"requests are paused for {pause} seconds",
+            extra={"MESSAGE_ID": "RATE_LIMIT_DECREASED"},
+        )
+
+
+def get_retry_after(resp: aiohttp.ClientResponse) -> Optional[float]:
+    """
+    Retry-After header value in seconds (delay-seconds or HTTP-date)
+    """
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_priority(descending: Optional[object]) -> int:
+    return PRIORITY_BACKWARD if descending else PRIORITY_FORWARD
+
+
+rate_limiters: WeakKeyDictionary[aiohttp.ClientSession, RateLimiter] = (
+    WeakKeyDictionary()
+)
+
+
+def get_rate_limiter(session: aiohttp.ClientSession) -> Optional[RateLimiter]:
+    """
+    The rate limiter of the session, None if RATE_LIMIT isn't set
+    """
+    if not RATE_LIMIT:
+        return None
+    if session not in rate_limiters:
+        rate_limiters[session] = RateLimiter()
+    return rate_limiters[session]
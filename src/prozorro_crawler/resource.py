@@ -1,18 +1,56 @@
-from typing import Callable, Awaitable, Any
+from functools import partial
+from typing import Callable, Awaitable, Any, Iterable, Optional, Union
 
 import aiohttp
 import asyncio
-import json
 from aiohttp.typedefs import JSONDecoder
-from json.decoder import JSONDecodeError
+from prozorro_crawler.decoding import (
+    READ_JSON_ERRORS,
+    get_default_json_loads,
+    loads_body,
+    read_json,
+)
+from prozorro_crawler.metrics import HTTP_RESPONSES, OBJECT_CACHE_REQUESTS
+from prozorro_crawler.object_cache import CachedObject, ObjectCache, get_object_cache
+from prozorro_crawler.hedging import get_hedger
+from prozorro_crawler.ratelimit import PRIORITY_OBJECTS, get_rate_limiter
+from prozorro_crawler.transport import REQUEST_ERRORS
 from prozorro_crawler.settings import (
     logger,
+    DATE_MODIFIED_FIELD,
     GET_ERROR_RETRIES,
     CONNECTION_ERROR_INTERVAL,
     TOO_MANY_REQUESTS_INTERVAL,
+    RESOURCES_CONCURRENCY,
 )
 
 
+class TooManyRequestsBackoff:
+    """
+    Too many requests backoff state shared by concurrent requests
+    Once any of them gets 429, all of them wait
+    for TOO_MANY_REQUESTS_INTERVAL before the next request
+    """
+
+    def __init__(self) -> None:
+        self.ready = asyncio.Event()
+        self.ready.set()
+
+    async def wait(self) -> None:
+        await self.ready.wait()
+
+    async def pause(self, interval: float) -> None:
+        if not self.ready.is_set():
+            # another request is already sleeping
+            await self.ready.wait()
+            return
+        self.ready.clear()
+        try:
+            await asyncio.sleep(interval)
+        finally:
+            self.ready.set()
+
+
 async def process_resource(
     session: aiohttp.ClientSession,
     url: str,
@@ -21,22 +59,105 @@ async def process_resource(
         [aiohttp.ClientSession, dict[str, Any]],
         Awaitable[None],
     ],
+    json_loads: Optional[JSONDecoder] = None,
+    date_modified: Optional[str] = None,
 ) -> Any:
+    """
+    Fetch the resource and process it with process_function
+    date_modified is the feed item one: with OBJECT_CACHE_SIZE set
+    the resource isn't fetched again if the cached version has it
+    """
     resource_url = f"{url}/{resource_id}"
-    data = await get_response_data(session, resource_url)
+    data = await get_response_data(
+        session,
+        resource_url,
+        json_loads=json_loads,
+        cache=get_object_cache(),
+        date_modified=date_modified,
+    )
     return await process_function(session, data)
 
 
+async def process_resources(
+    session: aiohttp.ClientSession,
+    url: str,
+    resource_ids: Iterable[Union[str, dict[str, Any]]],
+    process_function: Callable[
+        [aiohttp.ClientSession, dict[str, Any]],
+        Awaitable[Any],
+    ],
+    concurrency: int = RESOURCES_CONCURRENCY,
+    json_loads: Optional[JSONDecoder] = None,
+) -> list[Any]:
+    """
+    Batch version of process_resource
+    Fetches up to `concurrency` resources at the same time over the session
+    and processes every resource as soon as it is fetched.
+    resource_ids can be feed items, then their dateModified is used
+    as in process_resource.
+    Returns process_function results in resource_ids order
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    backoff = TooManyRequestsBackoff()
+
+    async def process(resource_id: Union[str, dict[str, Any]]) -> Any:
+        date_modified = None
+        if not isinstance(resource_id, str):
+            date_modified = resource_id.get(DATE_MODIFIED_FIELD)
+            resource_id = resource_id["id"]
+        async with semaphore:
+            data = await get_response_data(
+                session,
+                f"{url}/{resource_id}",
+                json_loads=json_loads,
+                backoff=backoff,
+                cache=get_object_cache(),
+                date_modified=date_modified,
+            )
+        return await process_function(session, data)
+
+    return await asyncio.gather(*(process(i) for i in resource_ids))
+
+
 async def get_response_data(
     session: aiohttp.ClientSession,
     url: str,
-    json_loads: JSONDecoder = json.loads,
+    json_loads: Optional[JSONDecoder] = None,
     error_retries: int = GET_ERROR_RETRIES,
+    backoff: Optional[TooManyRequestsBackoff] = None,
+    cache: Optional[ObjectCache] = None,
+    date_modified: Optional[str] = None,
 ) -> Any:
+    """
+    Returns the resource data, json_loads defaults to the crawler one
+    (see decoding.get_default_json_loads)
+    With cache, the cached data is returned if it has date_modified,
+    otherwise the cached version is revalidated with a conditional request
+    """
+    json_loads = json_loads or get_default_json_loads()
+    cached = await cache.get(url) if cache is not None else None
+    if cached is not None and date_modified and cached.date_modified == date_modified:
+        OBJECT_CACHE_REQUESTS.inc(result="hit")
+        return cached.get_data(json_loads)
+    request_kwargs: dict[str, Any] = {}
+    if cached is not None and cached.get_conditional_headers():
+        request_kwargs["headers"] = cached.get_conditional_headers()
+    limiter = get_rate_limiter(session)
+    hedger = get_hedger("objects")
     while True:
+        if backoff is not None:
+            await backoff.wait()
         try:
-            resp = await session.get(url)
-        except aiohttp.ClientError as e:
+            if limiter is not None:
+                await limiter.acquire(PRIORITY_OBJECTS)
+            if hedger is not None:
+                resp = await hedger.request(
+                    partial(session.get, url, **request_kwargs),
+                    limiter,
+                )
+            else:
+                resp = await session.get(url, **request_kwargs)
+        except REQUEST_ERRORS as e:
             logger.warning(
                 f"Error from {url} {type(e)}: {e}",
                 extra={"MESSAGE_ID": "HTTP_EXCEPTION"},
@@ -44,14 +165,27 @@ async def get_response_data(
             await asyncio.sleep(CONNECTION_ERROR_INTERVAL)
             continue
         else:
+            HTTP_RESPONSES.inc(source="resource", status=str(resp.status))
+            if limiter is not None:
+                limiter.on_response(resp)
             if resp.status == 429:
                 logger.warning(
                     "Too many requests while getting tender",
                     extra={"MESSAGE_ID": "TOO_MANY_REQUESTS"},
                 )
-                await asyncio.sleep(TOO_MANY_REQUESTS_INTERVAL)
+                if limiter is not None:
+                    # the limiter pauses all the requests
+                    pass
+                elif backoff is None:
+                    await asyncio.sleep(TOO_MANY_REQUESTS_INTERVAL)
+                else:
+                    await backoff.pause(TOO_MANY_REQUESTS_INTERVAL)
                 continue
 
+            elif resp.status == 304 and cached is not None:
+                OBJECT_CACHE_REQUESTS.inc(result="not_modified")
+                return cached.get_data(json_loads)
+
             elif resp.status != 200:
                 error_message = "Error on getting tender: {} {}".format(
                     resp.status,
@@ -74,10 +208,31 @@ async def get_response_data(
                 break
 
             try:
-                response = await resp.json(loads=json_loads)
-            except (aiohttp.ClientPayloadError, JSONDecodeError) as e:
+                if cache is not None:
+                    # the raw body is cached
+                    body = await resp.read()
+                    response = loads_body(body, json_loads)
+                else:
+                    response = await read_json(resp, json_loads)
+            except READ_JSON_ERRORS as e:
                 logger.warning(e, extra={"MESSAGE_ID": "HTTP_EXCEPTION"})
                 await asyncio.sleep(CONNECTION_ERROR_INTERVAL)
                 continue
             else:
+                if cache is not None:
+                    data = response["data"]
+                    OBJECT_CACHE_REQUESTS.inc(result="miss")
+                    await cache.put(
+                        url,
+                        CachedObject(
+                            body,
+                            date_modified=(
+                                data.get(DATE_MODIFIED_FIELD)
+                                if isinstance(data, dict)
+                                else None
+                            ),
+                            etag=resp.headers.get("ETag"),
+                            last_modified=resp.headers.get("Last-Modified"),
+                        ),
+                    )
                 return response["data"]
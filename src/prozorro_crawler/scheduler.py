@@ -0,0 +1,107 @@
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator, Callable, Optional
+
+import asyncio
+
+from prozorro_crawler.metrics import BACKWARD_PAUSED, SLEEP_SECONDS
+from prozorro_crawler.settings import (
+    logger,
+    FORWARD_HANDLER_CONCURRENCY,
+    BACKWARD_HANDLER_CONCURRENCY,
+    BACKWARD_PAUSE_LAG,
+)
+
+BACKWARD_PAUSE_CHECK_INTERVAL = 1
+
+
+class CrawlerScheduler:
+    """
+    Forward crawler priority over the backward crawlers of a feed
+     - data handler budgets: at most `forward_concurrency`/`backward_concurrency`
+       handler calls (ItemHandler items, ProcessPoolHandler batches)
+       per direction at the same time
+       (0 means no limit), so backfill can't take all the handler capacity
+     - backward crawlers pause while the forward lag is over `pause_lag` seconds
+       and continue once it's back under half of it
+    """
+
+    def __init__(
+        self,
+        url: str,
+        forward_concurrency: int = FORWARD_HANDLER_CONCURRENCY,
+        backward_concurrency: int = BACKWARD_HANDLER_CONCURRENCY,
+        pause_lag: float = BACKWARD_PAUSE_LAG,
+    ) -> None:
+        self.url = url
+        self.budgets = {
+            "forward": make_budget(forward_concurrency),
+            "backward": make_budget(backward_concurrency),
+        }
+        self.pause_lag = pause_lag
+        self.backward_allowed = asyncio.Event()
+        self.backward_allowed.set()
+
+    def get_budget(self, direction: str) -> Optional[asyncio.Semaphore]:
+        return self.budgets[direction]
+
+    @asynccontextmanager
+    async def handler_slot(self, labels: dict[str, str]) -> AsyncIterator[None]:
+        budget = self.budgets[labels["direction"]]
+        if budget is None:
+            yield
+            return
+        start = monotonic()
+        async with budget:
+            SLEEP_SECONDS.inc(monotonic() - start, reason="handler_budget", **labels)
+            yield
+
+    def set_forward_lag(self, lag: float) -> None:
+        if not self.pause_lag:
+            return None
+        if self.backward_allowed.is_set() and lag > self.pause_lag:
+            self.backward_allowed.clear()
+            BACKWARD_PAUSED.set(1, feed=self.url)
+            logger.info(
+                f"Forward crawler lag is {lag:.0f} seconds, backward crawling paused",
+                extra={"MESSAGE_ID": "BACKWARD_CRAWLER_PAUSED", "FEED_URL": self.url},
+            )
+        elif not self.backward_allowed.is_set() and lag < self.pause_lag / 2:
+            self.backward_allowed.set()
+            BACKWARD_PAUSED.set(0, feed=self.url)
+            logger.info(
+                "Backward crawling resumed",
+                extra={"MESSAGE_ID": "BACKWARD_CRAWLER_RESUMED", "FEED_URL": self.url},
+            )
+
+    async def wait_backward(
+        self,
+        should_run: Callable[[], bool],
+        labels: dict[str, str],
+    ) -> None:
+        if self.backward_allowed.is_set():
+            return None
+        start = monotonic()
+        while should_run() and not self.backward_allowed.is_set():
+            try:
+                await asyncio.wait_for(
+                    self.backward_allowed.wait(),
+                    BACKWARD_PAUSE_CHECK_INTERVAL,
+                )
+            except asyncio.TimeoutError:
+                pass
+        SLEEP_SECONDS.inc(monotonic() - start, reason="forward_priority", **labels)
+
+
+def make_budget(concurrency: int) -> Optional[asyncio.Semaphore]:
+    return asyncio.Semaphore(concurrency) if concurrency > 0 else None
+
+
+# shared by the crawlers of the same feed
+schedulers: dict[str, CrawlerScheduler] = {}
+
+
+def get_scheduler(url: str) -> CrawlerScheduler:
+    if url not in schedulers:
+        schedulers[url] = CrawlerScheduler(url)
+    return schedulers[url]
@@ -62,8 +62,124 @@ FEED_STEP_INTERVAL = int(getenv("FEED_STEP_INTERVAL", 0))
 TOO_MANY_REQUESTS_INTERVAL = int(getenv("TOO_MANY_REQUESTS_INTERVAL", 10))
 CONNECTION_ERROR_INTERVAL = int(getenv("CONNECTION_ERROR_INTERVAL", 5))
 NO_ITEMS_INTERVAL = int(getenv("NO_ITEMS_INTERVAL", 15))
+
+# api client connection pool: connections in total and per host (0 means no limit)
+HTTP_POOL_LIMIT = int(getenv("HTTP_POOL_LIMIT", 100))
+HTTP_POOL_LIMIT_PER_HOST = int(getenv("HTTP_POOL_LIMIT_PER_HOST", 0))
+HTTP_KEEPALIVE_TIMEOUT = float(getenv("HTTP_KEEPALIVE_TIMEOUT", 15))
+HTTP_DNS_CACHE_TTL = int(getenv("HTTP_DNS_CACHE_TTL", 300))
+# resolve with aiodns (if installed)
+HTTP_AIODNS = get_bool_env("HTTP_AIODNS", False)
+# api request timeouts in seconds (0 means no timeout):
+# connection, a read of the response and the whole request
+HTTP_CONNECT_TIMEOUT = float(getenv("HTTP_CONNECT_TIMEOUT", 10))
+HTTP_READ_TIMEOUT = float(getenv("HTTP_READ_TIMEOUT", 30))
+HTTP_TOTAL_TIMEOUT = float(getenv("HTTP_TOTAL_TIMEOUT", 120))
+# Accept-Encoding request header, by default gzip and deflate
+# and br if brotli is installed
+HTTP_ACCEPT_ENCODING = getenv("HTTP_ACCEPT_ENCODING", "")
+
+# requests per second of all the crawlers and object fetches of a session
+# (token bucket, 0 disables), the rate grows by RATE_LIMIT_INCREASE
+# on every response up to RATE_LIMIT_MAX and is multiplied by RATE_LIMIT_DECREASE
+# on 429 down to RATE_LIMIT_MIN, requests are paused for Retry-After then
+RATE_LIMIT = float(getenv("RATE_LIMIT", "0"))
+RATE_LIMIT_MIN = float(getenv("RATE_LIMIT_MIN", "0.5"))
+RATE_LIMIT_MAX = float(getenv("RATE_LIMIT_MAX", str(RATE_LIMIT * 4)))
+RATE_LIMIT_BURST = float(getenv("RATE_LIMIT_BURST", 10))
+RATE_LIMIT_INCREASE = float(getenv("RATE_LIMIT_INCREASE", "0.1"))
+RATE_LIMIT_DECREASE = float(getenv("RATE_LIMIT_DECREASE", "0.5"))
 GET_ERROR_RETRIES = int(getenv("GET_ERROR_RETRIES", 5))
 
+# hedged feed page and object requests: a request that isn't answered within
+# the HEDGE_PERCENTILE latency of the last HEDGE_WINDOW requests (not less than
+# HEDGE_MIN_DELAY seconds) is duplicated, the first response wins;
+# at most HEDGE_BUDGET of the requests are duplicated (HEDGE_BUDGET_BURST in a row)
+HEDGE_REQUESTS = get_bool_env("HEDGE_REQUESTS", False)
+HEDGE_PERCENTILE = float(getenv("HEDGE_PERCENTILE", 95))
+HEDGE_WINDOW = int(getenv("HEDGE_WINDOW", 1000))
+HEDGE_MIN_SAMPLES = int(getenv("HEDGE_MIN_SAMPLES", 20))
+HEDGE_MIN_DELAY = float(getenv("HEDGE_MIN_DELAY", "0.05"))
+HEDGE_BUDGET = float(getenv("HEDGE_BUDGET", "0.05"))
+HEDGE_BUDGET_BURST = float(getenv("HEDGE_BUDGET_BURST", 5))
+
+# forward crawler waits for the expected time of the next feed change
+# instead of NO_ITEMS_INTERVAL, and backs off on empty pages
+ADAPTIVE_POLLING = get_bool_env("ADAPTIVE_POLLING", False)
+ADAPTIVE_POLLING_MIN_INTERVAL = float(getenv("ADAPTIVE_POLLING_MIN_INTERVAL", "0.5"))
+ADAPTIVE_POLLING_MAX_INTERVAL = float(
+    getenv("ADAPTIVE_POLLING_MAX_INTERVAL", NO_ITEMS_INTERVAL),
+)
+ADAPTIVE_POLLING_BACKOFF = float(getenv("ADAPTIVE_POLLING_BACKOFF", 2))
+
+# data handler calls (ItemHandler items, ProcessPoolHandler batches)
+# of the forward/backward crawlers
+# of a feed at the same time (0 means no limit)
+FORWARD_HANDLER_CONCURRENCY = int(getenv("FORWARD_HANDLER_CONCURRENCY", 0))
+BACKWARD_HANDLER_CONCURRENCY = int(getenv("BACKWARD_HANDLER_CONCURRENCY", 0))
+# backward crawlers pause while the forward crawler lags more than
+# BACKWARD_PAUSE_LAG seconds behind the feed (0 disables)
+BACKWARD_PAUSE_LAG = float(getenv("BACKWARD_PAUSE_LAG", 0))
+
+# number of feed pages every crawler fetches ahead while data_handler
+# processes the current page (0 means strictly serial crawling)
+FEED_PREFETCH_DEPTH = int(getenv("FEED_PREFETCH_DEPTH", 0))
+
+# parse feed pages item by item while they are received
+# instead of buffering the whole body (lower memory peak on big pages),
+# DispatchHandler data handlers (ItemHandler, ProcessPoolHandler)
+# get the items as soon as they are decoded
+FEED_STREAMING_PARSE = get_bool_env("FEED_STREAMING_PARSE", False)
+
+# feed items are passed to data handlers as compact FeedItem records
+# (id, DATE_MODIFIED_FIELD and API_OPT_FIELDS slots) that can be read as dicts,
+# pages with items without these fields or with other fields are retried
+FEED_TYPED_ITEMS = get_bool_env("FEED_TYPED_ITEMS", False)
+
+# skip feed items whose same or newer version was handled already
+# (the last DEDUP_CACHE_SIZE objects for DEDUP_TTL seconds, 0 disables)
+DEDUP_CACHE_SIZE = int(getenv("DEDUP_CACHE_SIZE", 0))
+DEDUP_TTL = float(getenv("DEDUP_TTL", 3600))
+
+# json decoder used when main is called without json_loads:
+# orjson, msgspec, json or auto (the first installed of them)
+JSON_DECODER = getenv("JSON_DECODER", "auto")
+
+# default number of feed items processed at the same time by ItemHandler
+ITEM_HANDLER_CONCURRENCY = int(getenv("ITEM_HANDLER_CONCURRENCY", 10))
+# default number of resources process_resources fetches at the same time
+RESOURCES_CONCURRENCY = int(getenv("RESOURCES_CONCURRENCY", 10))
+# ProcessPoolHandler worker processes (0 means the number of CPUs),
+# items sent to a worker at once (0 means the whole page)
+# and batches processed or waiting for a worker (0 means twice the workers)
+PROCESS_POOL_WORKERS = int(getenv("PROCESS_POOL_WORKERS", 0))
+PROCESS_POOL_BATCH_SIZE = int(getenv("PROCESS_POOL_BATCH_SIZE", 0))
+PROCESS_POOL_MAX_PENDING = int(getenv("PROCESS_POOL_MAX_PENDING", 0))
+PROCESS_POOL_START_METHOD = getenv("PROCESS_POOL_START_METHOD", "spawn")
+
+# process_resource keeps the last OBJECT_CACHE_SIZE fetched objects (0 disables)
+# and doesn't fetch an object again if the feed dateModified is the cached one,
+# objects evicted from memory are kept in OBJECT_CACHE_DIR if it's set,
+# up to OBJECT_CACHE_DIR_SIZE files (the oldest are deleted, 0 - no limit)
+OBJECT_CACHE_SIZE = int(getenv("OBJECT_CACHE_SIZE", 0))
+OBJECT_CACHE_DIR = getenv("OBJECT_CACHE_DIR", "")
+OBJECT_CACHE_DIR_SIZE = int(getenv("OBJECT_CACHE_DIR_SIZE", 100000))
+
+# crawlers append the received feed pages to gzip segments
+# of about JOURNAL_SEGMENT_SIZE bytes in JOURNAL_DIR (empty disables)
+JOURNAL_DIR = getenv("JOURNAL_DIR", "")
+JOURNAL_SEGMENT_SIZE = int(getenv("JOURNAL_SEGMENT_SIZE", 16 * 1024 * 1024))
+JOURNAL_COMPRESS_LEVEL = int(getenv("JOURNAL_COMPRESS_LEVEL", 6))
+# memory-mapped indexes of the journal pages by offset timestamp and item id,
+# the id index starts with JOURNAL_ID_INDEX_CAPACITY slots and grows as needed
+JOURNAL_INDEX = get_bool_env("JOURNAL_INDEX", True)
+JOURNAL_ID_INDEX_CAPACITY = int(getenv("JOURNAL_ID_INDEX_CAPACITY", 1 << 16))
+# data handlers get the journaled pages instead of crawling the API,
+# optionally only pages with offset timestamps since/until (0 means no limit)
+JOURNAL_REPLAY = get_bool_env("JOURNAL_REPLAY", False)
+JOURNAL_REPLAY_SINCE = float(getenv("JOURNAL_REPLAY_SINCE", 0))
+JOURNAL_REPLAY_UNTIL = float(getenv("JOURNAL_REPLAY_UNTIL", 0))
+
 PUBLIC_API_HOST = getenv(
     "PUBLIC_API_HOST",
     "https://public-api-sandbox.prozorro.gov.ua",
@@ -83,6 +199,10 @@ CRAWLER_USER_AGENT = getenv(
     warn_crawler_user_agent,
 )
 
+# feed position storage: postgres if POSTGRES_HOST is set, mongodb otherwise
+# "memory" keeps positions in process (for benchmarks and local runs)
+STORAGE_BACKEND = getenv("STORAGE_BACKEND", "")
+
 MONGODB_URL = getenv("MONGODB_URL", "")
 MONGODB_DATABASE = getenv("MONGODB_DATABASE", "prozorro-crawler")
 MONGODB_STATE_COLLECTION = getenv("MONGODB_STATE_COLLECTION", "prozorro-crawler-state")
@@ -103,9 +223,24 @@ POSTGRES_STATE_ID = getenv(
     "crawler_state",
     warn_postgres_conflicts,
 )
+POSTGRES_POOL_MIN_SIZE = int(getenv("POSTGRES_POOL_MIN_SIZE", 1))
+POSTGRES_POOL_MAX_SIZE = int(getenv("POSTGRES_POOL_MAX_SIZE", 5))
 
 DB_ERROR_INTERVAL = int(getenv("DB_ERROR_INTERVAL", 5))
 
+# write-behind feed position saving: positions are saved by a background task
+# every CHECKPOINT_FLUSH_PAGES pages or CHECKPOINT_FLUSH_INTERVAL seconds
+# and on close_connection, so crawlers don't wait for the storage
+CHECKPOINT_WRITE_BEHIND = get_bool_env("CHECKPOINT_WRITE_BEHIND", False)
+CHECKPOINT_FLUSH_PAGES = int(getenv("CHECKPOINT_FLUSH_PAGES", 10))
+CHECKPOINT_FLUSH_INTERVAL = float(getenv("CHECKPOINT_FLUSH_INTERVAL", 5))
+
+# metrics
+# prometheus text format metrics are served on http://METRICS_HOST:METRICS_PORT/metrics
+METRICS_ENABLED = get_bool_env("METRICS_ENABLED", False)
+METRICS_HOST = getenv("METRICS_HOST", "0.0.0.0")
+METRICS_PORT = int(getenv("METRICS_PORT", 9100))
+
 # lock
 LOCK_ENABLED = get_bool_env("LOCK_ENABLED", False)
 LOCK_COLLECTION_NAME = getenv("LOCK_COLLECTION_NAME", "process_lock")
@@ -114,6 +249,19 @@ LOCK_UPDATE_TIME = int(getenv("LOCK_UPDATE_TIME", 30))
 LOCK_ACQUIRE_INTERVAL = int(getenv("LOCK_ACQUIRE_INTERVAL", 10))
 LOCK_PROCESS_NAME = getenv("LOCK_PROCESS_NAME", "crawler_lock", warn_db_conflicts)
 
+# lease-based work partitioning between crawler replicas (instead of LOCK_ENABLED):
+# resources (and BACKFILL_SHARDS parts) are leases in the lock collection,
+# every replica claims its share of them and renews them every LEASE_RENEW_INTERVAL seconds,
+# leases not renewed for LEASE_TIME seconds (a dead replica) are taken over
+LEASE_ENABLED = get_bool_env("LEASE_ENABLED", False)
+LEASE_TIME = int(getenv("LEASE_TIME", 30))
+LEASE_RENEW_INTERVAL = int(getenv("LEASE_RENEW_INTERVAL", 10))
+
+# supervisor restarts a dead worker after SUPERVISOR_RESTART_DELAY seconds,
+# doubled on every restart up to SUPERVISOR_MAX_RESTART_DELAY
+SUPERVISOR_RESTART_DELAY = float(getenv("SUPERVISOR_RESTART_DELAY", 1))
+SUPERVISOR_MAX_RESTART_DELAY = float(getenv("SUPERVISOR_MAX_RESTART_DELAY", 60))
+
 # initial offsets (used on first initialization of crawler if no saved position in db)
 BACKWARD_OFFSET = getenv("BACKWARD_OFFSET", "")
 FORWARD_OFFSET = getenv("FORWARD_OFFSET", "")
@@ -128,6 +276,19 @@ START_FORWARD_OFFSET = getenv("START_FORWARD_OFFSET", "")
 STOP_BACKWARD_OFFSET = getenv("STOP_BACKWARD_OFFSET", "")
 STOP_FORWARD_OFFSET = getenv("STOP_FORWARD_OFFSET", "")
 
+# split backward crawling into BACKFILL_SHARDS time ranges crawled in parallel,
+# from BACKFILL_START_OFFSET (or STOP_BACKWARD_OFFSET) to the backward offset
+BACKFILL_SHARDS = int(getenv("BACKFILL_SHARDS", 1))
+BACKFILL_START_OFFSET = getenv("BACKFILL_START_OFFSET", "")
+# crawl only a part of the feed in this process (see supervisor):
+# "forward" runs only the forward crawler, "<n>" only the n-th backfill shard
+# (after the forward crawler process saved the backward offset)
+BACKFILL_SHARD = getenv("BACKFILL_SHARD", "")
+BACKFILL_SHARD_WAIT_INTERVAL = int(getenv("BACKFILL_SHARD_WAIT_INTERVAL", 10))
+# handle only the items of an id hash partition "<i>/<N>" (0 <= i < N),
+# other items are skipped (see supervisor)
+ITEM_PARTITION = getenv("ITEM_PARTITION", "")
+
 TIMEZONE = pytz.timezone(os.getenv("TIMEZONE", "Europe/Kiev"))
 FORWARD_CHANGES_COOLDOWN_SECONDS = int(getenv("FORWARD_CHANGES_COOLDOWN_SECONDS", 0))
 SLEEP_FORWARD_CHANGES_SECONDS = int(
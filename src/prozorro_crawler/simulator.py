@@ -0,0 +1,250 @@
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timezone
+from hashlib import md5
+from random import Random
+from time import time
+from typing import Any, NamedTuple, Optional
+from uuid import UUID
+
+from aiohttp import web
+import asyncio
+
+from prozorro_crawler.settings import logger
+
+STATUSES = ("active", "active.enquiries", "active.tendering", "complete")
+
+
+class FeedEntry(NamedTuple):
+    seq: int
+    timestamp: float
+    id: str
+
+
+class FeedSimulator:
+    """
+    Local stand-in for the Prozorro feed API (for tests and benchmarks)
+
+    Serves /api/{version}/{resource} feed and /api/{version}/{resource}/{id} objects
+    (with ETag, If-None-Match requests get 304 if the object isn't changed).
+    Like the real feed, a changed object moves to the end of the feed,
+    offsets look like "<timestamp>.<counter>.<hash>"
+    and `<timestamp>` offsets (as used by backfill shards) are accepted too.
+    dateModified of the objects changed by `changes_rate`
+    is the simulator wall clock, so clients can measure change-to-handler latency
+
+    `latency` (seconds) is added to every response,
+    `*_rate` are the probabilities of an injected 429/412/404 feed response,
+    429 responses have Retry-After: `retry_after` header (if it's not None)
+    """
+
+    def __init__(
+        self,
+        objects: int = 1000,
+        changes_rate: float = 0,
+        history_seconds: float = 30 * 24 * 60 * 60,
+        latency: float = 0,
+        too_many_requests_rate: float = 0,
+        precondition_failed_rate: float = 0,
+        not_found_rate: float = 0,
+        retry_after: Optional[int] = 1,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.random = Random(seed)
+        self.changes_rate = changes_rate
+        self.latency = latency
+        self.too_many_requests_rate = too_many_requests_rate
+        self.precondition_failed_rate = precondition_failed_rate
+        self.not_found_rate = not_found_rate
+        self.retry_after = retry_after
+        self.entries: list[FeedEntry] = []
+        self.objects: dict[str, dict[str, Any]] = {}
+        self.objects_seq: dict[str, int] = {}
+        self.seq = 0
+        self.requests = 0
+        self.task: Optional[asyncio.Task[None]] = None
+
+        now = time()
+        start = now - history_seconds
+        for n in range(objects):
+            self.change(self.new_id(), start + history_seconds * n / max(objects, 1))
+
+    def new_id(self) -> str:
+        return UUID(int=self.random.getrandbits(128), version=4).hex
+
+    def change(self, object_id: str, timestamp: Optional[float] = None) -> None:
+        """
+        Create or modify an object, it moves to the end of the feed
+        """
+        if timestamp is None:
+            timestamp = time()
+        if self.entries:
+            # the feed is ordered by dateModified
+            timestamp = max(timestamp, self.entries[-1].timestamp)
+        self.seq += 1
+        self.entries.append(FeedEntry(self.seq, timestamp, object_id))
+        self.objects_seq[object_id] = self.seq
+        self.objects[object_id] = {
+            "id": object_id,
+            "dateModified": datetime.fromtimestamp(timestamp, timezone.utc).isoformat(),
+            "status": self.random.choice(STATUSES),
+            "title": f"Object {object_id}",
+        }
+
+    def get_offset(self, entry: FeedEntry) -> str:
+        digest = md5(entry.id.encode()).hexdigest()[:8]
+        return f"{entry.timestamp:.3f}.{entry.seq}.{digest}"
+
+    def find_position(self, offset: str, descending: bool) -> int:
+        """
+        Index of the first entry after the offset (in the feed direction)
+        """
+        parts = offset.split(".")
+        if len(parts) == 4:
+            seq = int(parts[2])
+            if descending:
+                return bisect_left(self.entries, seq, key=lambda e: e.seq) - 1
+            return bisect_right(self.entries, seq, key=lambda e: e.seq)
+        timestamp = float(offset)
+        if descending:
+            return bisect_left(self.entries, timestamp, key=lambda e: e.timestamp) - 1
+        return bisect_right(self.entries, timestamp, key=lambda e: e.timestamp)
+
+    def get_page(
+        self,
+        offset: str,
+        limit: int,
+        descending: bool,
+        opt_fields: list[str],
+    ) -> dict[str, Any]:
+        if offset:
+            position = self.find_position(offset, descending)
+        else:
+            position = len(self.entries) - 1 if descending else 0
+        step = -1 if descending else 1
+
+        page: list[FeedEntry] = []
+        while 0 <= position < len(self.entries) and len(page) < limit:
+            entry = self.entries[position]
+            # an entry is outdated if the object has been changed since
+            if self.objects_seq[entry.id] == entry.seq:
+                page.append(entry)
+            position += step
+
+        fields = {"id", "dateModified", *opt_fields}
+        data = [
+            {k: v for k, v in self.objects[entry.id].items() if k in fields}
+            for entry in page
+        ]
+        if page:
+            next_offset = self.get_offset(page[-1])
+            prev_offset = self.get_offset(page[0])
+        else:
+            next_offset = prev_offset = offset
+        return {
+            "data": data,
+            "next_page": {"offset": next_offset},
+            "prev_page": {"offset": prev_offset},
+        }
+
+    def get_error(self) -> Optional[web.Response]:
+        chance = self.random.random()
+        for status, rate in (
+            (429, self.too_many_requests_rate),
+            (412, self.precondition_failed_rate),
+            (404, self.not_found_rate),
+        ):
+            if chance < rate:
+                headers = {}
+                if status == 429 and self.retry_after is not None:
+                    headers["Retry-After"] = str(self.retry_after)
+                return web.json_response(
+                    {"status": "error", "errors": [{"description": "Simulated"}]},
+                    status=status,
+                    headers=headers,
+                )
+            chance -= rate
+        return None
+
+    async def feed_handler(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        error = self.get_error()
+        if error is not None:
+            return error
+        params = request.query
+        try:
+            page = self.get_page(
+                offset=params.get("offset", ""),
+                limit=int(params.get("limit") or 100),
+                descending=bool(params.get("descending")),
+                opt_fields=[f for f in params.get("opt_fields", "").split(",") if f],
+            )
+        except ValueError:
+            return web.json_response(
+                {"status": "error", "errors": [{"description": "Invalid offset"}]},
+                status=404,
+            )
+        return web.json_response(page)
+
+    async def object_handler(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        data = self.objects.get(request.match_info["id"])
+        if data is None:
+            return web.json_response(
+                {"status": "error", "errors": [{"description": "Not Found"}]},
+                status=404,
+            )
+        etag = '"{}"'.format(md5(data["dateModified"].encode()).hexdigest())
+        if request.headers.get("If-None-Match") == etag:
+            return web.Response(status=304, headers={"ETag": etag})
+        return web.json_response({"data": data}, headers={"ETag": etag})
+
+    async def generate_changes(self) -> None:
+        ids = list(self.objects)
+        while True:
+            await asyncio.sleep(self.random.expovariate(self.changes_rate))
+            if ids and self.random.random() < 0.5:
+                self.change(self.random.choice(ids))
+            else:
+                object_id = self.new_id()
+                ids.append(object_id)
+                self.change(object_id)
+
+    async def on_startup(self, app: web.Application) -> None:
+        if self.changes_rate:
+            self.task = asyncio.create_task(self.generate_changes())
+
+    async def on_cleanup(self, app: web.Application) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/{version}/{resource}", self.feed_handler)
+        app.router.add_get("/api/{version}/{resource}/{id}", self.object_handler)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+        """
+        Start serving, use `get_url` for the feed url
+        (port 0 picks a free one)
+        """
+        runner = web.AppRunner(self.make_app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(
+            f"Feed simulator is served on {self.get_url(runner)}",
+            extra={"MESSAGE_ID": "SIMULATOR_STARTED"},
+        )
+        return runner
+
+    @staticmethod
+    def get_url(runner: web.AppRunner, resource: str = "tenders") -> str:
+        host, port = runner.addresses[0][:2]
+        return f"http://{host}:{port}/api/2.5/{resource}"
@@ -1,4 +1,10 @@
-from prozorro_crawler.settings import POSTGRES_HOST
+from prozorro_crawler.settings import (
+    STORAGE_BACKEND,
+    POSTGRES_HOST,
+    POSTGRES_STATE_ID,
+    MONGODB_STATE_ID,
+    CHECKPOINT_WRITE_BEHIND,
+)
 from prozorro_crawler.storage.base import (
     BACKWARD_OFFSET_KEY,
     FORWARD_OFFSET_KEY,
@@ -6,7 +12,16 @@ from prozorro_crawler.storage.base import (
     LATEST_DATE_MODIFIED_KEY,
 )
 
-if POSTGRES_HOST:
+if STORAGE_BACKEND == "memory":
+    DEFAULT_STATE_ID = MONGODB_STATE_ID
+    from prozorro_crawler.storage.memory import (
+        close_connection,
+        save_feed_position,
+        get_feed_position,
+        drop_feed_position,
+    )
+elif POSTGRES_HOST:
+    DEFAULT_STATE_ID = POSTGRES_STATE_ID
     from prozorro_crawler.storage.postgres import (
         close_connection,
         save_feed_position,
@@ -14,6 +29,7 @@ if POSTGRES_HOST:
         drop_feed_position,
     )
 else:
+    DEFAULT_STATE_ID = MONGODB_STATE_ID
     from prozorro_crawler.storage.mongodb import (
         close_connection,
         save_feed_position,
@@ -21,11 +37,26 @@ else:
         drop_feed_position,
     )
 
+if CHECKPOINT_WRITE_BEHIND:
+    from prozorro_crawler.storage.checkpoint import CheckpointWriter
+
+    checkpoint_writer = CheckpointWriter(
+        save_position=save_feed_position,
+        drop_position=drop_feed_position,
+        close_storage=close_connection,
+        get_position=get_feed_position,
+    )
+    save_feed_position = checkpoint_writer.save
+    get_feed_position = checkpoint_writer.get
+    drop_feed_position = checkpoint_writer.drop
+    close_connection = checkpoint_writer.close
+
 __all__ = (
     "BACKWARD_OFFSET_KEY",
     "FORWARD_OFFSET_KEY",
     "EARLIEST_DATE_MODIFIED_KEY",
     "LATEST_DATE_MODIFIED_KEY",
+    "DEFAULT_STATE_ID",
     "close_connection",
     "save_feed_position",
     "get_feed_position",
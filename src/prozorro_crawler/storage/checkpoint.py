@@ -0,0 +1,132 @@
+from typing import Any, Awaitable, Callable, Optional
+
+from prozorro_crawler.settings import (
+    logger,
+    CHECKPOINT_FLUSH_PAGES,
+    CHECKPOINT_FLUSH_INTERVAL,
+)
+import asyncio
+
+
+class CheckpointWriter:
+    """
+    Write-behind feed position saving
+    Saved positions (forward and backward) are merged in memory
+    and written as one document per state by a background task
+    every `flush_pages` saves or every `flush_interval` seconds.
+    Once there are twice as many unwritten pages, save waits for the write,
+    so a slow storage can't make the crawler redo unlimited pages after a crash.
+    Read positions include the unwritten changes
+    """
+
+    def __init__(
+        self,
+        save_position: Callable[[dict[str, Any], Optional[str]], Awaitable[None]],
+        drop_position: Callable[[Optional[str]], Awaitable[None]],
+        close_storage: Callable[[], Awaitable[None]],
+        get_position: Callable[[Optional[str]], Awaitable[Optional[dict[str, Any]]]],
+        flush_pages: int = CHECKPOINT_FLUSH_PAGES,
+        flush_interval: float = CHECKPOINT_FLUSH_INTERVAL,
+    ) -> None:
+        self.save_position = save_position
+        self.drop_position = drop_position
+        self.close_storage = close_storage
+        self.get_position = get_position
+        self.flush_pages = max(flush_pages, 1)
+        self.flush_interval = flush_interval
+        self.pending: dict[Optional[str], dict[str, Any]] = {}
+        self.pending_pages = 0
+        # positions being written by flush
+        self.writing: dict[Optional[str], dict[str, Any]] = {}
+        # created in the running loop, the writer is created on import
+        self.flush_event: Optional[asyncio.Event] = None
+        self.lock: Optional[asyncio.Lock] = None
+        self.task: Optional[asyncio.Task[None]] = None
+
+    @property
+    def flush_needed(self) -> asyncio.Event:
+        if self.flush_event is None:
+            self.flush_event = asyncio.Event()
+        return self.flush_event
+
+    @property
+    def write_lock(self) -> asyncio.Lock:
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        return self.lock
+
+    async def get(self, state_id: Optional[str] = None) -> Optional[dict[str, Any]]:
+        """
+        Stored position with the unwritten changes on top of it
+        """
+        # taken before reading, a write may finish meanwhile
+        unwritten = {
+            **self.writing.get(state_id, {}),
+            **self.pending.get(state_id, {}),
+        }
+        position = await self.get_position(state_id)
+        if not unwritten:
+            return position
+        return {**(position or {}), **unwritten}
+
+    async def save(self, data: dict[str, Any], state_id: Optional[str] = None) -> None:
+        self.pending.setdefault(state_id, {}).update(data)
+        self.pending_pages += 1
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        if self.pending_pages >= 2 * self.flush_pages:
+            await self.flush()
+        elif self.pending_pages >= self.flush_pages:
+            self.flush_needed.set()
+
+    async def run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self.flush_needed.wait(),
+                    self.flush_interval or None,
+                )
+            except asyncio.TimeoutError:
+                pass
+            self.flush_needed.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self.write_lock:
+            if not self.pending:
+                return None
+            pending, pages = self.pending, self.pending_pages
+            self.pending, self.pending_pages = {}, 0
+            self.writing = pending
+            try:
+                while pending:
+                    state_id, data = next(iter(pending.items()))
+                    await self.save_position(data, state_id)
+                    del pending[state_id]
+            except BaseException:
+                # not written, newer pending positions have priority
+                for state_id, data in pending.items():
+                    self.pending[state_id] = {
+                        **data,
+                        **self.pending.get(state_id, {}),
+                    }
+                self.pending_pages += pages
+                raise
+            finally:
+                self.writing = {}
+            logger.debug(
+                f"Saved feed position of {pages} pages",
+                extra={"MESSAGE_ID": "CHECKPOINT_FLUSHED"},
+            )
+
+    async def drop(self, state_id: Optional[str] = None) -> None:
+        async with self.write_lock:
+            self.pending.pop(state_id, None)
+            await self.drop_position(state_id)
+
+    async def close(self) -> None:
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
+        await self.close_storage()
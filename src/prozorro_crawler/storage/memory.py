@@ -0,0 +1,35 @@
+from typing import Any, Optional
+
+from prozorro_crawler.settings import MONGODB_STATE_ID
+from .base import (
+    BACKWARD_OFFSET_KEY,
+    FORWARD_OFFSET_KEY,
+)
+
+# in-process storage, feed positions are lost on exit
+# (meant for benchmarks and local runs)
+states: dict[str, dict[str, Any]] = {}
+
+
+async def close_connection() -> None:
+    pass
+
+
+async def save_feed_position(
+    data: dict[str, str],
+    state_id: Optional[str] = None,
+) -> None:
+    states.setdefault(state_id or MONGODB_STATE_ID, {}).update(data)
+
+
+async def get_feed_position(
+    state_id: Optional[str] = None,
+) -> Optional[dict[str, str]]:
+    state = states.get(state_id or MONGODB_STATE_ID)
+    return dict(state) if state is not None else None
+
+
+async def drop_feed_position(state_id: Optional[str] = None) -> None:
+    state = states.get(state_id or MONGODB_STATE_ID, {})
+    state.pop(BACKWARD_OFFSET_KEY, None)
+    state.pop(FORWARD_OFFSET_KEY, None)
@@ -51,12 +51,15 @@ async def handle_db_exception(e: PyMongoError, message: str) -> None:
     await asyncio.sleep(DB_ERROR_INTERVAL)
 
 
-async def save_feed_position(data: dict[str, str]) -> None:
+async def save_feed_position(
+    data: dict[str, str],
+    state_id: Optional[str] = None,
+) -> None:
     collection = get_mongodb_collection(MONGODB_STATE_COLLECTION)
     while True:
         try:
             await collection.update_one(
-                {"_id": MONGODB_STATE_ID},
+                {"_id": state_id or MONGODB_STATE_ID},
                 {"$set": data},
                 upsert=True,
             )
@@ -66,21 +69,23 @@ async def save_feed_position(data: dict[str, str]) -> None:
             return None
 
 
-async def get_feed_position() -> Optional[dict[str, str]]:
+async def get_feed_position(
+    state_id: Optional[str] = None,
+) -> Optional[dict[str, str]]:
     collection = get_mongodb_collection(MONGODB_STATE_COLLECTION)
     while True:
         try:
-            return await collection.find_one({"_id": MONGODB_STATE_ID})
+            return await collection.find_one({"_id": state_id or MONGODB_STATE_ID})
         except PyMongoError as e:
             await handle_db_exception(e, "Get feed pos")
 
 
-async def drop_feed_position() -> None:
+async def drop_feed_position(state_id: Optional[str] = None) -> None:
     collection = get_mongodb_collection(MONGODB_STATE_COLLECTION)
     while True:
         try:
             await collection.update_one(
-                {"_id": MONGODB_STATE_ID},
+                {"_id": state_id or MONGODB_STATE_ID},
                 {
                     "$unset": {
                         BACKWARD_OFFSET_KEY: "",
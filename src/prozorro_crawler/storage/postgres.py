@@ -8,11 +8,15 @@ from prozorro_crawler.settings import (
     POSTGRES_PASSWORD,
     POSTGRES_STATE_TABLE,
     POSTGRES_STATE_ID,
+    POSTGRES_POOL_MIN_SIZE,
+    POSTGRES_POOL_MAX_SIZE,
     DB_ERROR_INTERVAL,
 )
 from .base import (
     BACKWARD_OFFSET_KEY,
     FORWARD_OFFSET_KEY,
+    EARLIEST_DATE_MODIFIED_KEY,
+    LATEST_DATE_MODIFIED_KEY,
 )
 import asyncpg
 import asyncio
@@ -20,114 +24,147 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# feed position keys stored in the state table columns
+STATE_COLUMNS = (
+    FORWARD_OFFSET_KEY,
+    BACKWARD_OFFSET_KEY,
+    EARLIEST_DATE_MODIFIED_KEY,
+    LATEST_DATE_MODIFIED_KEY,
+)
 
-_connection = None
+_pool: Optional[asyncpg.Pool] = None
+_pool_lock = asyncio.Lock()
 
 
-async def reconnect() -> asyncpg.Connection:
-    global _connection
+async def create_pool() -> asyncpg.Pool:
     while True:
         try:
-            _connection = await asyncpg.connect(
+            return await asyncpg.create_pool(
                 user=POSTGRES_USER,
                 password=POSTGRES_PASSWORD,
                 database=POSTGRES_DB,
                 host=POSTGRES_HOST,
                 port=POSTGRES_PORT,
+                min_size=POSTGRES_POOL_MIN_SIZE,
+                max_size=POSTGRES_POOL_MAX_SIZE,
             )
         except Exception as e:
             logger.error(f"Unable to connect: {e.args}")
             await asyncio.sleep(DB_ERROR_INTERVAL)
-        else:
-            return _connection
 
 
-async def get_connection() -> asyncpg.Connection:
-    connection = await reconnect()
+async def init_schema(pool: asyncpg.Pool) -> None:
     while True:
         try:
-            await connection.execute(
+            await pool.execute(
                 f"""
                     CREATE TABLE IF NOT EXISTS {POSTGRES_STATE_TABLE}(
                         id varchar PRIMARY KEY,
                         server_id varchar,
                         {FORWARD_OFFSET_KEY} varchar,
                         {BACKWARD_OFFSET_KEY} varchar
-                    )
-                """,
+                    );
+                """
+                # migrate tables created before the column was added
+                + "".join(
+                    f"ALTER TABLE {POSTGRES_STATE_TABLE} "
+                    f"ADD COLUMN IF NOT EXISTS {column} varchar;"
+                    for column in STATE_COLUMNS
+                ),
             )
         except Exception as e:
             logger.error(f"sql command error: {e.args}")
             await asyncio.sleep(DB_ERROR_INTERVAL)
         else:
-            break
-    return connection
+            return None
+
+
+async def get_pool() -> asyncpg.Pool:
+    """
+    Connection pool is created and the schema is initialized once,
+    then connections are reused (and their statements are prepared once
+    by asyncpg statement cache)
+    """
+    global _pool
+    async with _pool_lock:
+        if _pool is None:
+            pool = await create_pool()
+            await init_schema(pool)
+            _pool = pool
+    return _pool
 
 
 async def close_connection() -> None:
-    conn = await get_connection()
-    await conn.close()
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
 
 
 async def handle_exception(e: BaseException) -> None:
     logger.warning(f"sql command error: {e.args}")
-    if e.args and "connection is closed" in e.args[0]:
-        await reconnect()
+    if _pool is not None and isinstance(
+        e,
+        (asyncpg.PostgresConnectionError, asyncpg.InterfaceError, OSError),
+    ):
+        # connections are probably broken (e.g. server restarted),
+        # they are reconnected on the next acquire
+        await _pool.expire_connections()
     await asyncio.sleep(DB_ERROR_INTERVAL)
 
 
-async def get_feed_position() -> Optional[dict[str, str]]:
+async def get_feed_position(
+    state_id: Optional[str] = None,
+) -> Optional[dict[str, str]]:
     while True:
-        conn = await get_connection()
+        pool = await get_pool()
         try:
-            row = await conn.fetchrow(
+            row = await pool.fetchrow(
                 f"SELECT * FROM {POSTGRES_STATE_TABLE} WHERE id = $1",
-                POSTGRES_STATE_ID,
+                state_id or POSTGRES_STATE_ID,
             )
         except Exception as e:
             await handle_exception(e)
-            return None
         else:
             if row is None:
                 return None
             return dict(row.items())
 
 
-async def save_feed_position(data: dict[str, str]) -> None:
-    offset_key = (
-        FORWARD_OFFSET_KEY if FORWARD_OFFSET_KEY in data else BACKWARD_OFFSET_KEY
-    )
-    result = await execute_command(
-        f"UPDATE {POSTGRES_STATE_TABLE} "
-        f"SET server_id = $1, {offset_key} = $2 WHERE id = $3",
-        "",
-        str(data[offset_key]),
-        POSTGRES_STATE_ID,
-    )
-    if result == "UPDATE 0":  # "UPDATE 1" is expected
-        result = await execute_command(
-            f"INSERT INTO {POSTGRES_STATE_TABLE} VALUES($1, $2, $3, $4)",
-            POSTGRES_STATE_ID,
-            "",
-            str(data.get(FORWARD_OFFSET_KEY, "")),
-            str(data.get(BACKWARD_OFFSET_KEY, "")),
+async def save_feed_position(
+    data: dict[str, str],
+    state_id: Optional[str] = None,
+) -> None:
+    columns = [key for key in STATE_COLUMNS if key in data]
+    if len(columns) != len(data):
+        logger.warning(
+            f"Feed position keys are not stored: {set(data) - set(columns)}",
         )
-        if result != "INSERT 0 1":
-            logger.error(f"Unexpected insert result: {result}")
+    if not columns:
+        return None
+    values = ", ".join(f"${n}" for n in range(2, len(columns) + 2))
+    updates = ", ".join(f"{column} = EXCLUDED.{column}" for column in columns)
+    await execute_command(
+        f"INSERT INTO {POSTGRES_STATE_TABLE} (id, {', '.join(columns)}) "
+        f"VALUES ($1, {values}) "
+        f"ON CONFLICT (id) DO UPDATE SET {updates}",
+        state_id or POSTGRES_STATE_ID,
+        *(str(data[column]) for column in columns),
+    )
 
 
-async def drop_feed_position() -> None:
+async def drop_feed_position(state_id: Optional[str] = None) -> None:
     await execute_command(
         f"DELETE FROM {POSTGRES_STATE_TABLE} WHERE id = $1",
-        POSTGRES_STATE_ID,
+        state_id or POSTGRES_STATE_ID,
     )
 
 
 async def execute_command(comm: str, *args: Any) -> str:
     while True:
-        conn = await get_connection()
+        pool = await get_pool()
         try:
-            result = await conn.execute(comm, *args)
+            result = await pool.execute(comm, *args)
         except Exception as e:
             await handle_exception(e)
         else:
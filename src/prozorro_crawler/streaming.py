@@ -0,0 +1,238 @@
+from codecs import getincrementaldecoder
+from json.decoder import JSONDecodeError
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+import json
+import re
+
+import aiohttp
+from aiohttp.typedefs import JSONDecoder as JSONLoads
+
+# strings are matched whole, so brackets inside them are skipped
+# a lone quote is an unterminated string at the end of the received part
+TOKENS = re.compile(r'"(?:[^"\\]|\\.)*"|[{}\[\]:,]|"', re.DOTALL)
+ITEM_START = re.compile(r"[^\s,]")
+# item scanner: structure outside strings, string end or escape inside them
+ITEM_STRUCTURE = re.compile(r'[{}\[\]"]')
+ITEM_STRING = re.compile(r'["\\]')
+
+DATA_KEY = "data"
+
+
+class StreamingFeedParser:
+    """
+    Incremental parser of a feed page
+    Every `data` item is decoded as soon as its text is received,
+    other top-level fields (next_page, prev_page) are collected into `page`.
+    Parsed text is dropped from the buffer, so the raw body
+    and the parsed page are never held in memory at the same time
+
+    Item boundaries are found by a bracket and string scanner that continues
+    where the previous chunk ended, then the item text is decoded once
+    by `item_loads` (json_loads by default)
+    """
+
+    def __init__(
+        self,
+        json_loads: JSONLoads = json.loads,
+        item_loads: Optional[Callable[[str], Any]] = None,
+    ) -> None:
+        self.json_loads = json_loads
+        self.item_loads = item_loads or json_loads
+        self.text_decoder = getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.depth = 0
+        self.key: Optional[str] = None
+        self.expect_key = False
+        self.value_start: Optional[int] = None
+        self.in_items = False
+        # text of the item that is being received
+        self.item_parts: Optional[list[str]] = None
+        self.item_depth = 0
+        self.item_string = False
+        self.item_escape = False
+        self.page: dict[str, Any] = {}
+        self.items: list[Any] = []
+        self.done = False
+
+    def feed(self, chunk: bytes) -> list[Any]:
+        """
+        Returns data items completed by the chunk
+        """
+        text = self.text_decoder.decode(chunk)
+        items: list[Any] = []
+        if self.item_parts is not None:
+            end = self.scan_item(text, 0)
+            if end is None:
+                self.item_parts.append(text)
+                return items
+            self.item_parts.append(text[:end])
+            items.append(self.add_item("".join(self.item_parts)))
+            self.item_parts = None
+            text = text[end:]
+        self.buffer += text
+
+        while True:
+            if self.in_items:
+                item_start = ITEM_START.search(self.buffer, self.pos)
+                if item_start is None:
+                    self.pos = len(self.buffer)
+                    break
+                self.pos = item_start.start()
+                if item_start.group() != "]":
+                    if item_start.group() != "{":
+                        raise self.error("Expecting object", self.pos)
+                    end = self.scan_item(self.buffer, self.pos)
+                    if end is None:
+                        # the rest of the item is collected by the next chunks
+                        self.item_parts = [self.buffer[self.pos :]]
+                        self.pos = len(self.buffer)
+                        break
+                    items.append(self.add_item(self.buffer[self.pos : end]))
+                    self.pos = end
+                    continue
+
+            match = TOKENS.search(self.buffer, self.pos)
+            if match is None:
+                self.pos = len(self.buffer)
+                break
+            token = match.group()
+            if token == '"':
+                # wait for the rest of the string
+                self.pos = match.start()
+                break
+            self.pos = match.end()
+            if self.done:
+                raise self.error("Extra data", match.start())
+            if token in "{[":
+                self.depth += 1
+                if self.depth == 1 and token != "{":
+                    raise self.error("Expecting object", match.start())
+                if self.depth == 1:
+                    self.expect_key = True
+                elif self.depth == 2 and self.key == DATA_KEY and token == "[":
+                    self.in_items = True
+            elif token in "}]":
+                self.depth -= 1
+                self.in_items = False
+                if self.depth == 0:
+                    self.end_value(match.start())
+                    self.done = True
+            elif self.depth == 1:
+                if self.expect_key and token.startswith('"'):
+                    self.key = self.json_loads(token)
+                    self.expect_key = False
+                elif token == ":":
+                    self.value_start = match.end()
+                elif token == ",":
+                    self.end_value(match.start())
+                    self.expect_key = True
+        self.trim()
+        return items
+
+    def scan_item(self, text: str, pos: int) -> Optional[int]:
+        """
+        End of the item in the text, None if it continues in the next chunks
+        The scanner state is kept between the calls,
+        so every character of an item is scanned once
+        """
+        if self.item_escape and pos < len(text):
+            # the escaped character is the first one of the chunk
+            self.item_escape = False
+            pos += 1
+        while True:
+            if self.item_string:
+                match = ITEM_STRING.search(text, pos)
+                if match is None:
+                    return None
+                if match.group() == "\\":
+                    if match.end() == len(text):
+                        self.item_escape = True
+                        return None
+                    pos = match.end() + 1
+                    continue
+                self.item_string = False
+                pos = match.end()
+                continue
+            match = ITEM_STRUCTURE.search(text, pos)
+            if match is None:
+                return None
+            pos = match.end()
+            char = match.group()
+            if char == '"':
+                self.item_string = True
+            elif char in "{[":
+                self.item_depth += 1
+            else:
+                self.item_depth -= 1
+                if self.item_depth == 0:
+                    return pos
+
+    def add_item(self, text: str) -> Any:
+        item = self.item_loads(text)
+        self.items.append(item)
+        return item
+
+    def end_value(self, end: int) -> None:
+        if self.value_start is None:
+            return None
+        if self.key == DATA_KEY:
+            self.page[DATA_KEY] = self.items
+        elif self.key is not None:
+            self.page[self.key] = self.json_loads(self.buffer[self.value_start : end])
+        self.key = self.value_start = None
+
+    def trim(self) -> None:
+        # keep the text of the top-level value that is being received
+        cut = self.pos
+        if self.value_start is not None and self.key != DATA_KEY:
+            cut = min(cut, self.value_start)
+        if cut:
+            self.buffer = self.buffer[cut:]
+            self.pos -= cut
+            if self.value_start is not None:
+                # data value start is only a marker, its items are parsed already
+                self.value_start = max(self.value_start - cut, 0)
+
+    def error(self, message: str, pos: int) -> JSONDecodeError:
+        return JSONDecodeError(message, self.buffer, pos)
+
+    def close(self) -> dict[str, Any]:
+        try:
+            self.text_decoder.decode(b"", final=True)
+        except UnicodeDecodeError as e:
+            raise self.error("Unexpected end of feed page", len(self.buffer)) from e
+        if not self.done:
+            raise self.error("Unexpected end of feed page", self.pos)
+        return self.page
+
+
+async def iter_feed_items(
+    resp: aiohttp.ClientResponse,
+    parser: StreamingFeedParser,
+) -> AsyncIterator[Any]:
+    """
+    Data items of the response feed page as soon as they are received,
+    the rest of the page is parser.close() once they are iterated
+    """
+    async for chunk in resp.content.iter_any():
+        for item in parser.feed(chunk):
+            yield item
+
+
+async def read_feed_page(
+    resp: aiohttp.ClientResponse,
+    json_loads: JSONLoads = json.loads,
+    on_items: Optional[Callable[[list[Any]], Awaitable[None]]] = None,
+    item_loads: Optional[Callable[[str], Any]] = None,
+) -> dict[str, Any]:
+    """
+    Parse feed page from the response stream (see StreamingFeedParser)
+    on_items gets the data items of every chunk as soon as they are decoded
+    """
+    parser = StreamingFeedParser(json_loads, item_loads)
+    async for chunk in resp.content.iter_any():
+        items = parser.feed(chunk)
+        if items and on_items is not None:
+            await on_items(items)
+    return parser.close()
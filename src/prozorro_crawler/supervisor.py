@@ -0,0 +1,313 @@
+from argparse import ArgumentParser
+from itertools import product
+from time import monotonic
+from types import FrameType
+from typing import Callable, NamedTuple, Optional
+import os
+import signal
+
+from aiohttp import web
+import aiohttp
+import asyncio
+
+from prozorro_crawler.metrics import (
+    WORKER_RESTARTS,
+    WORKER_UP,
+    render_metrics,
+)
+from prozorro_crawler.settings import (
+    logger,
+    LOCK_PROCESS_NAME,
+    METRICS_ENABLED,
+    METRICS_HOST,
+    METRICS_PORT,
+    MONGODB_STATE_ID,
+    POSTGRES_STATE_ID,
+    SUPERVISOR_RESTART_DELAY,
+    SUPERVISOR_MAX_RESTART_DELAY,
+)
+
+WORKER_METRICS_HOST = "127.0.0.1"
+WORKER_METRICS_TIMEOUT = 5
+
+
+class WorkerSpec(NamedTuple):
+    name: str
+    # environment variables of the worker process
+    env: dict[str, str]
+    metrics_port: int
+
+
+class WorkSlice(NamedTuple):
+    name: str
+    env: dict[str, str]
+    # slices of the same feed position share it
+    own_state: bool = True
+
+
+def get_worker_specs(
+    resources: Optional[list[str]] = None,
+    partitions: int = 0,
+    backfill_shards: int = 0,
+    metrics_port: int = METRICS_PORT,
+) -> list[WorkerSpec]:
+    """
+    A worker for every combination of the resource, the item id partition
+    and the backfill part (the forward crawler or a shard).
+    Every worker has its own lock and metrics port and,
+    unless it's a backfill shard, its own feed position state id
+    """
+    resource_slices: list[Optional[WorkSlice]] = [
+        WorkSlice(resource, {"API_RESOURCE": resource}) for resource in resources or []
+    ]
+    partition_slices: list[Optional[WorkSlice]] = [
+        WorkSlice(f"part{n}of{partitions}", {"ITEM_PARTITION": f"{n}/{partitions}"})
+        for n in range(partitions if partitions > 1 else 0)
+    ]
+    backfill_slices: list[Optional[WorkSlice]] = [
+        WorkSlice(
+            f"backfill.{shard}",
+            {"BACKFILL_SHARD": shard, "BACKFILL_SHARDS": str(backfill_shards)},
+            own_state=False,
+        )
+        for shard in ["forward", *(str(n) for n in range(1, backfill_shards + 1))]
+        if backfill_shards > 1
+    ]
+
+    specs: list[WorkerSpec] = []
+    for slices in product(
+        resource_slices or [None],
+        partition_slices or [None],
+        backfill_slices or [None],
+    ):
+        work = [s for s in slices if s is not None]
+        name = ".".join(s.name for s in work) or "main"
+        env = {key: value for s in work for key, value in s.env.items()}
+        state_suffix = ".".join(s.name for s in work if s.own_state)
+        if state_suffix:
+            env["MONGODB_STATE_ID"] = f"{MONGODB_STATE_ID}.{state_suffix}"
+            env["POSTGRES_STATE_ID"] = f"{POSTGRES_STATE_ID}.{state_suffix}"
+        env["LOCK_PROCESS_NAME"] = f"{LOCK_PROCESS_NAME}.{name}"
+        port = metrics_port + 1 + len(specs)
+        env["METRICS_ENABLED"] = "true"
+        env["METRICS_HOST"] = WORKER_METRICS_HOST
+        env["METRICS_PORT"] = str(port)
+        specs.append(WorkerSpec(name, env, port))
+    return specs
+
+
+class Supervisor:
+    """
+    Runs the crawler `command` in a worker process for every spec
+    with the spec environment variables
+    A worker that exits with an error is restarted after `restart_delay`
+    seconds, doubled on every restart up to `max_restart_delay`.
+    Metrics of all the workers are collected with a "worker" label
+    """
+
+    def __init__(
+        self,
+        command: list[str],
+        specs: list[WorkerSpec],
+        restart_delay: float = SUPERVISOR_RESTART_DELAY,
+        max_restart_delay: float = SUPERVISOR_MAX_RESTART_DELAY,
+    ) -> None:
+        self.command = command
+        self.specs = specs
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.processes: dict[str, asyncio.subprocess.Process] = {}
+        self.running = True
+
+    def should_run(self) -> bool:
+        return self.running
+
+    async def run(self) -> None:
+        await asyncio.gather(*(self.run_worker(spec) for spec in self.specs))
+
+    async def run_worker(self, spec: WorkerSpec) -> None:
+        delay = self.restart_delay
+        while self.should_run():
+            started = monotonic()
+            process = await asyncio.create_subprocess_exec(
+                *self.command,
+                env={**os.environ, **spec.env},
+            )
+            self.processes[spec.name] = process
+            WORKER_UP.set(1, worker=spec.name)
+            logger.info(
+                f"Worker {spec.name} started, pid {process.pid}",
+                extra={"MESSAGE_ID": "WORKER_STARTED"},
+            )
+            code = await process.wait()
+            WORKER_UP.set(0, worker=spec.name)
+            if code == 0 or not self.should_run():
+                logger.info(
+                    f"Worker {spec.name} finished with code {code}",
+                    extra={"MESSAGE_ID": "WORKER_FINISHED"},
+                )
+                return None
+
+            if monotonic() - started > self.max_restart_delay:
+                # it worked for a while, so it's not a crash loop
+                delay = self.restart_delay
+            logger.error(
+                f"Worker {spec.name} died with code {code}, restarting in {delay} seconds",
+                extra={"MESSAGE_ID": "WORKER_DIED"},
+            )
+            WORKER_RESTARTS.inc(worker=spec.name)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_restart_delay)
+
+    def stop(self) -> None:
+        self.running = False
+        for process in self.processes.values():
+            if process.returncode is None:
+                process.send_signal(signal.SIGTERM)
+
+    async def collect_metrics(self, session: aiohttp.ClientSession) -> str:
+        """
+        Metrics of the supervisor and of all the running workers
+        """
+        families = MetricFamilies()
+        families.add(render_metrics())
+        for spec in self.specs:
+            url = f"http://{WORKER_METRICS_HOST}:{spec.metrics_port}/metrics"
+            try:
+                async with session.get(url) as resp:
+                    families.add(await resp.text(), worker=spec.name)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.debug(
+                    f"Can't get worker {spec.name} metrics: {e}",
+                    extra={"MESSAGE_ID": "WORKER_METRICS_ERROR"},
+                )
+        return families.render()
+
+    async def start_metrics_server(
+        self,
+        host: str = METRICS_HOST,
+        port: int = METRICS_PORT,
+    ) -> web.AppRunner:
+        session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=WORKER_METRICS_TIMEOUT),
+        )
+
+        async def metrics_handler(request: web.Request) -> web.Response:
+            return web.Response(text=await self.collect_metrics(session))
+
+        async def close_session(app: web.Application) -> None:
+            await session.close()
+
+        app = web.Application()
+        app.router.add_get("/metrics", metrics_handler)
+        app.on_cleanup.append(close_session)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        logger.info(
+            f"Workers metrics are served on http://{host}:{port}/metrics",
+            extra={"MESSAGE_ID": "METRICS_SERVER_STARTED"},
+        )
+        return runner
+
+
+class MetricFamilies:
+    """
+    Merges prometheus text format metrics,
+    samples of the same metric from different sources are kept together
+    """
+
+    def __init__(self) -> None:
+        self.headers: dict[str, list[str]] = {}
+        self.samples: dict[str, list[str]] = {}
+
+    def add(self, text: str, **labels: str) -> None:
+        family = ""
+        for line in text.splitlines():
+            if line.startswith("# "):
+                parts = line.split(" ", 3)
+                if len(parts) < 3 or parts[1] not in ("HELP", "TYPE"):
+                    continue
+                family = parts[2]
+                if line not in self.headers.setdefault(family, []):
+                    self.headers[family].append(line)
+            elif line.strip():
+                self.samples.setdefault(family, []).append(add_labels(line, labels))
+
+    def render(self) -> str:
+        lines = []
+        for family in dict.fromkeys([*self.headers, *self.samples]):
+            lines.extend(self.headers.get(family, []))
+            lines.extend(self.samples.get(family, []))
+        return "\n".join(lines) + "\n"
+
+
+def add_labels(sample: str, labels: dict[str, str]) -> str:
+    if not labels:
+        return sample
+    added = ",".join(f'{name}="{value}"' for name, value in labels.items())
+    name_end = min(
+        (i for i in (sample.find("{"), sample.find(" ")) if i != -1),
+        default=len(sample),
+    )
+    name, rest = sample[:name_end], sample[name_end:]
+    if rest.startswith("{}"):
+        return f"{name}{{{added}}}{rest[2:]}"
+    if rest.startswith("{"):
+        return f"{name}{{{added},{rest[1:]}"
+    return f"{name}{{{added}}}{rest}"
+
+
+def get_stop_signal_handler(
+    supervisor: Supervisor,
+) -> Callable[[int, Optional[FrameType]], None]:
+    def handler(signum: int, frame: Optional[FrameType]) -> None:
+        logger.warning(
+            f"Handling signal {signum}: stopping workers",
+            extra={"MESSAGE_ID": "HANDLE_STOP_SIG"},
+        )
+        supervisor.stop()
+
+    return handler
+
+
+async def run_supervisor(supervisor: Supervisor) -> None:
+    runner = await supervisor.start_metrics_server() if METRICS_ENABLED else None
+    try:
+        await supervisor.run()
+    finally:
+        if runner is not None:
+            await runner.cleanup()
+
+
+def main() -> None:
+    parser = ArgumentParser(
+        description="Run crawler worker processes, each with a part of the work",
+    )
+    parser.add_argument(
+        "--resources", default="", help="comma separated, a worker per resource"
+    )
+    parser.add_argument(
+        "--partitions", type=int, default=0, help="item id hash partitions"
+    )
+    parser.add_argument(
+        "--backfill-shards", type=int, default=0, help="a worker per backfill shard"
+    )
+    parser.add_argument(
+        "command", nargs="+", help="crawler command, e.g. python crawler.py"
+    )
+    args = parser.parse_args()
+
+    specs = get_worker_specs(
+        resources=[r for r in args.resources.split(",") if r],
+        partitions=args.partitions,
+        backfill_shards=args.backfill_shards,
+    )
+    supervisor = Supervisor(args.command, specs)
+    signal.signal(signal.SIGINT, get_stop_signal_handler(supervisor))
+    signal.signal(signal.SIGTERM, get_stop_signal_handler(supervisor))
+    asyncio.run(run_supervisor(supervisor))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+from typing import Optional
+
+import aiohttp
+import asyncio
+
+from prozorro_crawler.settings import (
+    logger,
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_AIODNS,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_TOTAL_TIMEOUT,
+)
+from prozorro_crawler.utils import get_default_headers
+
+# errors of a request that can be retried
+# (timeouts of ClientTimeout are asyncio.TimeoutError)
+REQUEST_ERRORS: tuple[type[Exception], ...] = (
+    aiohttp.ClientError,
+    asyncio.TimeoutError,
+)
+
+
+def get_connector() -> aiohttp.TCPConnector:
+    resolver: Optional[aiohttp.abc.AbstractResolver] = None
+    if HTTP_AIODNS:
+        try:
+            resolver = aiohttp.AsyncResolver()
+        except (ImportError, RuntimeError) as e:
+            logger.warning(
+                f"aiodns resolver isn't available: {e}",
+                extra={"MESSAGE_ID": "AIODNS_NOT_AVAILABLE"},
+            )
+    return aiohttp.TCPConnector(
+        limit=HTTP_POOL_LIMIT,
+        limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+        keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+        ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+        resolver=resolver,
+    )
+
+
+def get_timeout() -> aiohttp.ClientTimeout:
+    return aiohttp.ClientTimeout(
+        total=HTTP_TOTAL_TIMEOUT or None,
+        sock_connect=HTTP_CONNECT_TIMEOUT or None,
+        sock_read=HTTP_READ_TIMEOUT or None,
+    )
+
+
+def create_session(
+    additional_headers: Optional[dict[str, str]] = None,
+) -> aiohttp.ClientSession:
+    """
+    Client session with the HTTP_* settings connection pool and timeouts
+    """
+    return aiohttp.ClientSession(
+        connector=get_connector(),
+        headers=get_default_headers(additional_headers),
+        timeout=get_timeout(),
+    )
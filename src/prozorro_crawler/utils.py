@@ -1,4 +1,5 @@
 from datetime import datetime
+from importlib.util import find_spec
 from typing import Optional
 
 
@@ -7,6 +8,7 @@ from prozorro_crawler.settings import (
     BASE_URL,
     API_TOKEN,
     TIMEZONE,
+    HTTP_ACCEPT_ENCODING,
 )
 from prozorro_crawler.storage.base import (
     BACKWARD_OFFSET_KEY,
@@ -20,11 +22,21 @@ def get_resource_url(resource: str) -> str:
     return f"{BASE_URL}/{resource}"
 
 
+def get_accept_encoding() -> str:
+    if HTTP_ACCEPT_ENCODING:
+        return HTTP_ACCEPT_ENCODING
+    # aiohttp decodes br responses if brotli is installed
+    if find_spec("brotli") or find_spec("brotlicffi"):
+        return "gzip, deflate, br"
+    return "gzip, deflate"
+
+
 def get_default_headers(additional_headers: Optional[dict[str, str]]) -> dict[str, str]:
     headers = {}
     if API_TOKEN:
         headers["Authorization"] = f"Bearer {API_TOKEN}"
     headers["User-Agent"] = CRAWLER_USER_AGENT
+    headers["Accept-Encoding"] = get_accept_encoding()
     if isinstance(additional_headers, dict):
         headers.update(additional_headers)
     return headers
@@ -48,6 +60,14 @@ def get_offset_timestamp(offset: str) -> Optional[float]:
         return None
 
 
+def get_timestamp_offset(timestamp: float) -> str:
+    """
+    Feed offset of a unix timestamp,
+    formatted as the "1735484400.068" part of the feed offsets
+    """
+    return f"{timestamp:.3f}"
+
+
 def get_offset_age(offset: str) -> Optional[float]:
     """
     Get age of offset in seconds
@@ -0,0 +1,11 @@
+from typing import Iterator
+from unittest.mock import patch
+import json
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def default_json_loads() -> Iterator[None]:
+    # mocked responses are read with resp.json
+    with patch("prozorro_crawler.decoding._default_json_loads", json.loads):
+        yield
@@ -0,0 +1,51 @@
+from prozorro_crawler.backfill import (
+    get_backfill_shards,
+    select_backfill_shards,
+    BackfillShard,
+)
+import logging
+import pytest
+
+
+def test_get_backfill_shards() -> None:
+    shards = get_backfill_shards(
+        "state",
+        "1300.0.1.abc",
+        shards=3,
+        start_offset="1000",
+    )
+
+    assert shards == [
+        BackfillShard("state.backfill.1300.1of3", "1300.0.1.abc", "1200.000"),
+        BackfillShard("state.backfill.1300.2of3", "1200.000", "1100.000"),
+        BackfillShard("state.backfill.1300.3of3", "1100.000", "1000"),
+    ]
+
+
+def test_get_backfill_shards_disabled() -> None:
+    assert get_backfill_shards("state", "1300.0", shards=1, start_offset="1000") == []
+    # unknown feed start
+    assert get_backfill_shards("state", "1300.0", shards=3, start_offset="") == []
+
+
+def test_get_backfill_shards_no_backward_offset(
+    caplog: pytest.LogCaptureFixture,
+) -> None:
+    caplog.set_level(logging.INFO)
+
+    # nothing to split, it's not a configuration problem
+    assert get_backfill_shards("state", "", shards=3, start_offset="1000") == []
+    assert caplog.records == []
+
+
+def test_select_backfill_shards() -> None:
+    shards = [
+        BackfillShard("state.backfill.1300.1of2", "1300.0", "1200.0"),
+        BackfillShard("state.backfill.1300.2of2", "1200.0", "1000"),
+    ]
+
+    assert select_backfill_shards(shards, "") == shards
+    assert select_backfill_shards(shards, "forward") == []
+    assert select_backfill_shards(shards, "2") == shards[1:]
+    with pytest.raises(ValueError):
+        select_backfill_shards(shards, "3")
@@ -1,3 +1,4 @@
+from typing import Any
 from prozorro_crawler.main import (
     should_run,
 )
@@ -12,11 +13,19 @@ from prozorro_crawler.settings import (
     CONNECTION_ERROR_INTERVAL,
     TOO_MANY_REQUESTS_INTERVAL,
     NO_ITEMS_INTERVAL,
+    ADAPTIVE_POLLING_MIN_INTERVAL,
 )
+from prozorro_crawler.backfill import BackfillShard
+from prozorro_crawler.dedup import DedupCache, dedup_caches
+from prozorro_crawler.handlers import ItemHandler
+from prozorro_crawler.metrics import HANDLER_SECONDS
+from prozorro_crawler.partition import ItemPartition
 from json.decoder import JSONDecodeError
 from .base import AsyncMock
 import aiohttp
+import asyncio
 import json
+import pytest
 
 
 @patch("prozorro_crawler.crawler.get_feed_position")
@@ -56,6 +65,7 @@ async def test_init_crawler_saved_feed(
             "/abc",
             data_handler,
             offset="f",
+            state_id=None,
             opt_fields=opt_fields,
             json_loads=json.loads,
         ),
@@ -65,6 +75,7 @@ async def test_init_crawler_saved_feed(
             "/abc",
             data_handler,
             offset="b",
+            state_id=None,
             descending="1",
             opt_fields=opt_fields,
             json_loads=json.loads,
@@ -106,6 +117,7 @@ async def test_init_crawler_init_feed(
         data_handler,
         opt_fields=opt_fields,
         json_loads=json.loads,
+        state_id=None,
     )
     assert crawler_mock.mock_calls == [
         call(
@@ -114,6 +126,7 @@ async def test_init_crawler_init_feed(
             "/abc",
             data_handler,
             offset="f1",
+            state_id=None,
             opt_fields=opt_fields,
             json_loads=json.loads,
         ),
@@ -123,6 +136,7 @@ async def test_init_crawler_init_feed(
             "/abc",
             data_handler,
             offset="b-2",
+            state_id=None,
             descending="1",
             opt_fields=opt_fields,
             json_loads=json.loads,
@@ -164,6 +178,7 @@ async def test_init_crawler_empty_init_feed_offsets(
         data_handler,
         opt_fields=opt_fields,
         json_loads=json.loads,
+        state_id=None,
     )
     assert crawler_mock.mock_calls == [
         call(
@@ -172,6 +187,7 @@ async def test_init_crawler_empty_init_feed_offsets(
             "/abc",
             data_handler,
             offset="",
+            state_id=None,
             opt_fields=opt_fields,
             json_loads=json.loads,
         ),
@@ -181,6 +197,7 @@ async def test_init_crawler_empty_init_feed_offsets(
             "/abc",
             data_handler,
             offset="",
+            state_id=None,
             descending="1",
             opt_fields=opt_fields,
             json_loads=json.loads,
@@ -226,6 +243,32 @@ async def test_init_feed(sleep_mock: MagicMock) -> None:
     data_handler.assert_called_once_with(session, ["w", "t", "f"])
 
 
+@patch("prozorro_crawler.crawler.ITEM_PARTITION", "1/2")
+async def test_init_feed_partition() -> None:
+    data_handler = AsyncMock()
+    session = MagicMock()
+    items = [{"id": str(n), "dateModified": "d1"} for n in range(10)]
+    session.get = AsyncMock(
+        return_value=MagicMock(
+            status=200,
+            json=AsyncMock(
+                return_value={
+                    "next_page": {"offset": 1},
+                    "prev_page": {"offset": 2},
+                    "data": items,
+                },
+            ),
+        ),
+    )
+
+    await init_feed(should_run, session, "/abc", data_handler, json_loads=json.loads)
+
+    partition = ItemPartition(1, 2)
+    data_handler.assert_called_once_with(
+        session, [item for item in items if partition.contains(item["id"])]
+    )
+
+
 @patch("prozorro_crawler.main.asyncio.sleep")
 async def test_init_feed_empty_data(sleep_mock: MagicMock) -> None:
     data_handler = AsyncMock()
@@ -295,6 +338,39 @@ async def test_init_feed_payload_error(sleep_mock: MagicMock) -> None:
     data_handler.assert_not_called()
 
 
+@patch("prozorro_crawler.main.asyncio.sleep")
+async def test_init_feed_timeout(sleep_mock: MagicMock) -> None:
+    data_handler = AsyncMock()
+    session = MagicMock()
+    session.get = AsyncMock(
+        side_effect=[
+            asyncio.TimeoutError(),
+            MagicMock(
+                status=200,
+                json=AsyncMock(side_effect=asyncio.TimeoutError()),
+            ),
+            StopAsyncIteration,
+        ],
+    )
+
+    try:
+        await init_feed(
+            should_run,
+            session,
+            "/abc",
+            data_handler,
+            json_loads=json.loads,
+        )
+    except StopAsyncIteration:
+        pass
+
+    assert sleep_mock.mock_calls == [
+        call(CONNECTION_ERROR_INTERVAL),
+        call(CONNECTION_ERROR_INTERVAL),
+    ]
+    data_handler.assert_not_called()
+
+
 @patch("prozorro_crawler.crawler.API_LIMIT", 3)
 @patch("prozorro_crawler.crawler.save_feed_position")
 @patch("prozorro_crawler.main.asyncio.sleep")
@@ -337,6 +413,7 @@ async def test_crawler(
     ]
     save_feed_position_mock.assert_called_once_with(
         {"latest_date_modified": "f", "forward_offset": 2},
+        state_id=None,
     )
     data_handler.assert_called_once_with(session, items)
 
@@ -388,6 +465,7 @@ async def test_crawler_few_items(
     ]
     save_feed_position_mock.assert_called_once_with(
         {"earliest_date_modified": "f", "backward_offset": 1},
+        state_id=None,
     )
     data_handler.assert_called_once_with(session, items)
 
@@ -445,3 +523,351 @@ async def test_crawler_payload_error(sleep_mock: MagicMock) -> None:
         call(CONNECTION_ERROR_INTERVAL),
     ]
     data_handler.assert_not_called()
+
+
+@patch("prozorro_crawler.crawler.FEED_PREFETCH_DEPTH", 2)
+@patch("prozorro_crawler.crawler.API_LIMIT", 1)
+@patch("prozorro_crawler.crawler.save_feed_position")
+@patch("prozorro_crawler.main.asyncio.sleep", new_callable=AsyncMock)
+async def test_crawler_prefetch(
+    sleep_mock: MagicMock,
+    save_feed_position_mock: MagicMock,
+) -> None:
+    session = MagicMock()
+    pages = [
+        {
+            "next_page": {"offset": n + 1},
+            "data": [{"dateModified": f"d{n}"}],
+        }
+        for n in range(3)
+    ]
+    session.get = AsyncMock(
+        side_effect=[
+            *(MagicMock(status=200, json=AsyncMock(return_value=p)) for p in pages),
+            MagicMock(status=404, text=AsyncMock(return_value="Not found")),
+        ],
+    )
+    requests_on_handle = []
+
+    async def data_handler(
+        _: aiohttp.ClientSession,
+        items: list[dict[str, Any]],
+    ) -> None:
+        requests_on_handle.append(session.get.call_count)
+
+    storage = MagicMock()
+    storage.attach_mock(save_feed_position_mock, "save_feed_position")
+    with patch("prozorro_crawler.crawler.drop_feed_position") as drop_mock:
+        storage.attach_mock(drop_mock, "drop_feed_position")
+        await crawler(
+            should_run,
+            session,
+            "/abc",
+            data_handler,
+            descending="1",
+            json_loads=json.loads,
+        )
+
+    # next pages are requested before previous pages are processed
+    assert requests_on_handle[0] > 1
+    # but feed position is saved in page order after every page is processed
+    # and invalid offset is dropped only after that
+    assert storage.mock_calls == [
+        *(
+            call.save_feed_position(
+                {"earliest_date_modified": f"d{n}", "backward_offset": n + 1},
+                state_id=None,
+            )
+            for n in range(3)
+        ),
+        call.drop_feed_position(None),
+    ]
+
+
+@patch("prozorro_crawler.crawler.API_LIMIT", 1)
+@patch("prozorro_crawler.crawler.save_feed_position")
+@patch("prozorro_crawler.main.asyncio.sleep", new_callable=AsyncMock)
+async def test_crawler_item_handler(
+    sleep_mock: MagicMock,
+    save_feed_position_mock: MagicMock,
+) -> None:
+    session = MagicMock()
+    pages = [
+        {
+            "next_page": {"offset": n + 1},
+            "data": [{"id": f"i{n}", "dateModified": f"d{n}"}],
+        }
+        for n in range(3)
+    ]
+    session.get = AsyncMock(
+        side_effect=[
+            *(MagicMock(status=200, json=AsyncMock(return_value=p)) for p in pages),
+            MagicMock(status=200, json=AsyncMock(return_value={"data": []})),
+        ],
+    )
+    first_item_done = asyncio.Event()
+    processed = []
+    handled_pages = sum(sum(c) for c in HANDLER_SECONDS.counts.values())
+
+    async def process_item(_: aiohttp.ClientSession, item: dict[str, Any]) -> None:
+        if item["id"] == "i0":
+            # the first item waits for the others
+            await first_item_done.wait()
+        processed.append(item["id"])
+        if item["id"] == "i2":
+            first_item_done.set()
+
+    await crawler(
+        should_run,
+        session,
+        "/abc",
+        ItemHandler(process_item, concurrency=3),
+        descending="1",
+        json_loads=json.loads,
+    )
+
+    assert processed == ["i1", "i2", "i0"]
+    # dispatched pages are timed until they are processed
+    assert sum(sum(c) for c in HANDLER_SECONDS.counts.values()) == handled_pages + 3
+    # no position saved before the first page is processed
+    save_feed_position_mock.assert_called_once_with(
+        {"earliest_date_modified": "d2", "backward_offset": 3},
+        state_id=None,
+    )
+
+
+@patch.dict("prozorro_crawler.dedup.dedup_caches", {"/abc": DedupCache(size=10)})
+@patch("prozorro_crawler.crawler.DEDUP_CACHE_SIZE", 10)
+@patch("prozorro_crawler.crawler.API_LIMIT", 2)
+@patch("prozorro_crawler.crawler.save_feed_position")
+@patch("prozorro_crawler.main.asyncio.sleep")
+async def test_crawler_dedup(
+    sleep_mock: MagicMock,
+    save_feed_position_mock: MagicMock,
+) -> None:
+    session = MagicMock()
+    pages = [
+        [{"id": "a", "dateModified": "d1"}, {"id": "b", "dateModified": "d2"}],
+        [{"id": "a", "dateModified": "d1"}, {"id": "b", "dateModified": "d2"}],
+        [{"id": "a", "dateModified": "d3"}, {"id": "b", "dateModified": "d2"}],
+    ]
+    session.get = AsyncMock(
+        side_effect=[
+            *(
+                MagicMock(
+                    status=200,
+                    json=AsyncMock(
+                        return_value={"next_page": {"offset": n}, "data": data},
+                    ),
+                )
+                for n, data in enumerate(pages)
+            ),
+            StopAsyncIteration,
+        ],
+    )
+    data_handler = AsyncMock()
+
+    try:
+        await crawler(should_run, session, "/abc", data_handler, json_loads=json.loads)
+    except StopAsyncIteration:
+        pass
+
+    # the duplicates page is not passed to the handler but its position is saved
+    assert data_handler.mock_calls == [
+        call(session, pages[0]),
+        call(session, [{"id": "a", "dateModified": "d3"}]),
+    ]
+    assert save_feed_position_mock.call_count == 3
+
+
+@patch.dict("prozorro_crawler.dedup.dedup_caches", {"/abc": DedupCache(size=10)})
+@patch("prozorro_crawler.crawler.DEDUP_CACHE_SIZE", 10)
+@patch("prozorro_crawler.crawler.save_feed_position")
+@patch("prozorro_crawler.main.asyncio.sleep")
+async def test_crawler_dedup_failed_page(
+    sleep_mock: MagicMock,
+    save_feed_position_mock: MagicMock,
+) -> None:
+    session = MagicMock()
+    session.get = AsyncMock(
+        return_value=MagicMock(
+            status=200,
+            json=AsyncMock(
+                return_value={
+                    "next_page": {"offset": 1},
+                    "data": [{"id": "a", "dateModified": "d1"}],
+                },
+            ),
+        ),
+    )
+    data_handler = AsyncMock(side_effect=ValueError("Oops"))
+
+    with pytest.raises(ValueError):
+        await crawler(should_run, session, "/abc", data_handler, json_loads=json.loads)
+
+    # the page isn't saved, so its items are handled again after a restart
+    save_feed_position_mock.assert_not_called()
+    assert dedup_caches["/abc"].entries == {}
+
+
+@patch("prozorro_crawler.crawler.ADAPTIVE_POLLING", True)
+@patch("prozorro_crawler.crawler.save_feed_position")
+@patch("prozorro_crawler.main.asyncio.sleep")
+async def test_crawler_adaptive_polling(
+    sleep_mock: MagicMock,
+    save_feed_position_mock: MagicMock,
+) -> None:
+    session = MagicMock()
+    session.get = AsyncMock(
+        side_effect=[
+            MagicMock(
+                status=200,
+                json=AsyncMock(
+                    return_value={
+                        "next_page": {"offset": "1000.0.1.abc"},
+                        "data": [{"dateModified": "d"}],
+                    },
+                ),
+            ),
+            StopAsyncIteration,
+        ],
+    )
+
+    try:
+        await crawler(should_run, session, "/abc", AsyncMock(), json_loads=json.loads)
+    except StopAsyncIteration:
+        pass
+
+    assert sleep_mock.mock_calls == [
+        call(ADAPTIVE_POLLING_MIN_INTERVAL),
+        call(FEED_STEP_INTERVAL),
+    ]
+
+
+@patch("prozorro_crawler.crawler.BACKFILL_SHARD", "2")
+@patch("prozorro_crawler.crawler.asyncio.sleep")
+@patch("prozorro_crawler.crawler.get_feed_position")
+@patch("prozorro_crawler.crawler.save_feed_position")
+@patch("prozorro_crawler.crawler.get_backfill_shards")
+@patch("prozorro_crawler.crawler.crawler")
+async def test_init_crawler_backfill_shard_process(
+    crawler_mock: MagicMock,
+    get_backfill_shards_mock: MagicMock,
+    save_feed_position_mock: MagicMock,
+    get_feed_position_mock: MagicMock,
+    sleep_mock: MagicMock,
+) -> None:
+    session = MagicMock()
+    data_handler = AsyncMock()
+    get_backfill_shards_mock.return_value = [
+        BackfillShard("s.1of2", "1300.0", "1200.0"),
+        BackfillShard("s.2of2", "1200.0", "1100.0"),
+    ]
+    get_feed_position_mock.side_effect = [
+        # the forward crawler process hasn't saved the backward offset yet
+        None,
+        {"backward_offset": "1300.0", "forward_offset": "f"},
+        None,
+    ]
+
+    await init_crawler(
+        should_run,
+        session,
+        "/abc",
+        data_handler,
+        json_loads=json.loads,
+        state_id="s",
+    )
+
+    sleep_mock.assert_called_once()
+    get_backfill_shards_mock.assert_called_once_with("s", "1300.0")
+    # only the second shard, no forward crawler
+    assert crawler_mock.mock_calls == [
+        call(
+            should_run,
+            session,
+            "/abc",
+            data_handler,
+            json_loads=json.loads,
+            offset="1200.0",
+            descending="1",
+            state_id="s.2of2",
+            stop_offset="1100.0",
+        ),
+    ]
+
+
+@patch("prozorro_crawler.crawler.get_feed_position")
+@patch("prozorro_crawler.crawler.save_feed_position")
+@patch("prozorro_crawler.crawler.get_backfill_shards")
+@patch("prozorro_crawler.crawler.crawler")
+async def test_init_crawler_backfill_shards(
+    crawler_mock: MagicMock,
+    get_backfill_shards_mock: MagicMock,
+    save_feed_position_mock: MagicMock,
+    get_feed_position_mock: MagicMock,
+) -> None:
+    session = MagicMock()
+    data_handler = AsyncMock()
+    get_backfill_shards_mock.return_value = [
+        BackfillShard("s.1of2", "1300.0", "1200.0"),
+        BackfillShard("s.2of2", "1200.0", "1100.0"),
+    ]
+    get_feed_position_mock.side_effect = [
+        {"backward_offset": "1300.0", "forward_offset": "f"},
+        # first shard is resumed, the second one is new
+        {"backward_offset": "1250.0"},
+        None,
+        StopAsyncIteration,
+    ]
+
+    try:
+        await init_crawler(
+            should_run,
+            session,
+            "/abc",
+            data_handler,
+            json_loads=json.loads,
+            state_id="s",
+        )
+    except StopAsyncIteration:
+        pass
+
+    get_backfill_shards_mock.assert_called_once_with("s", "1300.0")
+    save_feed_position_mock.assert_called_once_with(
+        {"backward_offset": "1300.0"},
+        state_id="s",
+    )
+    assert crawler_mock.mock_calls == [
+        call(
+            should_run,
+            session,
+            "/abc",
+            data_handler,
+            json_loads=json.loads,
+            offset="f",
+            state_id="s",
+        ),
+        call(
+            should_run,
+            session,
+            "/abc",
+            data_handler,
+            json_loads=json.loads,
+            offset="1250.0",
+            descending="1",
+            state_id="s.1of2",
+            stop_offset="1200.0",
+        ),
+        call(
+            should_run,
+            session,
+            "/abc",
+            data_handler,
+            json_loads=json.loads,
+            offset="1200.0",
+            descending="1",
+            state_id="s.2of2",
+            stop_offset="1100.0",
+        ),
+    ]
@@ -0,0 +1,63 @@
+from prozorro_crawler.decoding import (
+    accepts_bytes,
+    get_json_loads,
+    read_json,
+)
+from prozorro_crawler.resource import get_response_data
+from typing import Any
+from unittest.mock import MagicMock, patch
+from .base import AsyncMock
+import json
+import pytest
+
+
+def test_get_json_loads() -> None:
+    orjson = pytest.importorskip("orjson")
+
+    assert get_json_loads("auto") is orjson.loads
+    assert get_json_loads("orjson") is orjson.loads
+    assert get_json_loads("json") is json.loads
+    assert accepts_bytes(orjson.loads)
+    assert not accepts_bytes(json.loads)
+
+
+@patch("prozorro_crawler.decoding.msgspec", None)
+def test_get_json_loads_not_installed() -> None:
+    assert get_json_loads("msgspec") is json.loads
+
+
+async def test_read_json() -> None:
+    body = b'{"data": {"title": "\xd1\x82\xd0\xb5\xd0\xbd\xd0\xb4\xd0\xb5\xd1\x80"}}'
+    resp = MagicMock(read=AsyncMock(return_value=body), json=AsyncMock())
+
+    def bytes_loads(raw: Any) -> Any:
+        assert raw is body
+        return json.loads(raw)
+
+    bytes_loads.accepts_bytes = True  # type: ignore[attr-defined]
+
+    assert await read_json(resp, bytes_loads) == {"data": {"title": "тендер"}}
+    resp.json.assert_not_called()
+
+    await read_json(resp, json.loads)
+    resp.json.assert_called_once_with(loads=json.loads)
+
+
+async def test_get_response_data_default_json_loads() -> None:
+    orjson = pytest.importorskip("orjson")
+    session = MagicMock()
+    session.get = AsyncMock(
+        side_effect=[
+            MagicMock(status=200, read=AsyncMock(return_value=b'{"data": [')),
+            MagicMock(status=200, read=AsyncMock(return_value=b'{"data": [1]}')),
+        ],
+    )
+
+    with (
+        patch("prozorro_crawler.decoding._default_json_loads", orjson.loads),
+        patch("prozorro_crawler.resource.asyncio.sleep", AsyncMock()) as sleep_mock,
+    ):
+        result = await get_response_data(session, "/abc")
+
+    assert result == [1]
+    sleep_mock.assert_called_once()
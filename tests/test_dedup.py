@@ -0,0 +1,72 @@
+from prozorro_crawler.dedup import DedupCache
+from prozorro_crawler.metrics import DEDUP_ITEMS
+from unittest.mock import MagicMock, patch
+
+
+def item(object_id: str, date_modified: str) -> dict[str, str]:
+    return {"id": object_id, "dateModified": date_modified}
+
+
+def test_dedup_cache_versions() -> None:
+    cache = DedupCache(size=10, ttl=0)
+    labels = {"feed": "/dedup", "direction": "forward"}
+    cache.add([item("b", "2024-01-01T10:00:00+02:00")])
+
+    result = cache.filter(
+        [
+            item("a", "2024-01-01T10:00:00+02:00"),
+            # same version
+            item("a", "2024-01-01T10:00:00+02:00"),
+            item("b", "2024-01-01T10:00:00+02:00"),
+            # same time in another timezone, older
+            item("b", "2024-01-01T08:00:00+00:00"),
+            item("b", "2024-01-01T07:59:00+00:00"),
+            # newer
+            item("a", "2024-01-01T09:00:01+01:00"),
+            item("b", "2024-01-01T08:00:01+00:00"),
+        ],
+        labels,
+    )
+
+    assert result == [
+        item("a", "2024-01-01T10:00:00+02:00"),
+        item("a", "2024-01-01T09:00:01+01:00"),
+        item("b", "2024-01-01T08:00:01+00:00"),
+    ]
+    assert DEDUP_ITEMS.get(result="hit", **labels) == 4
+    assert DEDUP_ITEMS.get(result="miss", **labels) == 3
+    # filtered items are cached only when they are added
+    assert list(cache.entries) == ["b"]
+
+    cache.add(result)
+    assert cache.get("a") == "2024-01-01T09:00:01+01:00"
+    assert cache.get("b") == "2024-01-01T08:00:01+00:00"
+    # an older version doesn't replace the cached one
+    cache.add([item("a", "2024-01-01T10:00:00+02:00")])
+    assert cache.get("a") == "2024-01-01T09:00:01+01:00"
+
+
+@patch("prozorro_crawler.dedup.monotonic")
+def test_dedup_cache_ttl(monotonic_mock: MagicMock) -> None:
+    cache = DedupCache(size=10, ttl=100)
+    monotonic_mock.return_value = 0
+    cache.add([item("a", "2024-01-01T10:00:00")])
+
+    monotonic_mock.return_value = 50
+    assert cache.is_duplicate(item("a", "2024-01-01T10:00:00"))
+    assert not cache.is_duplicate(item("a", "2024-01-01T10:00:01"))
+
+    # the same version is handled again when the cache entry expires
+    monotonic_mock.return_value = 101
+    assert not cache.is_duplicate(item("a", "2024-01-01T10:00:00"))
+
+
+def test_dedup_cache_size() -> None:
+    cache = DedupCache(size=2, ttl=0)
+
+    for object_id in ("a", "b", "a", "c"):
+        cache.is_duplicate(item(object_id, "2024-01-01T10:00:00"))
+        cache.add([item(object_id, "2024-01-01T10:00:00")])
+
+    # least recently seen is evicted
+    assert list(cache.entries) == ["a", "c"]
@@ -0,0 +1,155 @@
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any
+from unittest.mock import MagicMock, patch
+from prozorro_crawler.handlers import (
+    ItemHandler,
+    OrderedCheckpoints,
+    ProcessPoolHandler,
+)
+from prozorro_crawler.items import get_item_class
+import aiohttp
+import asyncio
+import pytest
+
+
+async def test_item_handler_concurrency() -> None:
+    running = []
+    max_running = 0
+
+    async def process_item(_: aiohttp.ClientSession, item: dict[str, Any]) -> None:
+        nonlocal max_running
+        running.append(item["id"])
+        max_running = max(max_running, len(running))
+        await asyncio.sleep(0.01)
+        running.remove(item["id"])
+
+    handler = ItemHandler(process_item, concurrency=3)
+
+    await handler(MagicMock(), [{"id": n} for n in range(10)])
+
+    assert max_running == 3
+    assert running == []
+
+
+async def test_ordered_checkpoints() -> None:
+    first: asyncio.Future[None] = asyncio.Future()
+    second: asyncio.Future[None] = asyncio.Future()
+    checkpoints = OrderedCheckpoints()
+    checkpoints.add(first, {"forward_offset": "1"}, [{"id": "a"}])
+    checkpoints.add(second, {"forward_offset": "2"}, [{"id": "b"}])
+
+    second.set_result(None)
+    # the second page is done, but the first one is not
+    assert checkpoints.pop_done() is None
+    assert checkpoints.pop_done_items() == []
+
+    first.set_result(None)
+    assert checkpoints.pop_done() == {"forward_offset": "2"}
+    assert checkpoints.pop_done() is None
+    assert checkpoints.pop_done_items() == [{"id": "a"}, {"id": "b"}]
+    assert checkpoints.pop_done_items() == []
+
+
+async def test_ordered_checkpoints_error() -> None:
+    failed: asyncio.Future[None] = asyncio.Future()
+    failed.set_exception(ValueError("Oops"))
+    checkpoints = OrderedCheckpoints()
+    checkpoints.add(failed, {"forward_offset": "1"})
+
+    with pytest.raises(ValueError):
+        await checkpoints.wait_all()
+
+
+def count_statuses(items: list[dict[str, Any]]) -> dict[str, int]:
+    counts: dict[str, int] = {}
+    for item in items:
+        counts[item["status"]] = counts.get(item["status"], 0) + 1
+    return counts
+
+
+async def test_process_pool_handler() -> None:
+    session = MagicMock()
+    results = []
+
+    async def on_result(_: aiohttp.ClientSession, result: dict[str, int]) -> None:
+        results.append(result)
+
+    handler = ProcessPoolHandler(
+        count_statuses,
+        on_result,
+        workers=1,
+        batch_size=2,
+    )
+    item_class = get_item_class("status")
+    items: list[Any] = [
+        item_class.from_dict({"id": "a", "dateModified": "d", "status": "active"}),
+        item_class.from_dict({"id": "b", "dateModified": "d", "status": "active"}),
+        item_class.from_dict({"id": "c", "dateModified": "d", "status": "complete"}),
+    ]
+    try:
+        await handler(session, items)
+        # worker errors are raised in the crawler
+        with pytest.raises(KeyError):
+            await handler(session, [{"id": "d"}])
+    finally:
+        handler.close()
+
+    assert results == [{"active": 2}, {"complete": 1}]
+
+
+async def test_process_pool_handler_backpressure() -> None:
+    handler = ProcessPoolHandler(count_statuses, workers=1, batch_size=1, max_pending=2)
+    executor = MagicMock()
+    handler.executor = executor
+    loop = asyncio.get_running_loop()
+    batches: list[asyncio.Future[None]] = []
+
+    def run_in_executor(*args: Any) -> asyncio.Future[None]:
+        batches.append(loop.create_future())
+        return batches[-1]
+
+    with patch.object(loop, "run_in_executor", run_in_executor):
+        dispatch = asyncio.create_task(
+            handler.dispatch(MagicMock(), [{"id": n} for n in range(3)]),
+        )
+        await asyncio.sleep(0.01)
+        # the third batch waits for a free slot
+        assert len(batches) == 2
+        assert not dispatch.done()
+
+        batches[0].set_result(None)
+        processing = await dispatch
+        for batch in batches[1:]:
+            batch.set_result(None)
+        await processing
+
+    assert len(batches) == 3
+
+
+async def test_process_pool_handler_broken() -> None:
+    handler = ProcessPoolHandler(count_statuses, workers=1, batch_size=1)
+    old_executor, new_executor = MagicMock(), MagicMock()
+    handler.executor = old_executor
+    loop = asyncio.get_running_loop()
+    batches: list[asyncio.Future[None]] = []
+
+    def run_in_executor(*args: Any) -> asyncio.Future[None]:
+        batches.append(loop.create_future())
+        return batches[-1]
+
+    with patch.object(loop, "run_in_executor", run_in_executor):
+        processing = await handler.dispatch(MagicMock(), [{"id": 1}, {"id": 2}])
+        await asyncio.sleep(0)
+        # the first failure replaces the pool
+        batches[0].set_exception(BrokenProcessPool())
+        await asyncio.sleep(0)
+        assert handler.executor is None
+        handler.executor = new_executor
+        # a late failure of the old pool doesn't shut down the new one
+        batches[1].set_exception(BrokenProcessPool())
+        with pytest.raises(BrokenProcessPool):
+            await processing
+
+    assert handler.executor is new_executor
+    new_executor.shutdown.assert_not_called()
+    old_executor.shutdown.assert_called_with(wait=False, cancel_futures=True)
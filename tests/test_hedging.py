@@ -0,0 +1,148 @@
+from prozorro_crawler.hedging import Hedger
+from prozorro_crawler.metrics import HEDGED_REQUESTS
+from prozorro_crawler.ratelimit import RateLimiter
+from prozorro_crawler.resource import get_response_data
+from unittest.mock import MagicMock, patch
+from .base import AsyncMock
+import aiohttp
+import asyncio
+import pytest
+
+
+def make_hedger(budget: float = 1) -> Hedger:
+    hedger = Hedger("test", min_samples=10, min_delay=0, budget=budget, burst=1)
+    hedger.latencies.extend([0.01] * 100)
+    return hedger
+
+
+def make_send(
+    *delays: float, statuses: tuple[int, ...] = ()
+) -> tuple[MagicMock, list[MagicMock]]:
+    statuses = statuses or (200,) * len(delays)
+    responses = [
+        MagicMock(status=status, name=f"resp{n}") for n, status in enumerate(statuses)
+    ]
+    calls = iter(zip(delays, responses, strict=True))
+
+    async def send() -> MagicMock:
+        delay, resp = next(calls)
+        await asyncio.sleep(delay)
+        return resp
+
+    return MagicMock(side_effect=send), responses
+
+
+def test_hedger_delay() -> None:
+    hedger = Hedger("test", percentile=90, min_samples=10, min_delay=0.05)
+    assert hedger.get_delay() is None
+    hedger.latencies.extend([0.01 * n for n in range(1, 21)])
+    assert hedger.get_delay() == 0.19
+    hedger.latencies.clear()
+    hedger.latencies.extend([0.01] * 10)
+    assert hedger.get_delay() == 0.05
+
+
+async def test_hedger_fast_request() -> None:
+    hedger = make_hedger()
+    send, responses = make_send(0, 0)
+
+    assert await hedger.request(send) is responses[0]
+    assert send.call_count == 1
+
+
+async def test_hedger_duplicate_wins() -> None:
+    hedger = make_hedger()
+    send, responses = make_send(1, 0)
+    won = HEDGED_REQUESTS.get(source="test", result="won")
+
+    assert await hedger.request(send) is responses[1]
+    assert send.call_count == 2
+    assert HEDGED_REQUESTS.get(source="test", result="won") == won + 1
+
+
+async def test_hedger_error_response_loses() -> None:
+    hedger = make_hedger()
+    send, responses = make_send(0.05, 0, statuses=(200, 503))
+
+    assert await hedger.request(send) is responses[0]
+    assert send.call_count == 2
+    responses[1].release.assert_called_once()
+
+
+async def test_hedger_all_error_responses() -> None:
+    hedger = make_hedger()
+    limiter = RateLimiter(rate=100, burst=10)
+    send, responses = make_send(0.05, 0, statuses=(503, 429))
+
+    assert await hedger.request(send, limiter) is responses[0]
+    assert send.call_count == 2
+    responses[0].release.assert_not_called()
+    # the duplicate 429 pauses the limiter
+    responses[1].release.assert_called_once()
+    assert not limiter.try_acquire()
+
+
+async def test_hedger_rate_limit() -> None:
+    hedger = make_hedger()
+    limiter = RateLimiter(rate=0.01, burst=1)
+    send, responses = make_send(0.1, 0, 0.05)
+
+    # the duplicate takes the limiter token
+    assert await hedger.request(send, limiter) is responses[1]
+    assert send.call_count == 2
+    # no token left, the duplicate isn't sent
+    assert await hedger.request(send, limiter) is responses[2]
+    assert send.call_count == 3
+    assert hedger.tokens == 1
+
+
+async def test_hedger_first_error() -> None:
+    hedger = make_hedger()
+    resp = MagicMock(status=200)
+    send = AsyncMock(side_effect=[aiohttp.ClientConnectionError(), resp])
+
+    async def slow_error() -> MagicMock:
+        await asyncio.sleep(0.05)
+        resp: MagicMock = await send()
+        return resp
+
+    assert await hedger.request(slow_error) is resp
+
+
+async def test_hedger_all_errors() -> None:
+    hedger = make_hedger()
+
+    async def send() -> MagicMock:
+        await asyncio.sleep(0.05)
+        raise asyncio.TimeoutError()
+
+    with pytest.raises(asyncio.TimeoutError):
+        await hedger.request(send)
+
+
+async def test_hedger_budget() -> None:
+    hedger = make_hedger(budget=0.5)
+    send, responses = make_send(0.05, 0.05, 0)
+
+    # the first slow request only earns half a token
+    assert await hedger.request(send) is responses[0]
+    assert send.call_count == 1
+    assert await hedger.request(send) is responses[2]
+    assert send.call_count == 3
+
+
+@patch("prozorro_crawler.resource.get_hedger")
+async def test_get_response_data_hedged(get_hedger_mock: MagicMock) -> None:
+    get_hedger_mock.return_value = make_hedger()
+    session = MagicMock()
+    fast = MagicMock(status=200, json=AsyncMock(return_value={"data": "fast"}))
+
+    async def get(url: str) -> MagicMock:
+        if session.get.call_count == 1:
+            await asyncio.sleep(1)
+        return fast
+
+    session.get = MagicMock(side_effect=get)
+
+    assert await get_response_data(session, "/objects/1") == "fast"
+    assert session.get.call_count == 2
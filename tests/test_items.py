@@ -0,0 +1,120 @@
+from prozorro_crawler.crawler import get_feed_page
+from prozorro_crawler.items import FeedItem, InvalidFeedItem, get_item_class
+from prozorro_crawler.settings import FEED_STEP_INTERVAL
+from prozorro_crawler.simulator import FeedSimulator
+from unittest.mock import MagicMock, call, patch
+from .base import AsyncMock
+import aiohttp
+import json
+import pickle
+import pytest
+
+
+def test_feed_item() -> None:
+    item_class = get_item_class("status,procurementMethodType")
+    data = {"id": "1", "dateModified": "2024-01-01", "status": "active"}
+
+    item = item_class.from_dict(data)
+
+    assert item.fields == ("id", "dateModified", "status", "procurementMethodType")
+    assert item.status == "active"  # type: ignore[attr-defined]
+    assert not hasattr(item, "procurementMethodType")
+    assert item["id"] == "1"
+    assert item.get("procurementMethodType") is None
+    assert item.get("x", 2) == 2
+    assert "status" in item and "procurementMethodType" not in item
+    assert dict(item) == {"id": "1", "dateModified": "2024-01-01", "status": "active"}
+    assert item == {"id": "1", "dateModified": "2024-01-01", "status": "active"}
+    assert len(item) == 3
+    with pytest.raises(KeyError):
+        item["procurementMethodType"]
+    with pytest.raises(KeyError):
+        item["x"]
+    with pytest.raises(KeyError):
+        item["keys"]
+    with pytest.raises(AttributeError):
+        item.x = 1  # type: ignore[attr-defined]
+    with pytest.raises(TypeError):
+        hash(item)
+    assert get_item_class("status,procurementMethodType") is item_class
+
+
+def test_feed_item_invalid() -> None:
+    item_class = get_item_class("status")
+
+    with pytest.raises(InvalidFeedItem):
+        item_class.from_dict({"id": "1", "dateModified": "d", "x": 1})
+    with pytest.raises(InvalidFeedItem):
+        item_class.from_dict({"id": "1", "status": "active"})
+    with pytest.raises(InvalidFeedItem):
+        item_class.from_dict({"dateModified": "d"})
+
+
+def test_feed_item_field_names() -> None:
+    # fields can't replace the methods
+    with pytest.raises(ValueError):
+        get_item_class("status,items")
+    with pytest.raises(ValueError):
+        get_item_class("value.amount")
+
+
+def test_feed_item_pickle() -> None:
+    item_class = get_item_class("status,value")
+    item = item_class.from_dict({"id": "1", "dateModified": "d", "status": None})
+
+    loaded = pickle.loads(pickle.dumps(item))
+
+    assert type(loaded) is item_class
+    assert loaded == item
+    assert "value" not in loaded
+
+
+@patch("prozorro_crawler.crawler.FEED_TYPED_ITEMS", True)
+async def test_get_feed_page_typed_items() -> None:
+    simulator = FeedSimulator(objects=5, seed=1)
+    runner = await simulator.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            response = await get_feed_page(
+                lambda: True,
+                session,
+                simulator.get_url(runner),
+                {"limit": 10, "opt_fields": "status"},
+                json.loads,
+            )
+    finally:
+        await runner.cleanup()
+
+    assert response is not None
+    assert all(isinstance(item, FeedItem) for item in response["data"])
+    assert response["data"] == simulator.get_page("", 10, False, ["status"])["data"]
+
+
+@patch("prozorro_crawler.crawler.FEED_TYPED_ITEMS", True)
+@patch("prozorro_crawler.main.asyncio.sleep", new_callable=AsyncMock)
+async def test_get_feed_page_invalid_items(sleep_mock: MagicMock) -> None:
+    item = {"id": "1", "dateModified": "d", "status": "active"}
+    session = MagicMock()
+    session.get = AsyncMock(
+        side_effect=[
+            MagicMock(
+                status=200,
+                json=AsyncMock(return_value={"data": [{**item, "value": 1}]}),
+            ),
+            MagicMock(status=200, json=AsyncMock(return_value={"data": [item]})),
+        ],
+    )
+
+    response = await get_feed_page(
+        lambda: True,
+        session,
+        "/abc",
+        {"limit": 10, "opt_fields": "status"},
+        json.loads,
+    )
+
+    # the page with an undeclared field is retried
+    assert response is not None
+    assert response["data"] == [item]
+    assert session.get.call_count == 2
+    assert sleep_mock.mock_calls == [call(FEED_STEP_INTERVAL)]
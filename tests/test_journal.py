@@ -0,0 +1,284 @@
+from pathlib import Path
+from prozorro_crawler.crawler import crawler, init_feed
+from prozorro_crawler.items import get_item_class
+from prozorro_crawler.journal import (
+    Journal,
+    JournalPage,
+    get_journal,
+    get_last_seen_offset,
+    get_offset_before,
+    read_pages,
+    read_segment,
+    replay_journal,
+)
+from prozorro_crawler.journal_index import IdIndex
+from prozorro_crawler.main import should_run
+from prozorro_crawler.partition import ItemPartition
+from unittest.mock import MagicMock, call, patch
+from .base import AsyncMock
+import gzip
+import json
+
+
+def make_page(n: int) -> list[dict[str, str]]:
+    return [{"id": f"i{n}", "dateModified": f"d{n}"}]
+
+
+async def test_journal_append(tmp_path: Path) -> None:
+    journal = Journal(str(tmp_path), segment_size=1)
+
+    await journal.append("1700000000.001.1.abc", make_page(1))
+    await journal.append("1700000005.002.2.def", make_page(2))
+
+    segments = journal.get_segments()
+    assert [Path(s).name for s in segments] == [
+        "1700000000.000000.jsonl.gz",
+        "1700000005.000000.jsonl.gz",
+    ]
+    pages = [page for segment in segments for page in read_segment(segment)]
+    assert [(p.offset, p.timestamp, p.data) for p in pages] == [
+        ("1700000000.001.1.abc", 1700000000, make_page(1)),
+        ("1700000005.002.2.def", 1700000005, make_page(2)),
+    ]
+
+
+async def test_journal_segment(tmp_path: Path) -> None:
+    journal = Journal(str(tmp_path), descending=True)
+    item_class = get_item_class("status")
+
+    await journal.append("1700000005.1", make_page(1))
+    await journal.append(
+        "1700000000.2",
+        [item_class.from_dict({"id": "i2", "dateModified": "d2", "status": "a"})],
+    )
+
+    (segment,) = journal.get_segments()
+    # a valid .jsonl.gz file
+    with gzip.open(segment) as f:
+        lines = [json.loads(line) for line in f]
+    assert [line["data"] for line in lines] == [
+        make_page(1),
+        [{"id": "i2", "dateModified": "d2", "status": "a"}],
+    ]
+
+
+def test_journal_incomplete_page(tmp_path: Path) -> None:
+    journal = Journal(str(tmp_path))
+    journal.write(JournalPage("1700000000.1", 1700000000.1, 0, make_page(1)))
+    journal.write(JournalPage("1700000001.1", 1700000001.1, 0, make_page(2)))
+    (segment,) = journal.get_segments()
+    with open(segment, "r+b") as f:
+        f.truncate(Path(segment).stat().st_size - 10)
+
+    assert [page.data for page in read_segment(segment)] == [make_page(1)]
+
+
+def test_get_journal(tmp_path: Path) -> None:
+    assert get_journal("http://api/tenders", None, "forward") is None
+    with patch("prozorro_crawler.journal.JOURNAL_DIR", str(tmp_path)):
+        journal = get_journal("http://api/tenders", "state", "backward")
+    assert journal is not None
+    assert journal.descending
+    assert journal.directory == str(tmp_path / "tenders" / "state" / "backward")
+
+
+async def test_replay_journal(tmp_path: Path) -> None:
+    with patch("prozorro_crawler.journal.JOURNAL_DIR", str(tmp_path)):
+        forward = get_journal("http://api/tenders", None, "forward")
+        backward = get_journal("http://api/tenders", None, "backward")
+        assert forward is not None and backward is not None
+        await forward.append("1700000010.1", make_page(3))
+        await forward.append("1700000020.1", make_page(4))
+        await backward.append("1700000005.1", make_page(2))
+        await backward.append("1700000001.1", make_page(1))
+
+        session = MagicMock()
+        data_handler = AsyncMock()
+        await replay_journal(should_run, session, "http://api/tenders", data_handler)
+        assert data_handler.mock_calls == [
+            call(session, make_page(2)),
+            call(session, make_page(1)),
+            call(session, make_page(3)),
+            call(session, make_page(4)),
+        ]
+
+        data_handler = AsyncMock()
+        await replay_journal(
+            should_run,
+            session,
+            "http://api/tenders",
+            data_handler,
+            since=1700000005,
+            until=1700000010,
+        )
+        assert data_handler.mock_calls == [
+            call(session, make_page(2)),
+            call(session, make_page(3)),
+        ]
+
+
+@patch("prozorro_crawler.main.asyncio.sleep")
+async def test_init_feed_journal(sleep_mock: MagicMock, tmp_path: Path) -> None:
+    session = MagicMock()
+    session.get = AsyncMock(
+        return_value=MagicMock(
+            status=200,
+            json=AsyncMock(
+                return_value={
+                    "next_page": {"offset": "1700000005.1"},
+                    "prev_page": {"offset": "1700000010.1"},
+                    "data": make_page(5),
+                },
+            ),
+        ),
+    )
+    with patch("prozorro_crawler.journal.JOURNAL_DIR", str(tmp_path)):
+        await init_feed(
+            should_run,
+            session,
+            "http://api/tenders",
+            AsyncMock(),
+            json_loads=json.loads,
+            state_id="s",
+        )
+
+    directory = tmp_path / "tenders" / "s" / "backward"
+    pages = list(read_pages(str(directory), descending=True))
+    assert [(page.offset, page.data) for page in pages] == [
+        ("1700000005.1", make_page(5))
+    ]
+
+
+@patch("prozorro_crawler.journal.ITEM_PARTITION", "0/2")
+async def test_replay_journal_partition(tmp_path: Path) -> None:
+    items = [{"id": str(n), "dateModified": "d1"} for n in range(10)]
+    with patch("prozorro_crawler.journal.JOURNAL_DIR", str(tmp_path)):
+        journal = get_journal("http://api/tenders", None, "forward")
+        assert journal is not None
+        await journal.append("1700000010.1", items)
+
+        session = MagicMock()
+        data_handler = AsyncMock()
+        await replay_journal(should_run, session, "http://api/tenders", data_handler)
+
+    partition = ItemPartition(0, 2)
+    data_handler.assert_called_once_with(
+        session, [item for item in items if partition.contains(item["id"])]
+    )
+
+
+@patch("prozorro_crawler.crawler.API_LIMIT", 1)
+@patch("prozorro_crawler.crawler.save_feed_position")
+@patch("prozorro_crawler.main.asyncio.sleep")
+async def test_crawler_journal(
+    sleep_mock: MagicMock,
+    save_feed_position_mock: MagicMock,
+    tmp_path: Path,
+) -> None:
+    session = MagicMock()
+    session.get = AsyncMock(
+        side_effect=[
+            *(
+                MagicMock(
+                    status=200,
+                    json=AsyncMock(
+                        return_value={
+                            "next_page": {"offset": f"170000000{n}.1"},
+                            "data": make_page(n),
+                        },
+                    ),
+                )
+                for n in range(2)
+            ),
+            StopAsyncIteration,
+        ],
+    )
+
+    with patch("prozorro_crawler.journal.JOURNAL_DIR", str(tmp_path)):
+        try:
+            await crawler(
+                should_run,
+                session,
+                "http://api/tenders",
+                AsyncMock(),
+                json_loads=json.loads,
+            )
+        except StopAsyncIteration:
+            pass
+        journal = get_journal("http://api/tenders", None, "forward")
+
+    assert journal is not None
+    (segment,) = journal.get_segments()
+    assert [page.data for page in read_segment(segment)] == [
+        make_page(0),
+        make_page(1),
+    ]
+
+
+async def test_journal_index_seek(tmp_path: Path) -> None:
+    journal = Journal(str(tmp_path), segment_size=200)
+    for n in range(20):
+        await journal.append(f"{1700000000 + n}.1", make_page(n))
+    assert len(journal.get_segments()) > 2
+
+    pages = read_pages(str(tmp_path), since=1700000013, until=1700000015)
+    assert [page.data for page in pages] == [make_page(n) for n in (13, 14, 15)]
+    assert list(read_pages(str(tmp_path), since=1700000100)) == []
+
+
+async def test_journal_index_seek_backward(tmp_path: Path) -> None:
+    journal = Journal(str(tmp_path), descending=True, segment_size=200)
+    for n in reversed(range(20)):
+        await journal.append(f"{1700000000 + n}.1", make_page(n))
+
+    pages = read_pages(str(tmp_path), True, since=1700000013, until=1700000015)
+    assert [page.data for page in pages] == [make_page(n) for n in (15, 14, 13)]
+
+
+async def test_journal_not_indexed_pages(tmp_path: Path) -> None:
+    journal = Journal(str(tmp_path), index=False)
+    await journal.append("1700000001.1", make_page(1))
+    journal = Journal(str(tmp_path))
+    await journal.append("1700000002.1", make_page(2))
+
+    # the index doesn't cover all the pages, so the journal is read from the start
+    pages = read_pages(str(tmp_path), since=1700000001)
+    assert [page.data for page in pages] == [make_page(1), make_page(2)]
+
+
+def test_id_index_grow(tmp_path: Path) -> None:
+    index = IdIndex(str(tmp_path / "ids.idx"), capacity=4)
+    for n in range(100):
+        index.put(f"id{n}", n)
+    index.put("id1", 200)
+    index.put("id2", 300, replace=False)
+
+    assert index.capacity == 256
+    assert index.get("id1") == 200
+    assert index.get("id2") == 2
+    assert index.get("id99") == 99
+    assert index.get("missing") is None
+    index.close()
+
+    index = IdIndex(str(tmp_path / "ids.idx"), readonly=True)
+    assert (index.count, index.get("id50")) == (100, 50)
+    index.close()
+
+
+async def test_journal_lookups(tmp_path: Path) -> None:
+    url = "http://api/tenders"
+    with patch("prozorro_crawler.journal.JOURNAL_DIR", str(tmp_path)):
+        forward = get_journal(url, None, "forward")
+        backward = get_journal(url, None, "backward")
+        assert forward is not None and backward is not None
+        await backward.append("1700000002.1", [{"id": "a"}, {"id": "b"}])
+        await backward.append("1700000001.1", [{"id": "a"}, {"id": "c"}])
+        await forward.append("1700000010.1", [{"id": "b"}])
+        await forward.append("1700000020.1", [{"id": "d"}])
+
+        assert get_last_seen_offset(url, "a") == "1700000002.1"
+        assert get_last_seen_offset(url, "b") == "1700000010.1"
+        assert get_last_seen_offset(url, "c") == "1700000001.1"
+        assert get_last_seen_offset(url, "x") is None
+        assert get_offset_before(url, 1700000015) == "1700000010.1"
+        assert get_offset_before(url, 1700000005) is None
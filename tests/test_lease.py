@@ -0,0 +1,288 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import Any, Callable
+from unittest.mock import MagicMock, call, patch
+
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import pytest
+
+from prozorro_crawler.lease import LeaseManager, LeaseWork
+
+
+def matches(doc: dict[str, Any], query: dict[str, Any]) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = doc.get(key)
+            for op, operand in condition.items():
+                if op == "$exists" and (key in doc) != operand:
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$gt" and not (value is not None and value > operand):
+                    return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+class LockCollection:
+    """
+    The lock collection queries used by leases
+    """
+
+    def __init__(self) -> None:
+        self.docs: dict[str, dict[str, Any]] = {}
+
+    async def update_one(
+        self, query: dict[str, Any], update: dict[str, Any], upsert: bool = False
+    ) -> SimpleNamespace:
+        doc = self.docs.get(query["_id"])
+        if doc is not None and matches(doc, query):
+            doc.update(update["$set"])
+            return SimpleNamespace(matched_count=1)
+        if upsert:
+            if doc is not None:
+                raise DuplicateKeyError("duplicate key error")
+            self.docs[query["_id"]] = {"_id": query["_id"], **update["$set"]}
+        return SimpleNamespace(matched_count=0)
+
+    async def delete_one(self, query: dict[str, Any]) -> None:
+        doc = self.docs.get(query["_id"])
+        if doc is not None and matches(doc, query):
+            del self.docs[query["_id"]]
+
+    async def count_documents(self, query: dict[str, Any]) -> int:
+        return sum(matches(doc, query) for doc in self.docs.values())
+
+    def expire(self, owner: str) -> None:
+        past = datetime.utcnow() - timedelta(seconds=1)
+        for doc in self.docs.values():
+            if owner in (doc.get("owner"), doc.get("node")):
+                doc["expireAt"] = past
+
+
+class Manager(LeaseManager):
+    """
+    Wakes the works up when any of them is stopped
+    """
+
+    stopped = asyncio.Event()
+
+    def stop(self, name: str) -> None:
+        super().stop(name)
+        self.stopped.set()
+        Manager.stopped = asyncio.Event()
+
+
+def make_works(names: list[str], running: list[str]) -> list[LeaseWork]:
+    def make_run(name: str) -> Any:
+        async def run(should_run: Callable[[], bool]) -> None:
+            running.append(name)
+            try:
+                while should_run():
+                    await Manager.stopped.wait()
+            finally:
+                running.remove(name)
+
+        return run
+
+    return [LeaseWork(name, make_run(name)) for name in names]
+
+
+@pytest.fixture
+def lock_collection() -> Any:
+    collection = LockCollection()
+    with patch("prozorro_crawler.lease.get_lock_collection", return_value=collection):
+        yield collection
+
+
+async def test_leases_rebalance(lock_collection: LockCollection) -> None:
+    running: list[str] = []
+    works = make_works(["a", "b", "c"], running)
+    first = Manager(works, group="g")
+    second = Manager(works, group="g")
+
+    await first.balance(lambda: True)
+    await asyncio.sleep(0)
+    assert sorted(running) == ["a", "b", "c"]
+
+    # the second node joins, but all the leases are owned
+    await second.balance(lambda: True)
+    assert second.get_owned() == []
+
+    # the first node gives up its extra work and releases it once it stopped
+    await first.balance(lambda: True)
+    assert first.get_owned() == ["a", "b"]
+    await asyncio.sleep(0)
+    assert sorted(running) == ["a", "b"]
+    await first.balance(lambda: True)
+    assert "g.lease.c" not in lock_collection.docs
+
+    await second.balance(lambda: True)
+    await asyncio.sleep(0)
+    assert second.get_owned() == ["c"]
+    assert sorted(running) == ["a", "b", "c"]
+    assert lock_collection.docs["g.lease.c"]["owner"] == second.node_id
+
+    await first.close()
+    await second.close()
+    assert running == []
+    assert lock_collection.docs == {}
+
+
+async def test_leases_failover(lock_collection: LockCollection) -> None:
+    running: list[str] = []
+    works = make_works(["a", "b"], running)
+    first = Manager(works, group="g")
+    second = Manager(works, group="g")
+    for manager in (first, second, first, first, second):
+        await manager.balance(lambda: True)
+        await asyncio.sleep(0)
+    assert (first.get_owned(), second.get_owned()) == (["a"], ["b"])
+
+    # the first node stops renewing its leases
+    lock_collection.expire(first.node_id)
+    await second.balance(lambda: True)
+    assert second.get_owned() == ["a", "b"]
+
+    # and finds out its lease is lost when it's back
+    await first.balance(lambda: True)
+    assert first.get_owned() == []
+    await asyncio.sleep(0)
+    assert sorted(running) == ["a", "b"]
+
+    await first.close()
+    await second.close()
+    assert lock_collection.docs == {}
+
+
+async def test_leases_failed_work(lock_collection: LockCollection) -> None:
+    async def fail(should_run: Callable[[], bool]) -> None:
+        raise ValueError("boom")
+
+    manager = LeaseManager([LeaseWork("a", fail)], group="g")
+    await manager.balance(lambda: True)
+    await asyncio.sleep(0)
+
+    # the failed work is released and claimed again
+    await manager.balance(lambda: True)
+    assert manager.get_owned() == []
+    await manager.balance(lambda: True)
+    assert manager.get_owned() == ["a"]
+
+    await manager.close()
+
+
+async def test_leases_not_renewed(lock_collection: LockCollection) -> None:
+    running: list[str] = []
+    manager = Manager(
+        make_works(["a"], running), group="g", lease_time=10, renew_interval=2
+    )
+    await manager.balance(lambda: True)
+
+    manager.renewed["a"] -= 7
+    manager.stop_expired()
+    assert manager.get_owned() == ["a"]
+
+    # stopped renew_interval before the lease can be taken over
+    manager.renewed["a"] -= 2
+    manager.stop_expired()
+    assert manager.get_owned() == []
+    await manager.close()
+
+
+async def test_leases_renewed_while_stopping(lock_collection: LockCollection) -> None:
+    done = asyncio.Event()
+
+    async def slow_stop(should_run: Callable[[], bool]) -> None:
+        await done.wait()
+
+    manager = LeaseManager([LeaseWork("a", slow_stop)], group="g")
+    await manager.balance(lambda: True)
+    manager.stop("a")
+
+    # the work is still running, so its lease is kept
+    lock_collection.expire(manager.node_id)
+    await manager.balance(lambda: True)
+    assert lock_collection.docs["g.lease.a"]["expireAt"] > datetime.utcnow()
+
+    done.set()
+    await asyncio.sleep(0)
+    await manager.release_stopped()
+    assert "g.lease.a" not in lock_collection.docs
+
+    await manager.close()
+
+
+async def test_leases_lost_work_cancelled(lock_collection: LockCollection) -> None:
+    async def busy(should_run: Callable[[], bool]) -> None:
+        # e.g. sleeping between feed requests
+        await asyncio.Event().wait()
+
+    first = LeaseManager([LeaseWork("a", busy)], group="g")
+    second = LeaseManager([LeaseWork("a", busy)], group="g")
+    await first.balance(lambda: True)
+    task = first.tasks["a"]
+
+    lock_collection.expire(first.node_id)
+    await second.balance(lambda: True)
+    await first.balance(lambda: True)
+    await asyncio.sleep(0)
+
+    assert task.cancelled()
+    await first.balance(lambda: True)
+    assert first.tasks == {}
+    assert lock_collection.docs["g.lease.a"]["owner"] == second.node_id
+
+    second.cancel("a")
+    await first.close()
+    await second.close()
+
+
+async def test_leases_expired_work_cancelled(lock_collection: LockCollection) -> None:
+    async def busy(should_run: Callable[[], bool]) -> None:
+        await asyncio.Event().wait()
+
+    manager = LeaseManager(
+        [LeaseWork("a", busy)], group="g", lease_time=10, renew_interval=2
+    )
+    await manager.balance(lambda: True)
+    task = manager.tasks["a"]
+
+    # asked to stop, but doesn't check should_run
+    manager.renewed["a"] -= 9
+    manager.stop_expired()
+    await asyncio.sleep(0)
+    assert "a" in manager.stopping and not task.done()
+
+    manager.renewed["a"] -= 2
+    manager.stop_expired()
+    await asyncio.sleep(0)
+    assert task.cancelled()
+
+    await manager.close()
+    assert lock_collection.docs == {}
+
+
+@patch("prozorro_crawler.lease.init_lock_index")
+@patch("prozorro_crawler.lease.asyncio.sleep")
+async def test_run_leases(
+    sleep_mock: MagicMock,
+    init_lock_index_mock: MagicMock,
+    lock_collection: LockCollection,
+) -> None:
+    async def idle(should_run: Callable[[], bool]) -> None:
+        pass
+
+    manager = LeaseManager([LeaseWork("a", idle)], group="g")
+    should_run = MagicMock(side_effect=[True, True, False])
+
+    await manager.run(should_run)
+
+    init_lock_index_mock.assert_called_once()
+    assert sleep_mock.mock_calls == [call(manager.renew_interval)] * 2
+    assert lock_collection.docs == {}
@@ -2,13 +2,17 @@ from prozorro_crawler.main import (
     main,
     should_run,
     run_app,
+    get_lease_works,
+    CrawlerResource,
 )
 from unittest.mock import MagicMock, patch, call, ANY
 from prozorro_crawler.settings import (
     BASE_URL,
     API_RESOURCE,
     API_OPT_FIELDS,
+    MONGODB_STATE_ID,
 )
+from prozorro_crawler.utils import get_accept_encoding
 from .base import AsyncMock
 import pytest
 import json
@@ -65,7 +69,10 @@ async def test_init_crawler_saved_feed(
         pass
 
     prepare_storage.assert_called_once()
-    assert client_mock.call_args.kwargs.get("headers") == additional_headers
+    assert client_mock.call_args.kwargs.get("headers") == {
+        "Accept-Encoding": get_accept_encoding(),
+        **additional_headers,
+    }
     url = f"{BASE_URL}/{API_RESOURCE}"
     opt_fields = ",".join(API_OPT_FIELDS)
     assert init_crawler_mock.mock_calls == [
@@ -76,5 +83,95 @@ async def test_init_crawler_saved_feed(
             data_handler,
             opt_fields=opt_fields,
             json_loads=json.loads,
+            state_id=None,
         ),
     ]
+
+
+@pytest.mark.asyncio
+@patch("prozorro_crawler.main.aiohttp.ClientSession")
+@patch("prozorro_crawler.main.init_crawler", new_callable=AsyncMock)
+async def test_run_app_resources(
+    init_crawler_mock: AsyncMock,
+    client_mock: MagicMock,
+) -> None:
+    tenders_handler = AsyncMock()
+    plans_handler = AsyncMock()
+    session = MagicMock()
+    session.__aenter__ = AsyncMock(return_value=session)
+    session.__aexit__ = AsyncMock(return_value=None)
+    client_mock.return_value = session
+
+    await run_app(
+        None,
+        json_loads=json.loads,
+        resources=[
+            CrawlerResource("tenders", tenders_handler, ["status"]),
+            CrawlerResource("plans", plans_handler, [], state_id="plans_state"),
+        ],
+    )
+
+    # one session for all the resources
+    client_mock.assert_called_once()
+    assert init_crawler_mock.mock_calls == [
+        call(
+            should_run,
+            session,
+            f"{BASE_URL}/tenders",
+            tenders_handler,
+            opt_fields="status",
+            json_loads=json.loads,
+            state_id=f"{MONGODB_STATE_ID}_tenders",
+        ),
+        call(
+            should_run,
+            session,
+            f"{BASE_URL}/plans",
+            plans_handler,
+            opt_fields="",
+            json_loads=json.loads,
+            state_id="plans_state",
+        ),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_run_app_no_handler() -> None:
+    with pytest.raises(ValueError):
+        await run_app(None, json_loads=json.loads)
+
+
+@patch("prozorro_crawler.main.init_crawler")
+async def test_get_lease_works(init_crawler_mock: MagicMock) -> None:
+    session = MagicMock()
+    handler = AsyncMock()
+    resources = [
+        CrawlerResource("tenders", handler, ["status"], "tenders_state"),
+        CrawlerResource("plans", handler, ["status"], "plans_state"),
+    ]
+
+    works = get_lease_works(session, resources, json.loads, backfill_shards=2)
+
+    assert [w.name for w in works] == [
+        "tenders.backfill.forward",
+        "tenders.backfill.1",
+        "tenders.backfill.2",
+        "plans.backfill.forward",
+        "plans.backfill.1",
+        "plans.backfill.2",
+    ]
+    await works[2].run(should_run)
+    init_crawler_mock.assert_called_once_with(
+        should_run,
+        session=session,
+        url=f"{BASE_URL}/tenders",
+        data_handler=handler,
+        opt_fields="status",
+        json_loads=json.loads,
+        state_id="tenders_state",
+        backfill_shard="2",
+    )
+    assert [w.name for w in get_lease_works(session, resources, json.loads, 1)] == [
+        "tenders",
+        "plans",
+    ]
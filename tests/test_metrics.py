@@ -0,0 +1,51 @@
+from prozorro_crawler.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    render_metrics,
+    start_metrics_server,
+)
+import aiohttp
+
+
+def test_render_metrics() -> None:
+    counter = Counter("test_requests_total", "Requests", ("status",))
+    gauge = Gauge("test_lag_seconds", "Lag")
+    histogram = Histogram("test_latency_seconds", "Latency", buckets=(0.1, 1))
+    try:
+        counter.inc(status="429")
+        counter.inc(2, status="429")
+        gauge.set(5.5)
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(3)
+
+        text = render_metrics()
+    finally:
+        del REGISTRY[-3:]
+
+    assert "# TYPE test_requests_total counter\n" in text
+    assert 'test_requests_total{status="429"} 3\n' in text
+    assert "test_lag_seconds 5.5\n" in text
+    assert (
+        'test_latency_seconds_bucket{le="0.1"} 1\n'
+        'test_latency_seconds_bucket{le="1"} 2\n'
+        'test_latency_seconds_bucket{le="+Inf"} 3\n'
+        "test_latency_seconds_sum 3.55\n"
+        "test_latency_seconds_count 3\n"
+    ) in text
+
+
+async def test_metrics_server() -> None:
+    runner = await start_metrics_server("127.0.0.1", 0)
+    try:
+        host, port = runner.addresses[0][:2]
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"http://{host}:{port}/metrics") as resp:
+                text = await resp.text()
+    finally:
+        await runner.cleanup()
+
+    assert resp.status == 200
+    assert "# TYPE crawler_feed_request_seconds histogram" in text
@@ -0,0 +1,131 @@
+from prozorro_crawler.metrics import OBJECT_CACHE_REQUESTS
+from prozorro_crawler.object_cache import CachedObject, ObjectCache, get_object_cache
+from prozorro_crawler.resource import get_response_data, process_resources
+from prozorro_crawler.simulator import FeedSimulator
+from pathlib import Path
+from unittest.mock import MagicMock, call, patch
+from .base import AsyncMock
+import aiohttp
+import asyncio
+import json
+import os
+
+
+async def test_object_cache_spill(tmp_path: Path) -> None:
+    cache = ObjectCache(size=1, directory=str(tmp_path))
+
+    await cache.put("/a", CachedObject(b'{"data": {"id": "a"}}', "d1", etag='"1"'))
+    await cache.put("/b", CachedObject(b'{"data": {"id": "b"}}'))
+
+    assert list(cache.objects) == ["/b"]
+    assert await asyncio.to_thread(os.listdir, tmp_path) == [
+        os.path.basename(cache.get_path("/a"))
+    ]
+    assert await cache.get("/a") == CachedObject(
+        b'{"data": {"id": "a"}}', "d1", etag='"1"'
+    )
+    assert list(cache.objects) == ["/a"]
+    # the file of the object back in memory is deleted
+    assert await asyncio.to_thread(os.listdir, tmp_path) == [
+        os.path.basename(cache.get_path("/b"))
+    ]
+    assert await cache.get("/c") is None
+
+    # the spilled object is replaced
+    await cache.put("/b", CachedObject(b'{"data": {"id": "b2"}}'))
+    assert list(cache.objects) == ["/b"]
+    assert await asyncio.to_thread(os.listdir, tmp_path) == [
+        os.path.basename(cache.get_path("/a"))
+    ]
+
+
+async def test_object_cache_directory_size(tmp_path: Path) -> None:
+    cache = ObjectCache(size=1, directory=str(tmp_path), directory_size=2)
+
+    for url in ("/a", "/b", "/c", "/d"):
+        await cache.put(url, CachedObject(b'{"data": {}}'))
+
+    # the oldest spilled file is deleted
+    assert list(cache.files) == [cache.get_path("/b"), cache.get_path("/c")]
+    assert sorted(await asyncio.to_thread(os.listdir, tmp_path)) == sorted(
+        os.path.basename(path) for path in cache.files
+    )
+    assert await cache.get("/a") is None
+
+    # the files are found after a restart
+    cache = ObjectCache(size=1, directory=str(tmp_path), directory_size=2)
+    assert sorted(cache.files) == sorted([cache.get_path("/b"), cache.get_path("/c")])
+    assert await cache.get("/b") == CachedObject(b'{"data": {}}')
+
+
+async def test_get_response_data_cache() -> None:
+    cache = ObjectCache(size=10, directory="")
+    data = {"id": "a", "dateModified": "d1"}
+    session = MagicMock()
+    session.get = AsyncMock(
+        side_effect=[
+            MagicMock(
+                status=200,
+                headers={"ETag": '"e1"'},
+                read=AsyncMock(return_value=json.dumps({"data": data}).encode()),
+            ),
+            MagicMock(status=304),
+        ],
+    )
+    hits = OBJECT_CACHE_REQUESTS.get(result="hit")
+
+    assert await get_response_data(session, "/a", cache=cache) == data
+    # same dateModified, no request
+    hit = await get_response_data(session, "/a", cache=cache, date_modified="d1")
+    assert hit == data
+    # every hit gets its own copy
+    hit["id"] = "b"
+    # revalidated
+    assert (
+        await get_response_data(session, "/a", cache=cache, date_modified="d2") == data
+    )
+
+    assert session.get.mock_calls == [
+        call("/a"),
+        call("/a", headers={"If-None-Match": '"e1"'}),
+    ]
+    assert OBJECT_CACHE_REQUESTS.get(result="hit") == hits + 1
+
+
+async def test_process_resources_cache_simulator() -> None:
+    simulator = FeedSimulator(objects=3, seed=1)
+    runner = await simulator.start()
+    url = simulator.get_url(runner)
+    items = simulator.get_page("", 10, False, [])["data"]
+    process_function = AsyncMock()
+    not_modified = OBJECT_CACHE_REQUESTS.get(result="not_modified")
+    try:
+        with patch(
+            "prozorro_crawler.object_cache.object_cache",
+            ObjectCache(size=10, directory=""),
+        ):
+            async with aiohttp.ClientSession() as session:
+                await process_resources(session, url, items, process_function)
+                # changed object is fetched, the others are skipped
+                simulator.change(items[0]["id"])
+                items = simulator.get_page("", 10, False, [])["data"]
+                await process_resources(session, url, items, process_function)
+                # revalidated without the feed dateModified: 304
+                await process_resources(session, url, [items[0]["id"]], AsyncMock())
+    finally:
+        await runner.cleanup()
+
+    assert simulator.requests == 5
+    assert process_function.call_count == 6
+    assert OBJECT_CACHE_REQUESTS.get(result="not_modified") == not_modified + 1
+
+
+@patch("prozorro_crawler.object_cache.object_cache", None)
+def test_get_object_cache() -> None:
+    with patch("prozorro_crawler.object_cache.OBJECT_CACHE_SIZE", 0):
+        assert get_object_cache() is None
+
+    with patch("prozorro_crawler.object_cache.OBJECT_CACHE_SIZE", 10):
+        cache = get_object_cache()
+        assert cache is not None
+        assert get_object_cache() is cache
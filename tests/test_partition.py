@@ -0,0 +1,24 @@
+from prozorro_crawler.partition import ItemPartition, parse_partition
+import pytest
+
+
+def test_parse_partition() -> None:
+    assert parse_partition("") is None
+    assert parse_partition("1/4") == ItemPartition(1, 4)
+    assert str(ItemPartition(1, 4)) == "1/4"
+    for value in ("4/4", "-1/4", "1", "a/b"):
+        with pytest.raises(ValueError):
+            parse_partition(value)
+
+
+def test_partition_filter() -> None:
+    items = [{"id": f"{n:032x}"} for n in range(100)]
+    partitions = [ItemPartition(n, 3) for n in range(3)]
+
+    parts = [partition.filter(items) for partition in partitions]
+
+    # every item is in exactly one partition
+    assert sorted(item["id"] for part in parts for item in part) == [
+        item["id"] for item in items
+    ]
+    assert all(parts)
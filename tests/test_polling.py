@@ -0,0 +1,22 @@
+from prozorro_crawler.polling import AdaptivePolling
+
+
+def test_adaptive_polling_arrival_rate() -> None:
+    polling = AdaptivePolling(min_interval=0.1, max_interval=15, backoff=2)
+
+    # no arrival rate estimate yet
+    assert polling.update(5, "1000.0.1.abc") == 0.1
+    # 10 items in 5 seconds
+    assert polling.update(10, "1005.0.2.abc") == 0.5
+    # rate estimate is smoothed
+    assert polling.update(2, "1015.0.3.abc") == 1 / (0.3 * 0.2 + 0.7 * 2)
+
+
+def test_adaptive_polling_backoff() -> None:
+    polling = AdaptivePolling(min_interval=0.5, max_interval=3, backoff=2)
+
+    assert [polling.update(0, "1000.0.1.abc") for _ in range(4)] == [1, 2, 3, 3]
+    # got items again
+    assert polling.update(1, "1001.0.1.abc") == 1
+    # too many items for the min interval
+    assert polling.update(100, "1002.0.1.abc") == 0.5
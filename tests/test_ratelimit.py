@@ -0,0 +1,98 @@
+from prozorro_crawler.crawler import get_feed_page
+from prozorro_crawler.ratelimit import (
+    PRIORITY_BACKWARD,
+    PRIORITY_FORWARD,
+    PRIORITY_OBJECTS,
+    RateLimiter,
+    get_retry_after,
+)
+from email.utils import formatdate
+from time import monotonic, time
+from unittest.mock import MagicMock, patch
+from .base import AsyncMock
+import asyncio
+import json
+
+
+async def test_rate_limiter_try_acquire() -> None:
+    limiter = RateLimiter(rate=0.01, burst=2)
+
+    assert limiter.try_acquire()
+    limiter.on_too_many_requests(retry_after=10)
+    # no waiting, paused
+    assert not limiter.try_acquire()
+
+
+async def test_rate_limiter_priority() -> None:
+    limiter = RateLimiter(rate=100, burst=1)
+    await limiter.acquire()
+    served = []
+
+    async def request(priority: int) -> None:
+        await limiter.acquire(priority)
+        served.append(priority)
+
+    await asyncio.gather(
+        request(PRIORITY_OBJECTS),
+        request(PRIORITY_BACKWARD),
+        request(PRIORITY_FORWARD),
+        request(PRIORITY_OBJECTS),
+    )
+
+    assert served == [
+        PRIORITY_FORWARD,
+        PRIORITY_BACKWARD,
+        PRIORITY_OBJECTS,
+        PRIORITY_OBJECTS,
+    ]
+
+
+async def test_rate_limiter_too_many_requests() -> None:
+    limiter = RateLimiter(rate=10, min_rate=1, max_rate=20, increase=1, decrease=0.5)
+
+    limiter.on_success()
+    assert limiter.rate == 11
+
+    limiter.on_too_many_requests(retry_after=0.05)
+    # responses to the requests sent before the pause
+    limiter.on_too_many_requests(retry_after=10)
+    assert limiter.rate == 5.5
+
+    start = monotonic()
+    await limiter.acquire()
+    assert monotonic() - start >= 0.05
+
+
+def test_get_retry_after() -> None:
+    assert get_retry_after(MagicMock(headers={"Retry-After": "5"})) == 5
+    assert get_retry_after(MagicMock(headers={})) is None
+    date = formatdate(time() + 60, usegmt=True)
+    retry_after = get_retry_after(MagicMock(headers={"Retry-After": date}))
+    assert retry_after is not None and 55 < retry_after <= 60
+
+
+@patch("prozorro_crawler.ratelimit.RATE_LIMIT", 10)
+@patch("prozorro_crawler.crawler.sleep")
+async def test_get_feed_page_rate_limiter(sleep_mock: MagicMock) -> None:
+    session = MagicMock()
+    session.get = AsyncMock(
+        side_effect=[
+            MagicMock(status=429, headers={"Retry-After": "0"}),
+            MagicMock(status=200, json=AsyncMock(return_value={"data": []})),
+        ],
+    )
+    limiter = RateLimiter(rate=10, decrease=0.5)
+
+    with patch.dict("prozorro_crawler.ratelimit.rate_limiters", {session: limiter}):
+        response = await get_feed_page(
+            lambda: True,
+            session,
+            "/abc",
+            {"descending": ""},
+            json.loads,
+        )
+
+    assert response == {"data": []}
+    # no fixed too many requests sleep, the limiter paused instead
+    sleep_mock.assert_not_called()
+    assert limiter.rate == 5 + limiter.increase
@@ -1,4 +1,8 @@
-from prozorro_crawler.resource import process_resource, get_response_data
+from prozorro_crawler.resource import (
+    process_resource,
+    process_resources,
+    get_response_data,
+)
 from unittest.mock import MagicMock, patch, call
 from prozorro_crawler.settings import (
     CONNECTION_ERROR_INTERVAL,
@@ -8,6 +12,7 @@ from prozorro_crawler.settings import (
 from json.decoder import JSONDecodeError
 from .base import AsyncMock
 import aiohttp
+import asyncio
 import pytest
 
 
@@ -21,7 +26,13 @@ async def test_process_resource(get_response_data_mock: AsyncMock) -> None:
 
     await process_resource(session, "/abc", "resource", process_function)
 
-    get_response_data_mock.assert_called_once_with(session, "/abc/resource")
+    get_response_data_mock.assert_called_once_with(
+        session,
+        "/abc/resource",
+        json_loads=None,
+        cache=None,
+        date_modified=None,
+    )
     process_function.assert_called_once_with(session, data)
 
 
@@ -101,3 +112,71 @@ async def test_get_response_data_payload_error(sleep_mock: MagicMock) -> None:
         call(CONNECTION_ERROR_INTERVAL),
     ]
     process_function.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_process_resources() -> None:
+    session = MagicMock()
+    fetching = 0
+    max_fetching = 0
+
+    async def get(url: str) -> MagicMock:
+        nonlocal fetching, max_fetching
+        fetching += 1
+        max_fetching = max(max_fetching, fetching)
+        await asyncio.sleep(0.01)
+        fetching -= 1
+        data = {"data": {"id": url.split("/")[-1]}}
+        return MagicMock(status=200, json=AsyncMock(return_value=data))
+
+    session.get = get
+    process_function = AsyncMock(side_effect=lambda s, data: data["id"])
+
+    result = await process_resources(
+        session,
+        "/abc",
+        [f"r{n}" for n in range(10)],
+        process_function,
+        concurrency=4,
+    )
+
+    assert result == [f"r{n}" for n in range(10)]
+    assert max_fetching == 4
+    assert process_function.call_count == 10
+
+
+async def pass_turn() -> None:
+    # asyncio.sleep is patched in these tests
+    future = asyncio.get_running_loop().create_future()
+    future.get_loop().call_soon(future.set_result, None)
+    await future
+
+
+@pytest.mark.asyncio
+async def test_process_resources_too_many_requests() -> None:
+    responses = [
+        MagicMock(status=429, text=AsyncMock(return_value="Too many")),
+        MagicMock(status=429, text=AsyncMock(return_value="Too many")),
+        *(
+            MagicMock(status=200, json=AsyncMock(return_value={"data": {}}))
+            for _ in range(2)
+        ),
+    ]
+    sleeps = []
+
+    async def get(url: str) -> MagicMock:
+        await pass_turn()
+        return responses.pop(0)
+
+    async def sleep(interval: float) -> None:
+        sleeps.append(interval)
+        await pass_turn()
+
+    session = MagicMock()
+    session.get = get
+
+    with patch("prozorro_crawler.resource.asyncio.sleep", sleep):
+        await process_resources(session, "/abc", ["a", "b"], AsyncMock())
+
+    # both requests got 429, but backoff is shared
+    assert sleeps == [TOO_MANY_REQUESTS_INTERVAL]
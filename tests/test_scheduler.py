@@ -0,0 +1,87 @@
+from prozorro_crawler.handlers import ItemHandler
+from prozorro_crawler.metrics import BACKWARD_PAUSED
+from prozorro_crawler.scheduler import CrawlerScheduler
+from typing import Any
+from unittest.mock import MagicMock
+import aiohttp
+import asyncio
+
+LABELS = {"feed": "/scheduler", "direction": "backward"}
+
+
+async def test_scheduler_backward_pause() -> None:
+    scheduler = CrawlerScheduler("/scheduler", pause_lag=60)
+    waiting = asyncio.create_task(scheduler.wait_backward(lambda: True, LABELS))
+    await asyncio.sleep(0)
+    assert waiting.done()
+
+    scheduler.set_forward_lag(61)
+    assert BACKWARD_PAUSED.get(feed="/scheduler") == 1
+    waiting = asyncio.create_task(scheduler.wait_backward(lambda: True, LABELS))
+    # still lagging
+    scheduler.set_forward_lag(40)
+    await asyncio.sleep(0)
+    assert not waiting.done()
+
+    scheduler.set_forward_lag(29)
+    await asyncio.wait_for(waiting, 1)
+    assert BACKWARD_PAUSED.get(feed="/scheduler") == 0
+
+
+async def test_scheduler_backward_pause_stop() -> None:
+    scheduler = CrawlerScheduler("/scheduler", pause_lag=60)
+    scheduler.set_forward_lag(61)
+
+    await asyncio.wait_for(scheduler.wait_backward(lambda: False, LABELS), 1)
+
+
+async def test_scheduler_handler_budget() -> None:
+    scheduler = CrawlerScheduler("/scheduler", backward_concurrency=1)
+    running = 0
+    max_running = 0
+
+    async def handle() -> None:
+        nonlocal running, max_running
+        async with scheduler.handler_slot(LABELS):
+            running += 1
+            max_running = max(max_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+    await asyncio.gather(handle(), handle(), handle())
+
+    assert max_running == 1
+
+
+async def test_item_handler_budget() -> None:
+    processing = set()
+    max_processing = 0
+    release = asyncio.Event()
+
+    async def process_item(_: aiohttp.ClientSession, item: dict[str, Any]) -> None:
+        nonlocal max_processing
+        processing.add(item["id"])
+        max_processing = max(max_processing, len(processing))
+        await release.wait()
+        processing.remove(item["id"])
+
+    handler = ItemHandler(process_item, concurrency=3)
+    session = MagicMock()
+    backward = asyncio.create_task(
+        handler.dispatch(
+            session,
+            [{"id": n} for n in range(4)],
+            budget=asyncio.Semaphore(2),
+        )
+    )
+    await asyncio.sleep(0.01)
+    # the backward items leave a worker for the forward ones
+    assert len(processing) == 2
+    forward = await handler.dispatch(session, [{"id": "f"}])
+    await asyncio.sleep(0)
+    assert "f" in processing
+
+    release.set()
+    await forward
+    await (await backward)
+    assert max_processing == 3
@@ -0,0 +1,92 @@
+from prozorro_crawler import crawler
+from prozorro_crawler.benchmark import percentile, run_benchmark, use_memory_storage
+from prozorro_crawler.simulator import FeedSimulator
+from prozorro_crawler.storage import memory
+from unittest.mock import MagicMock, patch
+import aiohttp
+import json
+
+
+def test_simulator_feed_pages() -> None:
+    simulator = FeedSimulator(objects=5, seed=1)
+    ids = list(simulator.objects)
+
+    page = simulator.get_page("", 2, descending=False, opt_fields=["status"])
+    assert [i["id"] for i in page["data"]] == ids[:2]
+    assert set(page["data"][0]) == {"id", "dateModified", "status"}
+
+    page = simulator.get_page(
+        page["next_page"]["offset"], 10, descending=False, opt_fields=[]
+    )
+    assert [i["id"] for i in page["data"]] == ids[2:]
+
+    # changed object moves to the end of the feed
+    simulator.change(ids[0])
+    page = simulator.get_page(
+        page["next_page"]["offset"], 10, descending=False, opt_fields=[]
+    )
+    assert [i["id"] for i in page["data"]] == ids[:1]
+
+    page = simulator.get_page("", 3, descending=True, opt_fields=[])
+    assert [i["id"] for i in page["data"]] == [ids[0], ids[4], ids[3]]
+    page = simulator.get_page(page["next_page"]["offset"], 3, True, [])
+    assert [i["id"] for i in page["data"]] == [ids[2], ids[1]]
+
+    # timestamp offsets, as used by backfill shards
+    timestamp = str(simulator.entries[2].timestamp)
+    page = simulator.get_page(timestamp, 10, descending=True, opt_fields=[])
+    assert [i["id"] for i in page["data"]] == [ids[1]]
+
+
+async def test_simulator_server() -> None:
+    simulator = FeedSimulator(objects=3, seed=1, not_found_rate=1)
+    runner = await simulator.start()
+    url = simulator.get_url(runner)
+    try:
+        async with aiohttp.ClientSession() as session:
+            resp = await session.get(url, params={"limit": 10})
+            assert resp.status == 404
+
+            simulator.not_found_rate = 0
+            resp = await session.get(url, params={"limit": 10})
+            data = (await resp.json())["data"]
+            assert len(data) == 3
+
+            resp = await session.get(f"{url}/{data[0]['id']}")
+            assert (await resp.json())["data"] == simulator.objects[data[0]["id"]]
+    finally:
+        await runner.cleanup()
+
+
+@patch.dict("prozorro_crawler.storage.memory.states", clear=True)
+async def test_benchmark() -> None:
+    simulator = FeedSimulator(objects=250, seed=1)
+    save_feed_position = vars(crawler)["save_feed_position"]
+    json_loads = MagicMock(wraps=json.loads)
+
+    with (
+        use_memory_storage(),
+        patch(
+            "prozorro_crawler.benchmark.get_default_json_loads",
+            return_value=json_loads,
+        ),
+    ):
+        report = await run_benchmark(simulator, duration=1)
+
+    assert vars(crawler)["save_feed_position"] is save_feed_position
+    # the configured JSON_DECODER is benchmarked
+    assert json_loads.called
+    assert memory.states
+
+    assert report.items == 250
+    assert report.pages == 3
+    assert report.requests >= 3
+    assert report.latency_p50 is None
+    assert "items:       250" in report.format()
+
+
+def test_percentile() -> None:
+    values = [float(n) for n in range(1, 101)]
+    assert percentile(values, 0.5) == 51
+    assert percentile(values, 0.99) == 100
+    assert percentile([], 0.5) is None
@@ -3,13 +3,18 @@ from prozorro_crawler.storage import (
     get_feed_position,
     drop_feed_position,
 )
+from prozorro_crawler.storage import memory, postgres
+from prozorro_crawler.storage.checkpoint import CheckpointWriter
 from pymongo.errors import ServerSelectionTimeoutError
 from unittest.mock import MagicMock, patch, call
 from prozorro_crawler.settings import (
     DB_ERROR_INTERVAL,
     MONGODB_STATE_ID,
+    POSTGRES_STATE_ID,
 )
 from .base import AsyncMock
+import asyncpg
+import asyncio
 
 
 @patch("prozorro_crawler.storage.mongodb.get_mongodb_collection")
@@ -110,3 +115,159 @@ async def test_drop_feed_position(
         ]
         * 2
     )
+
+
+@patch("prozorro_crawler.storage.postgres._pool", None)
+@patch("prozorro_crawler.storage.postgres.asyncpg.create_pool", new_callable=AsyncMock)
+async def test_postgres_pool_reused(create_pool_mock: AsyncMock) -> None:
+    pool = create_pool_mock.return_value
+    pool.execute = AsyncMock(return_value="UPDATE 1")
+    pool.fetchrow = AsyncMock(return_value={"id": POSTGRES_STATE_ID})
+    pool.close = AsyncMock()
+
+    await postgres.get_feed_position()
+    await postgres.execute_command("SELECT 1")
+    await postgres.execute_command("SELECT 2")
+    await postgres.close_connection()
+
+    create_pool_mock.assert_called_once()
+    # schema is created once, then only the commands are executed
+    assert len(pool.execute.mock_calls) == 3
+    assert "CREATE TABLE" in pool.execute.mock_calls[0].args[0]
+    assert pool.execute.mock_calls[1:] == [call("SELECT 1"), call("SELECT 2")]
+    pool.close.assert_called_once()
+
+
+@patch("prozorro_crawler.storage.postgres.asyncio.sleep")
+async def test_postgres_reconnect_on_connection_error(sleep_mock: MagicMock) -> None:
+    pool = MagicMock()
+    pool.execute = AsyncMock(
+        side_effect=[
+            asyncpg.InterfaceError("connection is closed"),
+            "DELETE 1",
+        ],
+    )
+    pool.expire_connections = AsyncMock()
+
+    with patch("prozorro_crawler.storage.postgres._pool", pool):
+        await postgres.drop_feed_position()
+
+    pool.expire_connections.assert_called_once()
+    assert sleep_mock.mock_calls == [call(DB_ERROR_INTERVAL)]
+    assert len(pool.execute.mock_calls) == 2
+
+
+@patch("prozorro_crawler.storage.postgres.execute_command", new_callable=AsyncMock)
+async def test_postgres_save_feed_position(execute_command_mock: AsyncMock) -> None:
+    await postgres.save_feed_position(
+        {"forward_offset": "1.0", "latest_date_modified": "2025-01-01"},
+    )
+
+    execute_command_mock.assert_called_once_with(
+        "INSERT INTO crawler_state (id, forward_offset, latest_date_modified) "
+        "VALUES ($1, $2, $3) "
+        "ON CONFLICT (id) DO UPDATE SET "
+        "forward_offset = EXCLUDED.forward_offset, "
+        "latest_date_modified = EXCLUDED.latest_date_modified",
+        POSTGRES_STATE_ID,
+        "1.0",
+        "2025-01-01",
+    )
+
+
+async def test_checkpoint_writer_merges_positions() -> None:
+    save_mock, drop_mock, close_mock = AsyncMock(), AsyncMock(), AsyncMock()
+    writer = CheckpointWriter(
+        save_mock,
+        drop_mock,
+        close_mock,
+        AsyncMock(),
+        flush_pages=2,
+        flush_interval=0,
+    )
+
+    await writer.save({"forward_offset": "f1"})
+    await writer.save({"backward_offset": "b1"})
+    await writer.save({"forward_offset": "f2"})
+    # let the background task write
+    await asyncio.sleep(0)
+    await writer.save({"backward_offset": "b2"})
+    await writer.close()
+
+    assert save_mock.mock_calls == [
+        call({"forward_offset": "f2", "backward_offset": "b1"}, None),
+        call({"backward_offset": "b2"}, None),
+    ]
+    close_mock.assert_called_once()
+
+
+async def test_checkpoint_writer_flush_interval() -> None:
+    save_mock = AsyncMock()
+    writer = CheckpointWriter(
+        save_mock,
+        AsyncMock(),
+        AsyncMock(),
+        AsyncMock(),
+        flush_pages=100,
+        flush_interval=0.01,
+    )
+
+    await writer.save({"forward_offset": "f1"})
+    await asyncio.sleep(0.05)
+
+    save_mock.assert_called_once_with({"forward_offset": "f1"}, None)
+    await writer.close()
+
+
+async def test_checkpoint_writer_backpressure_and_drop() -> None:
+    save_mock, drop_mock = AsyncMock(), AsyncMock()
+    writer = CheckpointWriter(
+        save_mock,
+        drop_mock,
+        AsyncMock(),
+        AsyncMock(),
+        flush_pages=1,
+        flush_interval=0,
+    )
+
+    # background task has no chance to write, the second save writes itself
+    await writer.save({"forward_offset": "f1"})
+    await writer.save({"forward_offset": "f2"})
+    await writer.save({"forward_offset": "f3"})
+    await writer.drop()
+    await writer.close()
+
+    save_mock.assert_called_once_with({"forward_offset": "f2"}, None)
+    drop_mock.assert_called_once_with(None)
+
+
+async def test_checkpoint_writer_get_unwritten_position() -> None:
+    written: dict[str, str] = {"forward_offset": "f0", "backward_offset": "b0"}
+    get_mock = AsyncMock(side_effect=lambda state_id: dict(written))
+    writer = CheckpointWriter(
+        AsyncMock(),
+        AsyncMock(),
+        AsyncMock(),
+        get_mock,
+        flush_pages=100,
+        flush_interval=0,
+    )
+
+    await writer.save({"forward_offset": "f1"})
+
+    # a re-initialized crawler continues from the unwritten position
+    assert await writer.get() == {"forward_offset": "f1", "backward_offset": "b0"}
+    assert await writer.get("other") == written
+    get_mock.assert_called_with("other")
+    await writer.close()
+
+
+@patch.dict("prozorro_crawler.storage.memory.states", clear=True)
+async def test_memory_storage() -> None:
+    await memory.save_feed_position({"backward_offset": "1.1", "forward_offset": "2"})
+    await memory.save_feed_position({"forward_offset": "3"}, state_id="other")
+    await memory.drop_feed_position()
+
+    assert await memory.get_feed_position() == {}
+    assert await memory.get_feed_position("other") == {"forward_offset": "3"}
+    assert await memory.get_feed_position("missing") is None
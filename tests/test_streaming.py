@@ -0,0 +1,197 @@
+from prozorro_crawler.crawler import crawler, get_feed_page
+from prozorro_crawler.handlers import ItemHandler
+from prozorro_crawler.simulator import FeedSimulator
+from prozorro_crawler.streaming import (
+    StreamingFeedParser,
+    iter_feed_items,
+    read_feed_page,
+)
+from json.decoder import JSONDecodeError
+from typing import Any, AsyncIterator, Optional
+from unittest.mock import MagicMock, patch
+from .base import AsyncMock
+import aiohttp
+import asyncio
+import json
+import pytest
+
+PAGE: dict[str, Any] = {
+    "data": [
+        {"id": str(n), "title": 'brackets "{[]}" and \\ escapes ü ' * n, "n": [n]}
+        for n in range(20)
+    ],
+    "next_page": {"offset": "1.2.3.4", "path": "/api/tenders?offset=1.2.3.4"},
+    "prev_page": {"offset": "0.1.2.3"},
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 100000])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_streaming_parser_chunks(chunk_size: int, indent: Optional[int]) -> None:
+    raw = json.dumps(PAGE, indent=indent, ensure_ascii=False).encode()
+    parser = StreamingFeedParser()
+
+    items = []
+    for n in range(0, len(raw), chunk_size):
+        items.extend(parser.feed(raw[n : n + chunk_size]))
+
+    assert items == PAGE["data"]
+    assert parser.close() == PAGE
+    assert len(parser.buffer) < chunk_size
+
+
+def test_streaming_parser_custom_json_loads() -> None:
+    json_loads = MagicMock(side_effect=json.loads)
+    parser = StreamingFeedParser(json_loads)
+
+    parser.feed(json.dumps(PAGE).encode())
+
+    assert parser.close() == PAGE
+    json_loads.assert_any_call('{"id": "0", "title": "", "n": [0]}')
+    # every item is decoded once, as are the keys and the other values
+    assert json_loads.call_count == len(PAGE["data"]) + 5
+
+
+def test_streaming_parser_item_loads() -> None:
+    parser = StreamingFeedParser(item_loads=lambda text: len(text))
+    raw = b'{"data": [{"id": "1"}, {"id": "22"}], "next_page": {"offset": "1"}}'
+
+    assert parser.feed(raw) == [11, 12]
+    assert parser.close()["next_page"] == {"offset": "1"}
+
+
+def test_streaming_parser_escapes_across_chunks() -> None:
+    page = {"data": [{"id": 'a\\"}]\\', "n": [{}]}, {"id": "b"}]}
+    raw = json.dumps(page).encode()
+
+    # an item split at every position, including escapes
+    for n in range(1, len(raw)):
+        parser = StreamingFeedParser()
+        items = parser.feed(raw[:n]) + parser.feed(raw[n:])
+
+        assert items == page["data"]
+        assert parser.close() == page
+
+
+def make_response(chunks: list[bytes], received: asyncio.Event) -> MagicMock:
+    """
+    Response that stops before the last chunk until `received` is set
+    """
+
+    async def iter_any() -> AsyncIterator[bytes]:
+        for chunk in chunks[:-1]:
+            yield chunk
+        await received.wait()
+        yield chunks[-1]
+
+    resp = MagicMock(status=200)
+    resp.content.iter_any = iter_any
+    return resp
+
+
+async def test_read_feed_page_on_items() -> None:
+    raw = json.dumps(PAGE).encode()
+    first_item_end = raw.index(b"}") + 1
+    received = asyncio.Event()
+    batches = []
+
+    async def on_items(items: list[Any]) -> None:
+        batches.append(items)
+        # the page isn't received yet
+        received.set()
+
+    resp = make_response([raw[:first_item_end], raw[first_item_end:]], received)
+    page = await read_feed_page(resp, on_items=on_items)
+
+    assert batches[0] == PAGE["data"][:1]
+    assert [item for batch in batches for item in batch] == PAGE["data"]
+    assert page == PAGE
+
+
+async def test_iter_feed_items() -> None:
+    received = asyncio.Event()
+    received.set()
+    parser = StreamingFeedParser()
+    resp = make_response([json.dumps(PAGE).encode()], received)
+
+    assert [item async for item in iter_feed_items(resp, parser)] == PAGE["data"]
+    assert parser.close() == PAGE
+
+
+@pytest.mark.parametrize(
+    "raw",
+    [b"[]", b'{"data": [{"id": "1"}', b'{"data": []} {', b'{"data": [{"id": ]}'],
+)
+def test_streaming_parser_errors(raw: bytes) -> None:
+    parser = StreamingFeedParser()
+    with pytest.raises(JSONDecodeError):
+        parser.feed(raw)
+        parser.close()
+
+
+@patch("prozorro_crawler.crawler.FEED_STREAMING_PARSE", True)
+async def test_get_feed_page_streaming() -> None:
+    simulator = FeedSimulator(objects=30, seed=1)
+    runner = await simulator.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            response = await get_feed_page(
+                lambda: True,
+                session,
+                simulator.get_url(runner),
+                {"limit": 20, "opt_fields": "status"},
+                json.loads,
+            )
+    finally:
+        await runner.cleanup()
+
+    assert response == simulator.get_page("", 20, False, ["status"])
+
+
+@patch("prozorro_crawler.crawler.FEED_STREAMING_PARSE", True)
+@patch("prozorro_crawler.crawler.save_feed_position")
+@patch("prozorro_crawler.main.asyncio.sleep")
+async def test_crawler_dispatches_streamed_items(
+    sleep_mock: MagicMock,
+    save_feed_position_mock: MagicMock,
+) -> None:
+    page = {
+        "data": [{"id": "a", "dateModified": "d1"}, {"id": "b", "dateModified": "d2"}],
+        "next_page": {"offset": "2"},
+    }
+    raw = json.dumps(page).encode()
+    first_item_end = raw.index(b"}") + 1
+    received = asyncio.Event()
+    processed = []
+
+    async def process_item(_: aiohttp.ClientSession, item: dict[str, Any]) -> None:
+        processed.append(item["id"])
+        # the first item is processed before the rest of the page is received
+        received.set()
+
+    session = MagicMock()
+    session.get = AsyncMock(
+        side_effect=[
+            make_response([raw[:first_item_end], raw[first_item_end:]], received),
+            make_response([b'{"data": []}'], received),
+        ],
+    )
+
+    # hangs if the items wait for the whole page
+    await asyncio.wait_for(
+        crawler(
+            lambda: True,
+            session,
+            "/abc",
+            ItemHandler(process_item),
+            descending="1",
+            json_loads=json.loads,
+        ),
+        timeout=5,
+    )
+
+    assert processed == ["a", "b"]
+    save_feed_position_mock.assert_called_once_with(
+        {"earliest_date_modified": "d2", "backward_offset": "2"},
+        state_id=None,
+    )
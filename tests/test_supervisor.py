@@ -0,0 +1,105 @@
+from pathlib import Path
+from prozorro_crawler.metrics import WORKER_RESTARTS
+from prozorro_crawler.supervisor import (
+    MetricFamilies,
+    Supervisor,
+    WorkerSpec,
+    add_labels,
+    get_worker_specs,
+)
+import sys
+
+
+def test_get_worker_specs() -> None:
+    specs = get_worker_specs(
+        resources=["tenders", "plans"],
+        partitions=2,
+        metrics_port=9100,
+    )
+
+    assert [spec.name for spec in specs] == [
+        "tenders.part0of2",
+        "tenders.part1of2",
+        "plans.part0of2",
+        "plans.part1of2",
+    ]
+    assert [spec.metrics_port for spec in specs] == [9101, 9102, 9103, 9104]
+    env = specs[1].env
+    assert env["API_RESOURCE"] == "tenders"
+    assert env["ITEM_PARTITION"] == "1/2"
+    assert env["MONGODB_STATE_ID"].endswith(".tenders.part1of2")
+    assert env["LOCK_PROCESS_NAME"].endswith(".tenders.part1of2")
+    assert env["METRICS_PORT"] == "9102"
+
+
+def test_get_worker_specs_backfill() -> None:
+    specs = get_worker_specs(backfill_shards=2)
+
+    assert [spec.name for spec in specs] == [
+        "backfill.forward",
+        "backfill.1",
+        "backfill.2",
+    ]
+    assert [spec.env["BACKFILL_SHARD"] for spec in specs] == ["forward", "1", "2"]
+    # shards share the forward crawler feed position
+    assert all("MONGODB_STATE_ID" not in spec.env for spec in specs)
+    assert len({spec.env["LOCK_PROCESS_NAME"] for spec in specs}) == 3
+
+
+def test_get_worker_specs_single() -> None:
+    (spec,) = get_worker_specs()
+    assert spec.name == "main"
+
+
+def test_add_labels() -> None:
+    labels = {"worker": "w1"}
+    assert add_labels("up 1", labels) == 'up{worker="w1"} 1'
+    assert add_labels('up{a="b"} 1', labels) == 'up{worker="w1",a="b"} 1'
+    assert add_labels("up{} 1", labels) == 'up{worker="w1"} 1'
+
+
+def test_metric_families() -> None:
+    families = MetricFamilies()
+    worker_metrics = "\n".join(
+        [
+            "# HELP up Up",
+            "# TYPE up gauge",
+            "up 1",
+            "# HELP items Items",
+            "# TYPE items counter",
+            'items{feed="f"} 2',
+        ],
+    )
+    families.add(worker_metrics, worker="w1")
+    families.add(worker_metrics, worker="w2")
+
+    assert families.render().splitlines() == [
+        "# HELP up Up",
+        "# TYPE up gauge",
+        'up{worker="w1"} 1',
+        'up{worker="w2"} 1',
+        "# HELP items Items",
+        "# TYPE items counter",
+        'items{worker="w1",feed="f"} 2',
+        'items{worker="w2",feed="f"} 2',
+    ]
+
+
+async def test_supervisor_restarts_worker(tmp_path: Path) -> None:
+    marker = tmp_path / "started"
+    # fails on the first start, succeeds on the second one
+    script = (
+        "import os, sys\n"
+        f"marker = {str(marker)!r}\n"
+        "if os.path.exists(marker): sys.exit(0)\n"
+        "open(marker, 'w').close()\n"
+        "sys.exit(os.environ['EXIT_CODE'])\n"
+    )
+    spec = WorkerSpec("restarted", {"EXIT_CODE": "3"}, 0)
+    supervisor = Supervisor([sys.executable, "-c", script], [spec], restart_delay=0)
+    restarts = WORKER_RESTARTS.get(worker="restarted")
+
+    await supervisor.run()
+
+    assert WORKER_RESTARTS.get(worker="restarted") == restarts + 1
+    assert supervisor.processes["restarted"].returncode == 0
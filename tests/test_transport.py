@@ -0,0 +1,48 @@
+from unittest.mock import MagicMock, patch
+from prozorro_crawler.transport import (
+    create_session,
+    get_connector,
+    get_timeout,
+)
+from prozorro_crawler.utils import get_accept_encoding
+import aiohttp
+
+
+@patch("prozorro_crawler.transport.HTTP_POOL_LIMIT", 20)
+@patch("prozorro_crawler.transport.HTTP_POOL_LIMIT_PER_HOST", 5)
+@patch("prozorro_crawler.transport.HTTP_KEEPALIVE_TIMEOUT", 60)
+async def test_get_connector() -> None:
+    connector = get_connector()
+    try:
+        assert connector.limit == 20
+        assert connector.limit_per_host == 5
+    finally:
+        await connector.close()
+
+
+@patch("prozorro_crawler.transport.HTTP_CONNECT_TIMEOUT", 3)
+@patch("prozorro_crawler.transport.HTTP_READ_TIMEOUT", 0)
+@patch("prozorro_crawler.transport.HTTP_TOTAL_TIMEOUT", 60)
+def test_get_timeout() -> None:
+    assert get_timeout() == aiohttp.ClientTimeout(
+        total=60,
+        sock_connect=3,
+        sock_read=None,
+    )
+
+
+async def test_create_session() -> None:
+    async with create_session({"X-Client": "test"}) as session:
+        assert session.headers["X-Client"] == "test"
+        assert session.headers["Accept-Encoding"] == get_accept_encoding()
+        assert session.timeout == get_timeout()
+
+
+@patch("prozorro_crawler.utils.HTTP_ACCEPT_ENCODING", "identity")
+def test_accept_encoding_setting() -> None:
+    assert get_accept_encoding() == "identity"
+
+
+@patch("prozorro_crawler.utils.find_spec", return_value=None)
+def test_accept_encoding_auto(find_spec_mock: MagicMock) -> None:
+    assert get_accept_encoding() == "gzip, deflate"